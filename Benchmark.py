@@ -0,0 +1,314 @@
+"""
+Benchmark.py
+
+Performance regression benchmarks of the workloads in main.py
+- evaluation of the steady state x_s(t) by Func
+- the frequency sweep of PART (C)
+- solving the ODE of each damping case
+- differentiation of full trajectories by Diff.dydx
+- rendering a 3x2 sweep figure by Plot.Figure
+
+Each workload runs at several input sizes, where size 1 is the size used in main.py (60000 time samples).
+The best wall time over a few repeats and the peak memory (by tracemalloc, in a separate run) are recorded,
+and can be saved as a JSON baseline and compared with later runs.
+
+Usage :
+python Benchmark.py --save baseline.json                    # record a baseline
+python Benchmark.py --compare baseline.json                 # exit code 1 if any workload regresses by more than 25 %,
+                                                            # or is missing in the baseline
+python Benchmark.py --compare baseline.json --threshold 0.5 --sizes 1 --only dydx render
+
+Reference :
+https://docs.python.org/3/library/tracemalloc.html
+
+Written by S. P. Lam
+"""
+
+import argparse
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import main
+
+N = 60000  # number of time samples in main.py
+SIZES = (0.25, 1, 4)  # default input sizes, relative to N
+
+
+def _time(n):
+    """
+    Helper function to create the time interval of n samples with the time step of main.py
+
+    :param n: number of samples
+    :return: type of numpy array
+    """
+    return np.arange(n) * main.DT
+
+
+def func(size):
+    """
+    Steady state displacement x_s(t) evaluated by Func over the time interval
+
+    :param size: input size relative to N
+    :return: function running the workload
+    """
+    t = _time(int(N * size))
+    main.set_case(main.DATASET["Under-damping"])
+
+    return lambda: main.x_s(t)
+
+
+def resonance(size):
+    """
+    Frequency sweep of PART (C), with the number of damping constants scaled by size
+
+    :param size: input size relative to the 15 damping constants of main.py
+    :return: function running the workload
+    """
+    data = main.DATASET["Under-damping"]
+    c_values = list(np.linspace(0.5, 7.5, max(int(15 * size), 1)))
+
+    return lambda: main.resonance(data, c_values)
+
+
+def solve(case):
+    """
+    Solve the ODE of a damping case of main.DATASET
+
+    solve_ode2() is used for Under-damping, including the initial condition computed by Func.
+    The initial condition of solve_ode2() is only defined for Under-damping,
+    so the other cases solve ODE2 directly from rest with the same constants.
+
+    :param case: type of damping, key of main.DATASET
+    :return: function of the input size returning the function running the workload
+    """
+    from ODE2 import ODE2
+
+    def workload(size):
+        t = _time(int(N * size))
+        d = main.DATASET[case]
+
+        if case == "Under-damping":
+            return lambda: main.solve_ode2(d["m"], d["c"], d["k"], d["F0"], d["OMEGA_0"], t)
+
+        ode = ODE2(d["m"], d["c"], d["k"], d["F0"], 0, 0, lambda _t: np.cos(d["OMEGA_0"] * _t))
+        return lambda: ode(t)
+
+    return workload
+
+
+def dydx(size):
+    """
+    Velocity of all 6 trajectories of the damping constant sweep by Diff.dydx
+
+    :param size: input size relative to N
+    :return: function running the workload
+    """
+    from Diff import dydx as _dydx
+
+    t = _time(int(N * size))
+    x = np.cos(np.outer(np.arange(1, 7), t)) * np.exp(-0.1 * t)
+
+    return lambda: _dydx(x, t)
+
+
+def render(size):
+    """
+    Render a 3x2 sweep figure with 2 curves per axes to PNG in memory
+
+    :param size: input size relative to N
+    :return: function running the workload
+    """
+    from Plot import Figure
+
+    t = _time(int(N * size))
+    curves = [np.cos((i + 1) * t) * np.exp(-0.1 * t) for i in range(6)]
+    x_s = np.cos(t)
+
+    def workload():
+        with Figure(3, 2) as fig:
+            for i in range(6):
+                fig.add_graph([[t, curves[i]], [t, x_s]], label = ["x(t)", "$x_s(t)$"], index = i + 1)
+                fig.set_axes_title(f"c = {i}", index = i + 1)
+
+            fig.set_fig_title("Displacement of the Block $x(t)$ at Different Damping Constant $c$")
+            fig.save(io.BytesIO(), format = "png", h_space = 0.5)
+
+    return workload
+
+
+# {name: function of the input size returning the function running the workload}
+WORKLOADS = {
+    "func": func,
+    "resonance": resonance,
+    "solve_under": solve("Under-damping"),
+    "solve_critical": solve("Critical Damping"),
+    "solve_over": solve("Over-damping"),
+    "dydx": dydx,
+    "render": render
+}
+
+
+def measure(workload, repeat = 3):
+    """
+    Best wall time over repeats and peak memory of a workload
+
+    :param workload: function without argument
+    :param repeat: number of timed runs
+    :return: dict {"time": seconds, "peak": bytes}
+    """
+    workload()  # warm up ( imports, caches )
+    best = np.inf
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        workload()
+        best = min(best, time.perf_counter() - start)
+
+    # tracemalloc slows down the run, so memory is measured separately
+    tracemalloc.start()
+    try:
+        workload()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"time": best, "peak": peak}
+
+
+def run(names = None, sizes = SIZES, repeat = 3, verbose = True):
+    """
+    Run the benchmarks
+
+    :param names: (optional) names of the workloads, all in WORKLOADS by default
+    :param sizes: input sizes relative to the size in main.py
+    :param repeat: number of timed runs of each workload
+    :param verbose: print each result when measured
+    :return: dict {"name[size]": {"time": seconds, "peak": bytes}}
+    """
+    results = {}
+
+    for name in names or WORKLOADS:
+        for size in sizes:
+            key = _key(name, size)
+            results[key] = measure(WORKLOADS[name](size), repeat)
+
+            if verbose:
+                print(f"{key:<24} {results[key]['time']:>10.4f} s {results[key]['peak'] / 2 ** 20:>10.2f} MiB")
+
+    return results
+
+
+def _key(name, size):
+    """
+    Helper function to get the key of a result, the same for sizes given as int or float ( e.g. 1 and 1.0 )
+
+    :param name: name of the workload
+    :param size: input size relative to N
+    :return: type str, e.g. "dydx[1]"
+    """
+    return f"{name}[{float(size):g}]"
+
+
+def _normalize(results):
+    """
+    Helper function to normalize the keys of results, e.g. of a baseline saved with "dydx[1.0]"
+
+    :param results: dict {"name[size]": result}
+    :return: dict with the keys of _key()
+    """
+    normalized = {}
+
+    for key, result in results.items():
+        name, _, size = key.rpartition("[")
+        try:
+            normalized[_key(name, size.rstrip("]"))] = result
+        except ValueError:
+            normalized[key] = result
+
+    return normalized
+
+
+def compare(results, baseline, threshold = 0.25, min_time = 1e-3):
+    """
+    Compare results with a baseline
+
+    :param results: dict returned by run()
+    :param baseline: dict returned by run(), e.g. loaded from a JSON file
+    :param threshold: allowed relative increase of time and peak memory
+    :param min_time: increase of time below this (s) is taken as timer noise
+    :return: tuple (list of str describing each regression, list of keys of results missing in the baseline),
+             both empty if all results match the baseline without regression
+    """
+    results = _normalize(results)
+    baseline = _normalize(baseline)
+    regressions = []
+    missing = [key for key in results if key not in baseline]
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        for field in ("time", "peak"):
+            old = baseline[key][field]
+            new = result[field]
+
+            if field == "time" and new - old < min_time:
+                continue
+
+            if old > 0 and (new - old) / old > threshold:
+                regressions.append(f"{key} {field} : {old:.6g} -> {new:.6g} (+{(new - old) / old:.0%})")
+
+    return regressions, missing
+
+
+def cli(argv = None):
+    """
+    Command line entry point
+
+    :param argv: list of arguments. sys.argv[1:] by default
+    :return: exit code, 1 if any workload regresses
+    """
+    parser = argparse.ArgumentParser(description = "Performance regression benchmarks")
+    parser.add_argument("--only", nargs = "+", choices = list(WORKLOADS), help = "workloads to run, all by default")
+    parser.add_argument("--sizes", type = float, nargs = "+", default = SIZES, help = "input sizes relative to main.py")
+    parser.add_argument("--repeat", type = int, default = 3, help = "number of timed runs of each workload")
+    parser.add_argument("--save", help = "save the results as a JSON baseline")
+    parser.add_argument("--compare", help = "JSON baseline to compare with")
+    parser.add_argument("--threshold", type = float, default = 0.25, help = "allowed relative regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.only, args.sizes, args.repeat)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        regressions, missing = compare(results, baseline, args.threshold)
+
+        for regression in regressions:
+            print("REGRESSION", regression)
+
+        for key in missing:
+            print("MISSING", key, "is not in the baseline")
+
+        # e.g. workloads excluded by --only or --sizes
+        for key in sorted(set(_normalize(baseline)) - set(_normalize(results))):
+            print("NOT RUN", key, "of the baseline")
+
+        if regressions or missing:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
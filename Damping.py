@@ -0,0 +1,121 @@
+"""
+Damping.py
+
+Vectorized classification of the damping regime of mx" + cx' + kx = F0*cos(OMEGA_0 * t)
+over arrays of constants (m, c, k, OMEGA_0), e.g. to filter millions of candidate designs before solving any of them
+
+The regime is decided by the damping ratio zeta = c / (2*sqrt(k*m)) = (c/2m) / OMEGA
+- Under-damping : zeta < 1, i.e. (c/2m)^2 < OMEGA^2
+- Critical Damping : zeta = 1 within a relative tolerance band
+- Over-damping : zeta > 1, i.e. (c/2m)^2 > OMEGA^2
+
+Reference :
+https://en.wikipedia.org/wiki/Damping#Damping_ratio_definition
+
+Written by S. P. Lam
+"""
+
+import numpy as np
+
+# regime codes, NAMES[code] is the case name used in main.py
+INVALID = -1
+UNDER = 0
+CRITICAL = 1
+OVER = 2
+NAMES = np.array(["Under-damping", "Critical Damping", "Over-damping"])
+
+
+def classify(m, c, k, OMEGA_0 = None, rtol = 1e-6):
+    """
+    Classify the damping regime and compute the derived constants in one pass over the arrays
+
+    Usage:
+    m, c, k = np.random.uniform(0.1, 10, (3, 1000000))
+    result = classify(m, c, k, OMEGA_0 = 3)
+    under = mask(result, "Under-damping")  # valid under-damped designs
+    names(result["regime"][:5])  # e.g. ['Under-damping', 'Over-damping', ...]
+
+    :param m: mass, numpy array or scalar
+    :param c: damping constant, numpy array or scalar
+    :param k: spring constant, numpy array or scalar
+    :param OMEGA_0: (optional) driving frequency, numpy array or scalar. All arrays are broadcast together
+    :param rtol: relative tolerance band of critical damping, |zeta - 1| <= rtol
+    :return: dict of numpy arrays of the broadcast shape
+             - regime : regime code UNDER, CRITICAL, OVER, or INVALID for non-physical constants (int8)
+             - physical : m > 0, k > 0, c >= 0 and all finite
+             - below_resonance : OMEGA_0 < OMEGA_R, as required by validate_data() in main.py (if OMEGA_0 is given)
+             - valid : physical and below_resonance
+             - OMEGA : angular frequency sqrt(k/m)
+             - OMEGA_R : resonance frequency sqrt(|OMEGA^2 - c^2/(2m^2)|), as in validate_data() in main.py
+             - zeta : damping ratio c / (2*sqrt(k*m))
+    """
+    m, c, k = np.broadcast_arrays(*(np.asarray(a, dtype = float) for a in (m, c, k)))
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        OMEGA2 = k / m
+        OMEGA = np.sqrt(OMEGA2)
+        OMEGA_R = np.sqrt(np.abs(OMEGA2 - (c / m) ** 2 / 2))
+        zeta = c / (2 * np.sqrt(k * m))
+
+    physical = (m > 0) & (k > 0) & (c >= 0) & np.isfinite(zeta)
+
+    regime = np.full(zeta.shape, INVALID, dtype = np.int8)
+    regime[physical & (zeta < 1 - rtol)] = UNDER
+    regime[physical & (np.abs(zeta - 1) <= rtol)] = CRITICAL
+    regime[physical & (zeta > 1 + rtol)] = OVER
+
+    result = {
+        "regime": regime,
+        "physical": physical,
+        "OMEGA": OMEGA,
+        "OMEGA_R": OMEGA_R,
+        "zeta": zeta
+    }
+
+    if OMEGA_0 is None:
+        result["valid"] = physical
+
+    else:
+        below_resonance = np.asarray(OMEGA_0, dtype = float) < OMEGA_R
+        result["below_resonance"] = below_resonance
+        result["valid"] = physical & below_resonance
+
+    return result
+
+
+def mask(result, case):
+    """
+    Valid constants of the given damping regime
+
+    :param result: dict returned by classify()
+    :param case: type of damping : "Under-damping", "Critical Damping", "Over-damping", or its regime code
+    :return: boolean numpy array
+    """
+    code = case if isinstance(case, (int, np.integer)) else _code(case)
+
+    return result["valid"] & (result["regime"] == code)
+
+
+def names(regime):
+    """
+    Case names of regime codes, "Invalid" for INVALID
+
+    :param regime: regime codes, numpy array
+    :return: numpy array of str
+    """
+    regime = np.asarray(regime)
+
+    return np.where(regime == INVALID, "Invalid", NAMES[np.clip(regime, 0, len(NAMES) - 1)])
+
+
+def _code(case):
+    """
+    Helper function to convert a case name to its regime code
+
+    :param case: type of damping : "Under-damping", "Critical Damping", "Over-damping"
+    :return: regime code
+    """
+    if case not in NAMES:
+        raise ValueError(f"Unknown type of damping {case}, should be one of {list(NAMES)}")
+
+    return int(np.flatnonzero(NAMES == case)[0])
@@ -3,32 +3,252 @@ Diff.py
 
 Calculate differential of a given dataset numerically
 
+The derivative at each point is the exact derivative of the Lagrange polynomial
+through the nearest data points, i.e. central differences in the interior
+and one-sided differences of the same order of accuracy at both ends of the data.
+Non-uniform spacing is handled exactly, and uniform spacing is detected to use constant stencils.
+For a lazy TimeGrid() the constant step is used directly, without materializing x or checking its spacing.
+
+Data may be N-dimensional, e.g. a stack of trajectories of shape (N, len(t)),
+and is differentiated along the given axis in one call.
+Arrays larger than memory (e.g. numpy.memmap) can be processed in chunks along the axis into a given output
+(e.g. another numpy.memmap), with enough overlap between chunks so that the result is the same as differentiating the whole array
+(up to rounding, as the uniform spacing is estimated per chunk).
+
+Reference :
+https://en.wikipedia.org/wiki/Finite_difference_coefficient
+B. Fornberg, Generation of Finite Difference Formulas on Arbitrarily Spaced Grids, Math. Comp. 51 (1988)
+
 Written by S. P. Lam
 """
 
-from numpy import array
+import numpy as np
 
+from TimeGrid import TimeGrid
 
-def dydx(y, x):
+
+def dydx(y, x, order = 2, out = None, axis = -1, chunk = None):
     """
     Calculate first order differential from given data numerically
-    
+
+    Usage:
+    t = np.arange(0, 60, 1e-3)
+    v = dydx(x, t)  # 2nd order accurate
+    v = dydx(x, t, order = 4)  # 4th order accurate
+    dydx(x, t, out = v)  # reuse an existing buffer
+    v_all = dydx(np.array(x_dc), t)  # all trajectories of a sweep at once, shape (len(dc), len(t))
+
+    :param y: data points for y-coordinate, array of any dimension
+    :param x: data points for x-coordinate, 1D array (or TimeGrid) along the given axis of y.
+              Strictly increasing or decreasing, need not be uniformly spaced
+    :param order: order of accuracy, 2 or 4. Reduced automatically if there are too few data points
+    :param out: (optional) numpy array (or memmap) of the same shape as y to store the result
+    :param axis: axis of y along which to differentiate
+    :param chunk: (optional) number of samples along the axis processed at a time, for arrays larger than memory.
+                  out is then required, e.g. a numpy.memmap, so that the result is not allocated in memory
+    :return: type of numpy array
+    """
+    return _run(y, x, (1,), order, (out,), axis, chunk)[0]
+
+
+def d2ydx2(y, x, order = 2, out = None, axis = -1, chunk = None):
+    """
+    Calculate second order differential from given data numerically
+    See dydx() for the parameters
+
+    :return: type of numpy array
+    """
+    return _run(y, x, (2,), order, (out,), axis, chunk)[0]
+
+
+def derivatives(y, x, order = 2, out = None, axis = -1, chunk = None):
+    """
+    Calculate first and second order differential from given data numerically in one pass over the data
+    e.g. velocity and acceleration from displacement
+    Both derivatives share the same stencils, so the one-sided stencils at the ends
+    have one more point than those used by dydx() alone
+
+    Usage:
+    v, a = derivatives(x, t)
+
+    :param y: data points for y-coordinate, array of any dimension
+    :param x: data points for x-coordinate, 1D array along the given axis of y
+    :param order: order of accuracy, 2 or 4
+    :param out: (optional) tuple of 2 numpy arrays of the same shape as y to store the results
+    :param axis: axis of y along which to differentiate
+    :param chunk: (optional) number of samples along the axis processed at a time, for arrays larger than memory.
+                  out is then required, e.g. a numpy.memmap, so that the result is not allocated in memory
+    :return: tuple of numpy array (dy/dx, d2y/dx2)
+    """
+    return _run(y, x, (1, 2), order, out if out is not None else (None, None), axis, chunk)
+
+
+def _run(y, x, derivs, order, outs, axis, chunk):
+    """
+    Helper function to check the input, allocate the output and differentiate the data, in chunks if required
+
     :param y: data points for y-coordinate
     :param x: data points for x-coordinate
-    :return: type of numpy array
+    :param derivs: tuple of derivatives to compute, e.g. (1,) or (1, 2)
+    :param order: order of accuracy
+    :param outs: tuple of output arrays or None, one for each derivative
+    :param axis: axis of y along which to differentiate
+    :param chunk: number of samples along the axis processed at a time, or None
+    :return: tuple of numpy array, one for each derivative
+    """
+    if order not in (2, 4):
+        raise ValueError(f"order should be 2 or 4, got {order}")
+
+    if chunk is None or not isinstance(y, np.ndarray):
+        # arrays ( e.g. memmap ) are processed in chunks without a copy, other array-likes ( e.g. list ) are converted
+        y = np.asarray(y, dtype = float)
+
+    if not isinstance(x, TimeGrid):
+        x = np.asarray(x, dtype = float)
+
+    n = y.shape[axis]
+
+    if x.ndim != 1 or len(x) != n:
+        raise ValueError(f"x should be 1D with the same length as y along axis {axis}, got {x.shape} and {n}")
+
+    if n < max(derivs) + 1:
+        raise ValueError(f"At least {max(derivs) + 1} data points are required")
+
+    if chunk is not None and any(out is None for out in outs):
+        # the output of data larger than memory would not fit in memory either
+        raise ValueError("out is required when chunk is given, e.g. a numpy.memmap of the same shape as y")
+
+    # allocate the output and move the axis to the last one ( views only, no copy )
+    outs = list(outs)
+    for i in range(len(outs)):
+        if outs[i] is None:
+            outs[i] = np.empty(y.shape)
+
+        elif outs[i].shape != y.shape:
+            raise ValueError(f"out should have shape {y.shape}, got {outs[i].shape}")
+
+    _y = np.moveaxis(y, axis, -1)
+    _outs = [np.moveaxis(out, axis, -1) for out in outs]
+
+    if chunk is None:
+        _differentiate(_y, x, derivs, order, _outs)
+        return tuple(outs)
+
+    # stencil width and overlap between chunks
+    m = max(derivs)
+    w_end = min(order + m, n)
+    halo = min(order + 1, n) // 2
+    chunk = max(int(chunk), w_end)
+
+    for a in range(0, n, chunk):
+        b = min(a + chunk, n)
+
+        if n - b < w_end:
+            # merge a short remainder into this chunk
+            b = n
+
+        lo = max(a - halo, 0)
+        hi = min(b + halo, n)
+        local = [np.empty(_y.shape[:-1] + (hi - lo,)) for _ in derivs]
+        _differentiate(np.asarray(_y[..., lo:hi], dtype = float), x[lo:hi], derivs, order, local)
+
+        for _out, _local in zip(_outs, local):
+            _out[..., a:b] = _local[..., a-lo:b-lo]
+
+        if b == n:
+            break
+
+    return tuple(outs)
+
+
+def _differentiate(y, x, derivs, order, outs):
+    """
+    Helper function to differentiate the data along the last axis
+
+    :param y: data points for y-coordinate, numpy array, differentiated along the last axis
+    :param x: data points for x-coordinate, 1D numpy array or TimeGrid()
+    :param derivs: tuple of derivatives to compute, e.g. (1,) or (1, 2)
+    :param order: order of accuracy
+    :param outs: list of numpy arrays of the same shape as y, one for each derivative
+    :return: None
     """
-    points = list(zip(x, y))
-    dydx = []
-    
-    # calculate the slope for each point P_i and P_(i+1)
-    for i in range(len(points) - 1):
-        dy = points[i+1][1] - points[i][1]
-        dx = points[i+1][0] - points[i][0]
-        slope = dy/dx
-        dydx.append(slope)
-    
-    # approximate the slope for last data point equals to the previous one
-    dydx.append(dydx[-1])
-    
-    return array(dydx)
-    
+    n = y.shape[-1]
+    m = max(derivs)
+    w_in = min(order + 1, n)  # number of points of the central stencils
+    w_end = min(order + m, n)  # number of points of the one-sided stencils
+    half = w_in // 2
+    n_in = n - 2 * half  # number of points using the central stencils
+
+    if n_in > 0:
+
+        if isinstance(x, TimeGrid):
+            step, uniform = x.step, True
+        else:
+            dx = np.diff(x)
+            step, uniform = dx[0], np.allclose(dx, dx[0], rtol = 1e-9, atol = 0)
+
+        if uniform:
+            # uniform spacing : constant stencil
+            offsets = [np.array([(j - half) * step]) for j in range(w_in)]
+            c = _fornberg(np.zeros(1), offsets, m)[..., 0]  # shape (m + 1, w_in)
+
+        else:
+            index = np.arange(half, n - half)
+            c = _fornberg(x[index], [x[index - half + j] for j in range(w_in)], m)  # shape (m + 1, w_in, n_in)
+
+        for d, out in zip(derivs, outs):
+            interior = out[..., half:n-half]
+            np.multiply(c[d, 0], y[..., 0:n_in], out = interior)
+
+            for j in range(1, w_in):
+                if np.any(c[d, j]):
+                    interior += c[d, j] * y[..., j:j+n_in]
+
+    # one-sided stencils at both ends
+    ends = np.r_[0:half, n-half:n]
+    start = np.clip(ends - w_end // 2, 0, n - w_end)
+    stencil = start[:, None] + np.arange(w_end)  # shape (len(ends), w_end)
+    c = _fornberg(x[ends], [x[stencil[:, j]] for j in range(w_end)], m)  # shape (m + 1, w_end, len(ends))
+    Y = y[..., stencil]  # shape (..., len(ends), w_end)
+
+    for d, out in zip(derivs, outs):
+        out[..., ends] = np.einsum("...ej,je->...e", Y, c[d])
+
+
+def _fornberg(z, X, m):
+    """
+    Helper function to compute finite difference weights by Fornberg's algorithm, vectorized over many stencils
+
+    :param z: points where the derivatives are evaluated, numpy array of shape (P,)
+    :param X: list of the stencil nodes, each a numpy array of shape (P,)
+    :param m: highest derivative
+    :return: weights c of shape (m + 1, len(X), P), such that the d-th derivative at z is sum over j of c[d, j] * y(X[j])
+    """
+    w = len(X)
+    c = np.zeros((m + 1, w, len(z)))
+    c[0, 0] = 1
+    c1 = np.ones(len(z))
+    c4 = X[0] - z
+
+    for i in range(1, w):
+        mn = min(i, m)
+        c2 = np.ones(len(z))
+        c5 = c4
+        c4 = X[i] - z
+
+        for j in range(i):
+            c3 = X[i] - X[j]
+            c2 = c2 * c3
+
+            if j == i - 1:
+                for k in range(mn, 0, -1):
+                    c[k, i] = c1 * (k * c[k-1, i-1] - c5 * c[k, i-1]) / c2
+                c[0, i] = -c1 * c5 * c[0, i-1] / c2
+
+            for k in range(mn, 0, -1):
+                c[k, j] = (c4 * c[k, j] - k * c[k-1, j]) / c3
+            c[0, j] = c4 * c[0, j] / c3
+
+        c1 = c2
+
+    return c
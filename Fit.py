@@ -0,0 +1,315 @@
+"""
+Fit.py
+
+Estimate the parameters of a driven oscillator from measured displacement data
+mx" + cx' + kx = F0*cos(OMEGA_0 * t)
+
+Two models are available :
+"ode"    : full solution x(t) of the ODE by ODE2, including the transient part.
+           The Jacobian is obtained from ODE2.sensitivity(), i.e. the forward sensitivity equations
+           integrated together with the state
+"steady" : steady state displacement x_s(t) of the block (see main.py)
+           written in the form x_s(t) = P*cos(OMEGA_0*t) + Q*sin(OMEGA_0*t), whose Jacobian is known in closed form
+In both cases no finite difference re-evaluation of the model is needed during the fit.
+
+Note that x(t) only depends on the ratios c/m, k/m and F0/m,
+i.e. (m, c, k, F0) and (2m, 2c, 2k, 2F0) give the same displacement.
+Hence at least one of m, c, k, F0 should be held fixed (m is fixed by default).
+The steady state alone only determines the amplitude and phase at OMEGA_0,
+so the "steady" model needs three of m, c, k, F0 fixed.
+
+Written by S. P. Lam
+"""
+
+import time as _time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import least_squares
+
+from ODE2 import ODE2
+
+
+PARAMS = ("m", "c", "k", "F0", "OMEGA_0")  # order of parameters used by the model
+INITIAL = ("x0", "x_dot0")  # initial conditions, fitted as extra parameters by the "ode" model
+
+
+class FitResult:
+
+    def __init__(self, params, cost, success, nfev, njev, n_starts, fit_time):
+        """
+        Result of a parameter fit
+
+        :param params: fitted parameters of type dict {name: value}
+        :param cost: half of the sum of squared residuals at the solution
+        :param success: True if the optimizer converged for the best start
+        :param nfev: total number of model evaluations over all starts
+        :param njev: total number of Jacobian evaluations over all starts
+        :param n_starts: number of starting points tried
+        :param fit_time: wall time of the whole fit in seconds
+        """
+        self.params = params
+        self.cost = cost
+        self.success = success
+        self.nfev = nfev
+        self.njev = njev
+        self.n_starts = n_starts
+        self.fit_time = fit_time
+
+    def __repr__(self):
+        params = ", ".join(f"{key} = {value:.6g}" for key, value in self.params.items())
+        return (f"FitResult({params}; cost = {self.cost:.3e}, success = {self.success}, "
+                f"nfev = {self.nfev}, njev = {self.njev}, starts = {self.n_starts}, "
+                f"time = {self.fit_time:.3f} s)")
+
+
+def steady_state(p, t, jac = False):
+    """
+    Steady state displacement x_s(t) and optionally its Jacobian
+
+    x_s(t) = P*cos(OMEGA_0*t) + Q*sin(OMEGA_0*t)
+    where
+    a = k - m*OMEGA_0^2 ; b = c*OMEGA_0 ; D = a^2 + b^2
+    P = F0*a/D ; Q = F0*b/D
+
+    :param p: parameters in the order of PARAMS, i.e. (m, c, k, F0, OMEGA_0)
+    :param t: time, numpy array
+    :param jac: also return the Jacobian of shape (len(t), 5)
+    :return: x_s of type numpy array, or tuple (x_s, Jacobian) if jac is True
+    """
+    m, c, k, F0, w = p
+    a = k - m * w ** 2
+    b = c * w
+    D = a ** 2 + b ** 2
+    P = F0 * a / D
+    Q = F0 * b / D
+
+    cos_wt = np.cos(w * t)
+    sin_wt = np.sin(w * t)
+    x = P * cos_wt + Q * sin_wt
+
+    if not jac:
+        return x
+
+    # partial derivatives of P and Q with respect to a, b
+    D2 = D ** 2
+    P_a = F0 * (b ** 2 - a ** 2) / D2
+    P_b = -2 * F0 * a * b / D2
+    Q_a = P_b
+    Q_b = -P_a
+
+    # chain rule through a(m, k, OMEGA_0) and b(c, OMEGA_0)
+    a_m, a_k, a_w = -w ** 2, 1., -2 * m * w
+    b_c, b_w = w, c
+
+    J = np.empty((len(t), 5))
+    J[:, 0] = a_m * (P_a * cos_wt + Q_a * sin_wt)  # dx/dm
+    J[:, 1] = b_c * (P_b * cos_wt + Q_b * sin_wt)  # dx/dc
+    J[:, 2] = a_k * (P_a * cos_wt + Q_a * sin_wt)  # dx/dk
+    J[:, 3] = (a * cos_wt + b * sin_wt) / D  # dx/dF0
+    J[:, 4] = ((P_a * a_w + P_b * b_w) * cos_wt + (Q_a * a_w + Q_b * b_w) * sin_wt
+               + t * (Q * cos_wt - P * sin_wt))  # dx/dOMEGA_0
+
+    return x, J
+
+
+def ode_solution(p, t, jac = False):
+    """
+    Displacement x(t) solving the ODE by ODE2 and optionally its Jacobian from ODE2.sensitivity()
+
+    :param p: parameters in the order of PARAMS + INITIAL, i.e. (m, c, k, F0, OMEGA_0, x0, x_dot0)
+    :param t: time, numpy array starting at the time of the initial condition
+    :param jac: also return the Jacobian of shape (len(t), 7)
+    :return: x of type numpy array, or tuple (x, Jacobian) if jac is True
+    """
+    m, c, k, F0, w, x0, x_dot0 = p
+    ode = ODE2(m, c, k, F0, x0, x_dot0, lambda _t: np.cos(w * _t))
+
+    if not jac:
+        return ode(t)[0]
+
+    # (m, c, k, F0) are the coefficients (a, b, c, d) of ODE2, OMEGA_0 is a parameter of the driving function
+    sens = ode.sensitivity(t, ("a", "b", "c", "d", "OMEGA_0", "x0", "x_dot0"),
+                           forcing = {"OMEGA_0": lambda _t: -_t * np.sin(w * _t)})
+
+    return sens.x, sens.dx.T
+
+
+MODELS = {
+    "ode": (ode_solution, PARAMS + INITIAL),
+    "steady": (steady_state, PARAMS)
+}
+
+
+def guess_omega(x, t):
+    """
+    Estimate the driving frequency from the dominant peak of the spectrum of x(t)
+    Assume t is (close to) uniformly spaced
+
+    :param x: displacement data
+    :param t: time data
+    :return: angular frequency of the highest non-zero frequency peak
+    """
+    x = np.asarray(x, dtype = float)
+    n = len(x)
+    dt = (t[-1] - t[0]) / (n - 1)
+
+    # Hann window keeps the peak narrow, zero padding gives a finer frequency grid
+    n_fft = 8 * n
+    spectrum = np.abs(np.fft.rfft((x - x.mean()) * np.hanning(n), n_fft))
+    spectrum[0] = 0
+    i = int(np.argmax(spectrum))
+
+    # refine the peak location by parabolic interpolation of the log-magnitude
+    if 0 < i < len(spectrum) - 1:
+        l, c, r = np.log(spectrum[i-1:i+2] + 1e-300)
+        i += 0.5 * (l - r) / (l - 2 * c + r)
+
+    return 2 * np.pi * i / (n_fft * dt)
+
+
+def _solve_one(args):
+    """
+    Helper function to run one local least squares fit
+    Defined at module level so that it can be sent to worker processes
+
+    :param args: tuple (x, t, model, start, free, bounds)
+    :return: tuple (parameters, cost, success, nfev, njev)
+    """
+    x, t, model, start, free, bounds = args
+    func = MODELS[model][0]
+    p = np.array(start, dtype = float)
+
+    def residual(q):
+        p[free] = q
+        return func(p, t) - x
+
+    def jacobian(q):
+        p[free] = q
+        return func(p, t, jac = True)[1][:, free]
+
+    result = least_squares(residual, p[free], jac = jacobian, bounds = bounds, x_scale = "jac", method = "trf")
+    p[free] = result.x
+
+    return p, result.cost, result.success, result.nfev, result.njev or 0
+
+
+def fit(x, t, guess, model = "ode", fixed = ("m",), n_starts = 1, spread = 0.3, workers = None, t_min = None,
+        seed = None):
+    """
+    Fit (m, c, k, F0, OMEGA_0) of the driven oscillator to measured x(t)
+
+    Usage:
+    t = np.arange(0, 60, 1e-3)
+    result = fit(x, t, {"m": 5, "c": 1, "k": 40, "F0": 3}, n_starts = 8, workers = 4)
+    print(result.params, result.fit_time, result.nfev)
+
+    # steady state only, the transient part before t = 30 is ignored
+    result = fit(x, t, {"m": 5, "c": 1.75, "k": 40, "F0": 4}, model = "steady", fixed = ("m", "c", "F0"), t_min = 30)
+
+    :param x: measured displacement, numpy array
+    :param t: time of each sample, numpy array
+    :param guess: initial guess of type dict {name: value} for all names in PARAMS.
+                  OMEGA_0 may be omitted, it is then estimated from the spectrum of x.
+                  For the "ode" model, x0 and x_dot0 may be given, otherwise they are estimated from the first samples
+    :param model: "ode" or "steady", see the description of this module
+    :param fixed: names of parameters held at the value given in guess
+    :param n_starts: number of starting points. Extra starts are log-normal perturbations of the guess (except OMEGA_0)
+    :param spread: standard deviation of the log-normal perturbation for the extra starts
+    :param workers: number of worker processes for the starts. None or 1 runs in the calling process
+    :param t_min: ignore samples before t_min. For the "steady" model, this skips the transient part of the motion
+    :param seed: seed for the random perturbation of the starting points
+    :return: instance of class FitResult()
+    """
+    start_time = _time.perf_counter()
+
+    x = np.asarray(x, dtype = float)
+    t = np.asarray(t, dtype = float)
+
+    if t_min is not None:
+        mask = t >= t_min
+        x = x[mask]
+        t = t[mask]
+
+    names = MODELS[model][1]
+
+    guess = dict(guess)
+    if "OMEGA_0" not in guess:
+        guess["OMEGA_0"] = guess_omega(x, t)
+    if model == "ode":
+        guess.setdefault("x0", x[0])
+        guess.setdefault("x_dot0", (x[1] - x[0]) / (t[1] - t[0]))
+
+    p0 = np.array([guess[name] for name in names], dtype = float)
+    free = np.array([name not in fixed for name in names])
+
+    if not free.any():
+        raise ValueError("All parameters are fixed, nothing to fit")
+
+    # physical parameters are non-negative, initial conditions may take any sign
+    lower = np.array([-np.inf if name in INITIAL else 0. for name in names])
+    bounds = (lower[free], np.full(free.sum(), np.inf))
+
+    # starting points : the guess itself, then random perturbations of the physical parameters around it
+    # OMEGA_0 is not perturbed, the residual is highly oscillatory in OMEGA_0 over long records
+    rng = np.random.default_rng(seed)
+    perturb = free & (lower == 0) & (np.array(names) != "OMEGA_0")
+    starts = [p0]
+    for _ in range(n_starts - 1):
+        p = p0.copy()
+        p[perturb] *= np.exp(spread * rng.standard_normal(perturb.sum()))
+        starts.append(p)
+
+    jobs = [(x, t, model, p, free, bounds) for p in starts]
+
+    if workers and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            results = list(pool.map(_solve_one, jobs))
+    else:
+        results = [_solve_one(job) for job in jobs]
+
+    best = min(results, key = lambda r: r[1])
+
+    return FitResult(
+            params = dict(zip(names, best[0].tolist())),
+            cost = best[1],
+            success = best[2],
+            nfev = sum(r[3] for r in results),
+            njev = sum(r[4] for r in results),
+            n_starts = len(starts),
+            fit_time = _time.perf_counter() - start_time
+    )
+
+
+def _fit_one(args):
+    """
+    Helper function to fit one trace in a worker process
+
+    :param args: tuple (x, t, kwargs for fit())
+    :return: instance of class FitResult()
+    """
+    x, t, kwargs = args
+    return fit(x, t, **kwargs)
+
+
+def fit_many(traces, t, guess, workers = None, chunksize = 4, **kwargs):
+    """
+    Fit many displacement traces sampled at the same time t
+    Traces are distributed over a pool of worker processes, each trace is fitted serially inside a worker
+
+    :param traces: iterable of displacement data, or 2D numpy array with one trace per row
+    :param t: time of each sample, numpy array
+    :param guess: initial guess of type dict, shared by all traces
+    :param workers: number of worker processes. None uses all CPU cores, 1 runs in the calling process
+    :param chunksize: number of traces sent to a worker at a time
+    :param kwargs: other keyword arguments passed to fit()
+    :return: list of FitResult() in the same order as traces
+    """
+    kwargs.update(guess = guess, workers = None)
+    jobs = [(x, t, kwargs) for x in traces]
+
+    if workers == 1:
+        return [_fit_one(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        return list(pool.map(_fit_one, jobs, chunksize = chunksize))
@@ -0,0 +1,184 @@
+"""
+Forcing.py
+
+Sampled driving terms f(t) for ODE2, e.g. measured force records
+
+A Tabulated signal is a callable of time interpolating the samples, linear or cubic (Hermite with Catmull-Rom slopes).
+On a uniform grid the samples around t are found by index arithmetic in O(1), with a pure Python path for the scalar
+time of odeint() and a vectorized path for arrays of time ( e.g. ODE2.green() ).
+Only the samples around the requested times are read, so a long record memory-mapped from a file
+( Tabulated.load() ) streams through the solve without being loaded whole.
+
+Reference :
+https://en.wikipedia.org/wiki/Cubic_Hermite_spline#Catmull%E2%80%93Rom_spline
+https://numpy.org/doc/stable/reference/generated/numpy.memmap.html
+
+Written by S. P. Lam
+"""
+
+import numpy as np
+
+
+class Tabulated:
+
+    def __init__(self, values, t = None, t0 = 0, dt = None, kind = "linear"):
+        """
+        A driving term interpolating samples, held at the first and last sample outside the time grid
+
+        Usage:
+        f = Tabulated(force, dt = 1e-3)  # samples at t = 0, 1e-3, 2e-3, ...
+        f = Tabulated(force, t = t_record, kind = "cubic")  # samples at the times t_record
+        x, v = ODE2(m, c, k, 1, 0, 0, f)(t)
+
+        :param values: samples, 1D array or numpy.memmap
+        :param t: (optional) time of the samples, increasing. A uniform grid is detected and indexed in O(1)
+        :param t0: time of the first sample, if t is not given
+        :param dt: time step of the samples, if t is not given
+        :param kind: "linear" or "cubic"
+        """
+        if kind not in ("linear", "cubic"):
+            raise ValueError(f"Unknown kind {kind}, should be linear or cubic")
+
+        if np.ndim(values) != 1:
+            raise ValueError("Samples should be a 1D array")
+
+        self.values = values if isinstance(values, np.ndarray) else np.asarray(values, dtype = float)
+        self.kind = kind
+        self.t = None
+        n = len(self.values)
+
+        if n < 2:
+            raise ValueError(f"At least 2 samples are required, got {n}")
+
+        if t is not None:
+            t = np.asarray(t, dtype = float)
+
+            if t.shape != (n,):
+                raise ValueError(f"Time of the samples should have shape {(n,)}, got {t.shape}")
+
+            t0, dt = t[0], (t[-1] - t[0]) / (n - 1)
+
+            if not np.allclose(np.diff(t), dt, rtol = 1e-6, atol = 0):
+                # non-uniform grid, samples are found by binary search
+                if np.any(np.diff(t) <= 0):
+                    raise ValueError("Time of the samples should be increasing")
+
+                self.t = t
+
+        elif dt is None or dt <= 0:
+            raise ValueError(f"Either the time of the samples t or a time step dt > 0 should be given, got dt = {dt}")
+
+        self.t0 = float(t0)
+        self.dt = float(dt)
+        self.t_end = self.t0 + self.dt * (n - 1)
+
+    @classmethod
+    def load(cls, path, t0 = 0, dt = 1, kind = "linear", dtype = float):
+        """
+        Memory-map a record of uniformly sampled values from a file, which is read only where the solve needs it
+
+        :param path: .npy file, or a raw binary file of dtype
+        :param t0: time of the first sample
+        :param dt: time step of the samples
+        :param kind: "linear" or "cubic"
+        :param dtype: data type of a raw binary file
+        :return: Tabulated()
+        """
+        if str(path).endswith(".npy"):
+            values = np.load(path, mmap_mode = "r")
+        else:
+            values = np.memmap(path, dtype = dtype, mode = "r")
+
+        return cls(values, t0 = t0, dt = dt, kind = kind)
+
+    def __call__(self, t):
+        """
+        Interpolated value of the samples at time t
+
+        :param t: time, float or numpy array
+        :return: float, or numpy array of the shape of t
+        """
+        if self.t is None and isinstance(t, (float, int, np.floating)):
+            return self._scalar(float(t))
+
+        t = np.asarray(t, dtype = float)
+        n = len(self.values)
+
+        if self.t is None:
+            position = np.clip((t - self.t0) / self.dt, 0, n - 1)
+            i = np.minimum(position.astype(np.intp), n - 2)
+            u = position - i
+        else:
+            t = np.clip(t, self.t[0], self.t[-1])
+            i = np.clip(np.searchsorted(self.t, t, side = "right") - 1, 0, n - 2)
+            u = (t - self.t[i]) / (self.t[i + 1] - self.t[i])
+
+        y1 = self.values[i]
+        y2 = self.values[i + 1]
+
+        if self.kind == "linear":
+            return y1 + u * (y2 - y1)
+
+        # cubic Hermite, slopes by central differences, one-sided at the ends
+        i0 = np.maximum(i - 1, 0)
+        i3 = np.minimum(i + 2, n - 1)
+        y0 = self.values[i0]
+        y3 = self.values[i3]
+
+        if self.t is None:
+            m1 = (y2 - y0) / (i + 1 - i0)
+            m2 = (y3 - y1) / (i3 - i)
+        else:
+            h = self.t[i + 1] - self.t[i]
+            m1 = (y2 - y0) / (self.t[i + 1] - self.t[i0]) * h
+            m2 = (y3 - y1) / (self.t[i3] - self.t[i]) * h
+
+        return _hermite(y1, y2, m1, m2, u)
+
+    def _scalar(self, t):
+        """
+        Helper function to interpolate at one time on a uniform grid, without numpy array overhead ( e.g. for odeint() )
+
+        :param t: time, float
+        :return: float
+        """
+        n = len(self.values)
+        position = (t - self.t0) / self.dt
+
+        if position <= 0:
+            return float(self.values[0])
+
+        if position >= n - 1:
+            return float(self.values[n - 1])
+
+        i = int(position)
+        u = position - i
+        y1 = float(self.values[i])
+        y2 = float(self.values[i + 1])
+
+        if self.kind == "linear":
+            return y1 + u * (y2 - y1)
+
+        i0 = max(i - 1, 0)
+        i3 = min(i + 2, n - 1)
+        m1 = (y2 - float(self.values[i0])) / (i + 1 - i0)
+        m2 = (float(self.values[i3]) - y1) / (i3 - i)
+
+        return _hermite(y1, y2, m1, m2, u)
+
+
+def _hermite(y1, y2, m1, m2, u):
+    """
+    Helper function to evaluate the cubic Hermite polynomial between two samples
+
+    :param y1: value at u = 0
+    :param y2: value at u = 1
+    :param m1: slope at u = 0, per unit of u
+    :param m2: slope at u = 1, per unit of u
+    :param u: position between the samples, 0 to 1
+    :return: interpolated value
+    """
+    u2 = u * u
+    u3 = u2 * u
+
+    return (2 * u3 - 3 * u2 + 1) * y1 + (u3 - 2 * u2 + u) * m1 + (-2 * u3 + 3 * u2) * y2 + (u3 - u2) * m2
@@ -4,13 +4,26 @@ Func.py
 A class for defining a mathematics function that can be called similar to mathematics notation
 This allows user to define and evaluate the mathematics function at given time interval in a more convenient way
 
+t may be a lazy TimeGrid(), then the function is evaluated chunk by chunk without an array of timestamps
+
+Expression() is a compact picklable form of a function ( parsed expression + table of constants ) for worker processes,
+with large array constants optionally in shared memory ( SharedArray() ) so that workers use them without copy
+
 Written by S. P. Lam
 """
 
+import ast
+import functools
+
 import numpy as np
 from numpy import sin, cos, tan, arcsin, arccos, arctan, sqrt, array
+from TimeGrid import TimeGrid
 # from numpy import *  # note that this may waste computer resources
 
+# functions available in expressions : the names imported above for Func(), shared by Expression()
+NAMESPACE = {"sin": sin, "cos": cos, "tan": tan, "arcsin": arcsin, "arccos": arccos, "arctan": arctan,
+             "sqrt": sqrt, "array": array}
+
 
 class Environment:
     """
@@ -284,10 +297,13 @@ class Func(Environment):
         Simply call Func("sin(t)")(t = np.array([0, 1, 2]))
         Note that **kwargs passed here will override the value of existing constants
         
-        :param t: default variable. Expected type of numpy.array
+        :param t: default variable. Expected type of numpy.array, or TimeGrid()
         :param kwargs: user-defined variables
         :return: the image of the given function
         """
+        if isinstance(t, TimeGrid):
+            # evaluated chunk by chunk, the timestamps are never materialized at once
+            return t.map(lambda _t: self(_t, **kwargs))
         
         # update values of constants from environment
         self.constants.update(self.env.getConstants())
@@ -310,6 +326,338 @@ class Func(Environment):
         
         # return result
         return result
+    
+    
+    def expression(self, **kwargs):
+        """
+        Compact picklable copy of this function : the expression and a snapshot of the constants
+        See Expression() for evaluating it in worker processes
+        
+        Usage :
+        f = x_s.expression()  # constants of the environment at this moment
+        f(t = np.arange(0, 60, 1e-3))
+        
+        :param kwargs: constants to override in the snapshot
+        :return: instance of class Expression()
+        """
+        constants = dict(self.constants)
+        constants.update(self.env.getConstants())
+        constants.update(kwargs)
+        
+        return Expression(self.func, constants)
+
+
+class Expression:
+    """
+    A compact picklable function : the expression (parsed to an AST once) and a table of constants
+    Unlike Func(), nothing is evaluated by exec() of strings, and a copy holds no reference to an Environment(),
+    so it can be sent to worker processes cheaply.
+    Large numpy array constants ( e.g. a time grid ) can be moved to shared memory by share(),
+    then workers attach to them without copy.
+    
+    Constants given as str depend on other constants ( as in Environment() ). As in Func(), they are evaluated
+    in order of definition from the constants, before the keyword arguments of the call are applied,
+    so that an expression gives exactly the same result as the function it was made from.
+    
+    Usage :
+    f = Expression("F0*cos(OMEGA*t)", {"F0": 1, "m": 1, "k": 4, "OMEGA": "sqrt(k/m)"})
+    f(t = np.arange(0, 10, 1e-3))
+    f(t = t, k = 9)  # OMEGA = 2 from the constants, as Func() does
+    f(t = t, OMEGA = 3)
+    
+    shared = f.share(t = np.arange(0, 60, 1e-3))  # t in shared memory
+    with ProcessPoolExecutor(initializer = init_worker, initargs = (shared,)) as pool:
+        pool.map(evaluate_worker, [{"k": k} for k in dk])  # each task sends only its small arguments
+    shared.unlink()  # release the shared memory when done
+    """
+    
+    # names of functions available in expressions, the same as in Func(), without built-in functions
+    # __import__ is kept for numpy importing lazily inside a call ( an expression cannot name it, see _compile() )
+    NAMESPACE = dict(NAMESPACE, __builtins__ = {"__import__": __import__})
+    
+    def __init__(self, func, constants = None):
+        """
+        :param func: expression of the function of type str
+        :param constants: dict {name of constant: value}, value may be a number, numpy array,
+                          SharedArray() or str ( expression of a dependent constant )
+        """
+        self.func = func
+        self.constants = dict(constants or {})
+        self._compile()
+        
+    
+    def _compile(self):
+        """
+        Helper function to parse and compile the expressions, with only the names of NAMESPACE and variables allowed
+        
+        :return: None
+        """
+        self.code = _compile(self.func)
+        self.dependent = {name: _compile(value) for name, value in self.constants.items() if isinstance(value, str)}
+        
+    
+    def __getstate__(self):
+        # code objects are not picklable, and are compiled again from the expressions
+        return {"func": self.func, "constants": self.constants}
+    
+    
+    def __setstate__(self, state):
+        self.func = state["func"]
+        self.constants = state["constants"]
+        self._compile()
+        
+    
+    def __str__(self):
+        return self.func
+    
+    
+    def __call__(self, t = None, **kwargs):
+        """
+        Evaluate the expression
+        
+        :param t: default variable. Expected type of numpy.array or TimeGrid(). The constant t if any, or array([0]) by default
+        :param kwargs: user-defined variables, override the constants of the same name
+        :return: the image of the given function
+        """
+        grid = self.constants.get("t") if t is None else t
+        if isinstance(grid, TimeGrid):
+            # evaluated chunk by chunk, the timestamps are never materialized at once
+            return grid.map(lambda _t: self(_t, **kwargs))
+        
+        if t is None:
+            t = self.constants.get("t", array([0]))
+            
+        variables = {"t": t.array if isinstance(t, SharedArray) else t}
+        
+        # constants in order of definition, then the keyword arguments, as Func() does
+        for name, value in self.constants.items():
+            if name == "t":
+                continue
+            
+            if name in self.dependent:
+                variables[name] = eval(self.dependent[name], self.NAMESPACE, variables)
+            else:
+                variables[name] = value.array if isinstance(value, SharedArray) else value
+                
+        variables.update({name: value.array if isinstance(value, SharedArray) else value for name, value in kwargs.items()})
+        
+        return eval(self.code, self.NAMESPACE, variables)
+    
+    
+    def share(self, min_size = 1024, **arrays):
+        """
+        Copy of this expression with the numpy array constants ( and the given arrays, e.g. the time grid t )
+        moved to shared memory
+        The returned expression owns the shared memory : call unlink() of it when all workers are done
+        
+        :param min_size: arrays with fewer elements are kept in the constant table
+        :param arrays: other arrays to share, e.g. t = np.arange(0, 60, 1e-3), stored as constants
+        :return: instance of class Expression()
+        """
+        constants = dict(self.constants)
+        constants.update(arrays)
+        
+        for name, value in constants.items():
+            if isinstance(value, np.ndarray) and value.size >= min_size:
+                constants[name] = SharedArray(value)
+                
+        return Expression(self.func, constants)
+    
+    
+    def unlink(self):
+        """
+        Release the shared memory of the constants
+        
+        :return: None
+        """
+        for value in self.constants.values():
+            if isinstance(value, SharedArray):
+                value.unlink()
+                
+                
+class SharedArray:
+    """
+    A numpy array in multiprocessing.shared_memory
+    Pickling sends only the name, shape and dtype of the block. A worker process attaches to it on first access,
+    without copying the data
+    
+    Usage :
+    t = SharedArray(np.arange(0, 60, 1e-3))  # copy the array into shared memory once
+    t.array  # numpy array backed by the shared memory, in any process
+    t.unlink()  # release the shared memory, by the process which created it
+    """
+    
+    def __init__(self, array):
+        """
+        :param array: numpy array copied into a new block of shared memory
+        """
+        from multiprocessing import shared_memory
+        
+        array = np.asarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self._memory = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+        self.name = self._memory.name
+        self._array = np.ndarray(self.shape, self.dtype, buffer = self._memory.buf)
+        self._array[...] = array
+        
+    
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+    
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memory = None
+        self._array = None
+        
+    
+    @property
+    def array(self):
+        """
+        The numpy array, attaching to the shared memory on first access
+        
+        :return: numpy array ( read-only in processes other than the owner )
+        """
+        if self._array is None:
+            self._memory = _attach(self.name)
+            self._array = np.ndarray(self.shape, self.dtype, buffer = self._memory.buf)
+            self._array.flags.writeable = False
+            
+        return self._array
+    
+    
+    def unlink(self):
+        """
+        Release the shared memory. Arrays attached in other processes should not be used afterwards
+        
+        :return: None
+        """
+        self._array = None
+        
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+            
+            
+def _attach(name):
+    """
+    Helper function to attach to an existing block of shared memory, once per process
+    
+    :param name: name of the block
+    :return: multiprocessing.shared_memory.SharedMemory
+    """
+    from multiprocessing import shared_memory
+    
+    if name not in _ATTACHED:
+        try:
+            # attaching process does not own the block, do not let the resource tracker unlink it at exit
+            _ATTACHED[name] = shared_memory.SharedMemory(name = name, track = False)
+        except TypeError:
+            # Python < 3.13 has no track argument
+            _ATTACHED[name] = shared_memory.SharedMemory(name = name)
+            
+    return _ATTACHED[name]
+
+
+_ATTACHED = {}  # blocks of shared memory attached by this process {name: SharedMemory}
+
+
+def _compile(expression):
+    """
+    Helper function to parse an expression and compile it, refusing private names and attributes ( e.g. __class__ )
+    
+    :param expression: expression of type str
+    :return: code object
+    """
+    tree = ast.parse(expression, mode = "eval")
+    
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Attribute) and node.attr.startswith("_")) or \
+                (isinstance(node, ast.Name) and node.id.startswith("_")):
+            raise ValueError(f"Expression \"{expression}\" should not contain private names or attributes")
+        
+    return compile(tree, "<expression>", "eval")
+
+
+_worker_expression = None  # expression of the worker process, see init_worker()
+
+
+def init_worker(expression):
+    """
+    Initializer of worker processes, receiving the expression ( and its shared constants ) once per worker
+    
+    :param expression: instance of class Expression()
+    :return: None
+    """
+    global _worker_expression
+    _worker_expression = expression
+    
+    
+def evaluate_worker(kwargs):
+    """
+    Evaluate the expression of the worker process, see init_worker()
+    
+    :param kwargs: dict of variables of the call
+    :return: the image of the function
+    """
+    return _worker_expression(**kwargs)
+
+
+def evaluate_parallel(expression, tasks, workers = None, reduce = None, check = True):
+    """
+    Evaluate an expression for many sets of variables in a pool of worker processes
+    Array constants are moved to shared memory, so each task sends only its own variables
+    
+    Usage :
+    results = evaluate_parallel(x_s.expression(t = t), [{"c": c} for c in dc])
+    
+    :param expression: instance of class Expression() or Func()
+    :param tasks: list of dict of variables, one for each evaluation
+    :param workers: number of worker processes. None uses all CPU cores
+    :param reduce: (optional) function applied to each result in the worker, e.g. np.max, to return less data
+    :param check: evaluate the first task serially ( by the Func() itself if given ) and check that the results agree
+    :return: list of results
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    serial = expression
+    
+    if isinstance(expression, Func):
+        expression = expression.expression()
+        
+    shared = expression.share()
+    
+    try:
+        with ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (shared,)) as pool:
+            func = evaluate_worker if reduce is None else functools.partial(_evaluate_reduce, reduce)
+            results = list(pool.map(func, tasks))
+            
+    finally:
+        shared.unlink()
+        
+    if check and results:
+        expected = serial(**tasks[0])
+        
+        if reduce is not None:
+            expected = reduce(expected)
+            
+        if not np.allclose(results[0], expected, rtol = 1e-12, atol = 0, equal_nan = True):
+            raise ValueError(f"Parallel evaluation of {expression} differs from the serial evaluation")
+        
+    return results
+        
+
+def _evaluate_reduce(reduce, kwargs):
+    """
+    Helper function to evaluate the expression of the worker process and reduce the result
+    
+    :param reduce: function applied to the result
+    :param kwargs: dict of variables of the call
+    :return: reduced result
+    """
+    return reduce(_worker_expression(**kwargs))
 
 
 """
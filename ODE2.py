@@ -7,17 +7,30 @@ ax" + bx' + cx = d * f(t)
 Reference :
 https://stackoverflow.com/questions/19779217/need-help-solving-a-second-order-non-linear-ode-in-python
 https://cmps-people.ok.ubc.ca/jbobowsk/Python/html/Jupyter%20Second%20Order%20ODEs.html
+https://docs.scipy.org/doc/scipy/reference/generated/scipy.integrate.odeint.html  (full_output)
+https://en.wikipedia.org/wiki/Green%27s_function  (green)
+https://docs.scipy.org/doc/scipy/reference/generated/scipy.signal.oaconvolve.html
+
+Time may be a lazy TimeGrid() : stream() and observe() then materialize one chunk of time at a time,
+and green() uses its constant step without checking the spacing
+
+Solves can be instrumented by passing a Profiler() to ODE2(), which collects the odeint counters,
+step sizes, method switches and timings of each solve, e.g. to find the expensive region of a sweep
 
 Written by S. P. Lam
 """
 
-# import numpy as np
+import time
+
+import numpy as np
 from scipy.integrate import odeint
 
+from TimeGrid import TimeGrid
+
 
 class ODE2:
     
-    def __init__(self, a, b, c, d, x0, x_dot0, f = 1):
+    def __init__(self, a, b, c, d, x0, x_dot0, f = 1, profiler = None):
         """
         A class dedicated for solving second order differential equation.
         ax" + bx' + cx = d * f(t)
@@ -32,8 +45,15 @@ class ODE2:
         :param d: constant term
         :param x0: initial condition for x at t = t0
         :param x_dot0: initial condition of x' at t = t0
-        :param f: (optional) a callable function of time t with d as its coefficient
+        :param f: (optional) a callable function of time t with d as its coefficient,
+                  or samples as a tuple (time, values) interpolated by Forcing.Tabulated()
+        :param profiler: (optional) Profiler() collecting the statistics of each solve. No overhead if not given
         """
+        if isinstance(f, tuple):
+            from Forcing import Tabulated
+            
+            f = Tabulated(f[1], t = f[0])
+            
         self.a = a
         self.b = b
         self.c = c
@@ -41,20 +61,418 @@ class ODE2:
         self.x0 = x0
         self.x_dot0 = x_dot0
         self.f = f
+        self.profiler = profiler
         
-    def __call__(self, t, *args, **kwargs):
+    def __call__(self, t, *args, method = "odeint", **kwargs):
         """
         Get the result of the solved ODE at given time t
         
         :param t: time, must be at least 1D array e.g. np.arange(0, 10, 1e-3)
         :param args:
+        :param method: (optional) "odeint", or "green" for the convolution with the Green's function, see green()
         :param kwargs:
         :return: tuple of (position, velocity)
         """
-        x, v = odeint(self.ddotX, (self.x0, self.x_dot0), t).T  # .T --> transpose
+        if method == "green":
+            return self.green(t)
+        
+        if method != "odeint":
+            raise ValueError(f"Unknown method {method}, should be odeint or green")
+        
+        x, v = self._odeint((self.x0, self.x_dot0), t).T  # .T --> transpose
         
         return x, v
+    
+    def stream(self, t, chunk = 1000):
+        """
+        Solve the ODE chunk by chunk, e.g. for live plotting of a long solve
+        Each chunk continues from the last state of the previous one
+        
+        Usage:
+        for _t, x, v in ode.stream(np.arange(0, 600, 1e-3), chunk = 500):
+            fig.append(_t, x)
+        
+        :param t: time, must be at least 1D array e.g. np.arange(0, 10, 1e-3), or TimeGrid()
+        :param chunk: number of time samples in each chunk
+        :return: generator of tuple (time, position, velocity) of each chunk
+        """
+        state = (self.x0, self.x_dot0)
+        yield np.asarray(t[:1], dtype = float), [self.x0], [self.x_dot0]
+        
+        for start in range(0, len(t) - 1, chunk):
+            _t = np.asarray(t[start:start + chunk + 1], dtype = float)
+            x, v = self._odeint(state, _t).T
+            state = (x[-1], v[-1])
+            
+            # first sample is the last sample of the previous chunk
+            yield _t[1:], x[1:], v[1:]
+        
+    def _odeint(self, y0, t, rhs = None):
+        """
+        Helper function to call odeint(), with instrumentation if a profiler is given
+        
+        :param y0: initial state (x, x')
+        :param t: time
+        :param rhs: (optional) right hand side of the system, ddotX by default
+        :return: numpy array of shape (len(t), len(y0))
+        """
+        rhs = rhs or self.ddotX
+        t = np.asarray(t, dtype = float)  # e.g. TimeGrid()
+        
+        if self.profiler is None:
+            return odeint(rhs, y0, t)
+        
+        # count the time spent in ddotX() and in the forcing function f(t)
+        timer = {"rhs": 0.0, "f": 0.0}
+        f = self.f
+        
+        if callable(f):
+            def _f(_t):
+                start = time.perf_counter()
+                value = f(_t)
+                timer["f"] += time.perf_counter() - start
+                return value
+            
+            self.f = _f
+        
+        def _ddotX(x, _t):
+            start = time.perf_counter()
+            value = rhs(x, _t)
+            timer["rhs"] += time.perf_counter() - start
+            return value
         
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        
+        try:
+            y, info = odeint(_ddotX, y0, t, full_output = True)
+        finally:
+            self.f = f
+            
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        
+        self.profiler.record(self, Profiler.stats(info, len(t), wall, cpu, timer["rhs"], timer["f"]))
+        
+        return y
+    
+    def observe(self, t, observables = ("energy", "damping_loss", "input_work", "driving_power", "max_amplitude"),
+                custom = None, chunk = 10000, trajectory = False):
+        """
+        Solve the ODE and reduce observables during the integration, without storing the whole trajectory
+        Integrals over time (e.g. work done by damping) are integrated with the state as augmented variables,
+        the other reductions (final value, max, min, rms) are updated chunk by chunk,
+        so that the memory used is O(chunk) instead of O(len(t))
+        
+        Built-in observables ( see OBSERVABLES ) :
+        kinetic, potential, energy : a*v^2/2, c*x^2/2 and their sum at the last time
+        damping_loss : work done against damping, integral of b*v^2 dt
+        input_work : work done by the driving force, integral of d*f(t)*v dt
+        driving_power : mean power of the driving force, input_work / (t_end - t0)
+        max_amplitude : maximum of |x|
+        
+        Usage:
+        result = ode.observe(np.arange(0, 600, 1e-3))
+        result["input_work"] - result["damping_loss"]  # == change of energy
+        ode.observe(t, ["max_amplitude"], custom = {"max_speed": (lambda t, x, v: abs(v), "max")})
+        
+        :param t: time, must be at least 1D array e.g. np.arange(0, 10, 1e-3)
+        :param observables: names of built-in observables
+        :param custom: (optional) user-defined observables {name: (function of (t, x, v), reduction)},
+                       reduction is one of "integral", "mean" (time average), "final", "max", "min", "rms".
+                       The function is called with numpy arrays, or with floats for "integral" and "mean"
+        :param chunk: number of time samples processed at a time
+        :param trajectory: also return the whole x and v, e.g. for checking
+        :return: dict {name: value}, with "x" and "v" if trajectory is True
+        """
+        specs = {name: OBSERVABLES[name] for name in observables}
+        for name, (func, reduction) in (custom or {}).items():
+            specs[name] = (lambda ode, _t, x, v, _func = func: _func(_t, x, v), reduction)
+            
+        for name, (_, reduction) in specs.items():
+            if reduction not in ("integral", "mean", "final", "max", "min", "rms"):
+                raise ValueError(f"Unknown reduction {reduction} of observable {name}")
+            
+        # integrals are augmented variables of the state
+        integrals = [name for name, (_, reduction) in specs.items() if reduction in ("integral", "mean")]
+        samples = [name for name in specs if name not in integrals]
+        
+        def rhs(y, _t):
+            dy = [*self.ddotX(y[:2], _t)]
+            for name in integrals:
+                dy.append(specs[name][0](self, _t, y[0], y[1]))
+            return dy
+        
+        state = np.r_[self.x0, self.x_dot0, np.zeros(len(integrals))]
+        values = {}
+        sum_square = {}
+        xs, vs = [], []
+        
+        for start in range(0, max(len(t) - 1, 1), chunk):
+            _t = np.asarray(t[start:start + chunk + 1], dtype = float)
+            y = self._odeint(state, _t, rhs) if len(_t) > 1 else state[None, :]
+            state = y[-1]
+            
+            # first sample is the last sample of the previous chunk
+            first = 0 if start == 0 else 1
+            _t, x, v = _t[first:], y[first:, 0], y[first:, 1]
+            
+            for name in samples:
+                func, reduction = specs[name]
+                value = np.broadcast_to(func(self, _t, x, v), _t.shape)
+                
+                if reduction == "final":
+                    values[name] = value[-1]
+                elif reduction == "max":
+                    values[name] = max(values.get(name, -np.inf), value.max())
+                elif reduction == "min":
+                    values[name] = min(values.get(name, np.inf), value.min())
+                else:
+                    sum_square[name] = sum_square.get(name, 0) + np.sum(value ** 2)
+                    
+            if trajectory:
+                xs.append(x)
+                vs.append(v)
+                
+        for name in sum_square:
+            values[name] = np.sqrt(sum_square[name] / len(t))
+            
+        duration = t[-1] - t[0]
+        for i, name in enumerate(integrals):
+            values[name] = state[2 + i]
+            
+            if specs[name][1] == "mean":
+                # time average
+                values[name] = values[name] / duration if duration else np.nan
+            
+        if trajectory:
+            values["x"] = np.concatenate(xs)
+            values["v"] = np.concatenate(vs)
+            
+        # in the order of the request
+        return {name: values[name] for name in list(specs) + (["x", "v"] if trajectory else [])}
+    
+    def stroboscope(self, omega, n_periods, t0 = 0, samples = 0, tol = None, block = 64):
+        """
+        Stroboscopic ( Poincare section ) output of a driven oscillator :
+        the state (x, v) only at the phases t = t0 + n * 2*pi/omega, n = 0, 1, ..., n_periods
+        The strobe times are output times of the integrator, so the state is sampled exactly at each phase
+        
+        Usage:
+        ode = ODE2(m, c, k, F0, x0, x_dot0, lambda t: np.cos(OMEGA_0 * t))
+        result = ode.stroboscope(OMEGA_0, 10000, samples = 64, tol = 1e-6)
+        result["x"], result["v"]  # one state per period
+        result["converged"]  # first period in the periodic steady state, or None
+        
+        :param omega: driving (angular) frequency
+        :param n_periods: maximum number of periods
+        :param t0: time of the first phase, where the state is (x0, x_dot0)
+        :param samples: (optional) number of samples per period to compute the summaries of x in each period
+                        ( max, min and RMS ), no summaries if 0
+        :param tol: (optional) stop when the state changes over one period by less than tol relative to its size,
+                    i.e. the motion has converged to a periodic steady state
+        :param block: number of periods solved in each call of the integrator
+        :return: dict of numpy arrays
+                 - t, x, v : time and state at each phase, of length (number of periods + 1)
+                 - max, min, rms : summaries of x in each period, if samples > 0
+                 - converged : index of the first phase whose state differs from the previous one by less than tol,
+                               or None
+        """
+        period = 2 * np.pi / omega
+        S = max(int(samples), 1)
+        state = np.array([self.x0, self.x_dot0], dtype = float)
+        result = {"t": [np.array([t0], dtype = float)], "x": [state[:1]], "v": [state[1:]]}
+        summaries = {"max": [], "min": [], "rms": []}
+        converged = None
+        
+        for start in range(0, n_periods, block):
+            B = min(block, n_periods - start)
+            grid = t0 + np.arange(start * S, (start + B) * S + 1) * (period / S)
+            y = self._odeint(state, grid)
+            state = y[-1]
+            
+            strobe = y[S::S]  # state at the end of each period
+            result["t"].append(grid[S::S])
+            result["x"].append(strobe[:, 0])
+            result["v"].append(strobe[:, 1])
+            
+            if samples:
+                x = y[:-1, 0].reshape(B, S)
+                summaries["max"].append(np.maximum(x.max(axis = 1), strobe[:, 0]))
+                summaries["min"].append(np.minimum(x.min(axis = 1), strobe[:, 0]))
+                summaries["rms"].append(np.sqrt(np.mean(x ** 2, axis = 1)))
+                
+            if tol is not None:
+                # change of the state over one period, with v scaled by omega to the same unit as x
+                previous = np.r_[y[:1], strobe[:-1]]
+                change = np.hypot(strobe[:, 0] - previous[:, 0], (strobe[:, 1] - previous[:, 1]) / omega)
+                size = np.hypot(strobe[:, 0], strobe[:, 1] / omega)
+                hits = np.flatnonzero(change <= tol * np.maximum(size, np.finfo(float).tiny))
+                
+                if len(hits):
+                    converged = start + hits[0] + 1
+                    break
+                
+        # drop the periods after convergence
+        n = n_periods if converged is None else converged
+        output = {key: np.concatenate(value)[:n + 1] for key, value in result.items()}
+        if samples:
+            output.update({key: np.concatenate(value)[:n] for key, value in summaries.items()})
+        output["converged"] = converged
+        
+        return output
+    
+    def sensitivity(self, t, params = ("a", "b", "c", "d", "x0", "x_dot0"), forcing = None):
+        """
+        Solve the ODE together with its forward sensitivities dx/dp and dv/dp in one augmented solve
+        
+        x" = g(t, x, v) = (d*f(t) - b*v - c*x) / a
+        For every parameter p, s = dx/dp and u = dv/dp satisfy
+        s' = u
+        u' = -(c/a)*s - (b/a)*u + dg/dp
+        with s(t0) = 1 for p = x0, u(t0) = 1 for p = x_dot0, and 0 otherwise
+        
+        Usage:
+        ode = ODE2(m, c, k, F0, x0, x_dot0, lambda t: np.cos(OMEGA_0 * t))
+        sens = ode.sensitivity(t, ("b",), forcing = {"OMEGA_0": lambda t: -t * np.sin(OMEGA_0 * t)})
+        sens.dx[0]  # dx/db, i.e. with respect to the damping constant
+        x, v = sens.predict(b = 0.1)  # first order prediction of the solution with the damping constant + 0.1
+        
+        :param t: time, must be at least 1D array e.g. np.arange(0, 10, 1e-3)
+        :param params: parameters among a, b, c, d, x0, x_dot0
+        :param forcing: (optional) parameters of the driving function {name: df/dp, a callable function of time t}
+        :return: instance of class Sensitivity()
+        """
+        forcing = forcing or {}
+        names = list(params) + [name for name in forcing if name not in params]
+        
+        for name in names:
+            if name not in ("a", "b", "c", "d", "x0", "x_dot0") and name not in forcing:
+                raise ValueError(f"Unknown parameter {name}, derivative of the driving function should be given by forcing")
+            
+        P = len(names)
+        
+        def rhs(y, _t):
+            x, v = y[0], y[1]
+            f = self.force(_t)
+            g = (self.d * f - self.b * v - self.c * x) / self.a
+            
+            # dg/dp
+            partial = {"a": -g / self.a, "b": -v / self.a, "c": -x / self.a, "d": f / self.a, "x0": 0., "x_dot0": 0.}
+            g_p = [self.d * forcing[name](_t) / self.a if name in forcing else partial[name] for name in names]
+            
+            dy = np.empty(2 + 2 * P)
+            dy[0] = v
+            dy[1] = g
+            dy[2:2 + P] = y[2 + P:]
+            dy[2 + P:] = -(self.c / self.a) * y[2:2 + P] - (self.b / self.a) * y[2 + P:] + g_p
+            
+            return dy
+        
+        y0 = np.zeros(2 + 2 * P)
+        y0[0], y0[1] = self.x0, self.x_dot0
+        
+        for i, name in enumerate(names):
+            if name == "x0":
+                y0[2 + i] = 1.
+            elif name == "x_dot0":
+                y0[2 + P + i] = 1.
+                
+        y = self._odeint(y0, t, rhs)
+        
+        return Sensitivity(names, y[:, 0], y[:, 1], y[:, 2:2 + P].T, y[:, 2 + P:].T)
+    
+    def green(self, t, tol = 1e-16):
+        """
+        Solve the ODE by convolution of the sampled driving term with the Green's function (impulse response)
+        
+        x(t) = x_h(t) + integral of h(t - s) * (d/a) * f(s) ds from t0 to t
+        where h is the closed-form response to a unit impulse of x" + (b/a)x' + (c/a)x and
+        x_h is the response to the initial condition
+        
+        The driving term is sampled on the grid and taken as piecewise linear between samples,
+        for which the discrete kernel is exact, so the only error is the sampling of f(t) itself.
+        The convolution is done by FFT in O(n log n), by overlap-add when h decays within a fraction of the interval.
+        Much faster than odeint() for noisy, pulse-train or measured driving terms.
+        
+        Usage:
+        ode = ODE2(5, 1.75, 50, 4, 0, 0, lambda t: np.sign(np.sin(3 * t)))
+        x, v = ode(t, method = "green")
+        
+        :param t: time, uniformly spaced 1D array e.g. np.arange(0, 10, 1e-3), or TimeGrid()
+        :param tol: the kernel is truncated where its envelope decays below tol
+        :return: tuple of numpy arrays (position, velocity)
+        """
+        from scipy.signal import fftconvolve, oaconvolve
+        
+        n = len(t)
+        
+        if self.a == 0 or self.c == 0:
+            raise ValueError(f"Green's function solver requires a != 0 and c != 0, got a = {self.a}, c = {self.c}")
+        
+        if n < 2:
+            return np.full(n, float(self.x0)), np.full(n, float(self.x_dot0))
+        
+        if isinstance(t, TimeGrid):
+            # uniform by construction
+            dt = t.step
+            t = t.values()
+            
+        else:
+            t = np.asarray(t, dtype = float)
+            dt = (t[-1] - t[0]) / (n - 1)
+            
+            if not np.allclose(np.diff(t), dt, rtol = 1e-6, atol = 0):
+                raise ValueError("Green's function solver requires uniformly spaced time t")
+            
+        gamma = self.b / (2 * self.a)
+        tau = t - t[0]
+        
+        # kernel truncated where its envelope is negligible, if the system is damped
+        # the slowest decay rate is gamma, or gamma - sqrt(gamma^2 - c/a) for over-damping
+        decay = gamma - np.sqrt(max(gamma ** 2 - self.c / self.a, 0))
+        size = n
+        if decay > 0:
+            size = min(n, int(np.ceil(-np.log(tol) / decay / dt)) + 2)
+            
+        _tau = np.arange(-1, size + 1) * dt  # tau - dt, ..., tau + dt of the kernel
+        h, H1, H2 = _responses(self.a, self.b, self.c, _tau)
+        
+        # exact response at tau_j to a unit hat function of half width dt centred at 0 ( interior samples of f )
+        G = (H2[2:] - 2 * H2[1:-1] + H2[:-2]) / dt
+        G_dot = (H1[2:] - 2 * H1[1:-1] + H1[:-2]) / dt
+        
+        # response to the half hat of the first sample, which starts at t0
+        h, H1, H2 = _responses(self.a, self.b, self.c, np.stack([tau, tau - dt]))
+        E = H1[0] - H2[0] / dt + H2[1] / dt
+        E_dot = h[0] - H1[0] / dt + H1[1] / dt
+        
+        F = np.broadcast_to(self.force(t), t.shape) * (self.d / self.a)
+        convolve = oaconvolve if 8 * size < n else fftconvolve
+        
+        x = convolve(F, G)[:n]
+        v = convolve(F, G_dot)[:n]
+        x[:size] += F[0] * (E[:size] - G)
+        v[:size] += F[0] * (E_dot[:size] - G_dot)
+        x[size:] += F[0] * E[size:]
+        v[size:] += F[0] * E_dot[size:]
+        
+        # response to the initial condition : (x_dot0 + 2 gamma x0) h + x0 h'
+        h, h_dot = h[0], _responses(self.a, self.b, self.c, tau, derivative = True)
+        x += (self.x_dot0 + 2 * gamma * self.x0) * h + self.x0 * h_dot
+        v += (self.x_dot0 + 2 * gamma * self.x0) * h_dot + self.x0 * (-2 * gamma * h_dot - (self.c / self.a) * h)
+        
+        return x, v
+    
+    def force(self, t):
+        """
+        Driving term f(t), for a callable or constant f
+        
+        :param t: time, float or numpy array
+        :return: f(t)
+        """
+        return self.f(t) if callable(self.f) else self.f
+    
     def ddotX(self, x, t):
         """
         Helper function for odeint() to solve the differential equation
@@ -80,3 +498,294 @@ class ODE2:
             ddot_x = -(self.b/self.a)*v - (self.c/self.a)*x[0] + self.d*self.f/self.a
         
         return v, ddot_x
+
+
+class Sensitivity:
+    
+    def __init__(self, params, x, v, dx, dv):
+        """
+        Solution of ODE2 with its forward sensitivities, returned by ODE2.sensitivity()
+        
+        :param params: names of the parameters
+        :param x: displacement x(t)
+        :param v: velocity v(t)
+        :param dx: dx/dp, numpy array of shape (len(params), len(t))
+        :param dv: dv/dp, numpy array of shape (len(params), len(t))
+        """
+        self.params = list(params)
+        self.x = x
+        self.v = v
+        self.dx = dx
+        self.dv = dv
+        
+    def __getitem__(self, name):
+        """
+        Sensitivities with respect to a parameter
+        
+        :param name: name of the parameter
+        :return: tuple (dx/dp, dv/dp)
+        """
+        i = self.params.index(name)
+        
+        return self.dx[i], self.dv[i]
+    
+    def predict(self, **delta):
+        """
+        First order prediction of the solution at nearby parameter values, without solving again
+        x(p + dp) ~ x(p) + sum over p of dx/dp * dp
+        
+        :param delta: change of each parameter, e.g. predict(b = 0.1, d = -0.5)
+        :return: tuple of numpy arrays (position, velocity)
+        """
+        x = self.x.copy()
+        v = self.v.copy()
+        
+        for name, dp in delta.items():
+            dx, dv = self[name]
+            x += dp * dx
+            v += dp * dv
+            
+        return x, v
+
+
+# built-in observables of ODE2.observe() {name: (function of (ode, t, x, v), reduction)}
+OBSERVABLES = {
+    "kinetic": (lambda ode, t, x, v: ode.a * v ** 2 / 2, "final"),
+    "potential": (lambda ode, t, x, v: ode.c * x ** 2 / 2, "final"),
+    "energy": (lambda ode, t, x, v: (ode.a * v ** 2 + ode.c * x ** 2) / 2, "final"),
+    "damping_loss": (lambda ode, t, x, v: ode.b * v ** 2, "integral"),
+    "input_work": (lambda ode, t, x, v: ode.d * ode.force(t) * v, "integral"),
+    "driving_power": (lambda ode, t, x, v: ode.d * ode.force(t) * v, "mean"),
+    "max_amplitude": (lambda ode, t, x, v: np.abs(x), "max")
+}
+
+
+def _responses(a, b, c, tau, derivative = False):
+    """
+    Helper function for ODE2.green() : closed-form responses of ax" + bx' + cx = a * input
+    to a unit impulse h, step H1 and ramp H2 at time tau, zero for tau < 0
+    
+    With the roots r of a r^2 + b r + c = 0,
+    h = (exp(r1 tau) - exp(r2 tau)) / (r1 - r2), or tau exp(r tau) for a double root ( critical damping )
+    The roots are complex for under-damping, the results are real.
+    
+    :param a: coefficient for x"
+    :param b: coefficient for x'
+    :param c: coefficient for x, non zero
+    :param tau: time since the input, numpy array
+    :param derivative: return h' instead
+    :return: tuple of numpy arrays (h, H1, H2), or h' if derivative
+    """
+    root = np.sqrt(complex(b ** 2 - 4 * a * c))
+    r1 = (-b + root) / (2 * a)
+    r2 = (-b - root) / (2 * a)
+    
+    causal = tau >= 0
+    tau = np.where(causal, tau, 0)
+    
+    if abs(r1 - r2) <= 1e-8 * abs(r1):
+        # double root r
+        r = ((r1 + r2) / 2).real
+        e = np.exp(r * tau)
+        
+        if derivative:
+            return np.where(causal, e * (1 + r * tau), 0)
+        
+        h = tau * e
+        H1 = e * (tau / r - 1 / r ** 2) + 1 / r ** 2
+        H2 = e * (tau / r ** 2 - 2 / r ** 3) + 2 / r ** 3 + tau / r ** 2
+        
+    else:
+        e1 = np.exp(r1 * tau)
+        e2 = np.exp(r2 * tau)
+        
+        if derivative:
+            return np.where(causal, ((r1 * e1 - r2 * e2) / (r1 - r2)).real, 0)
+        
+        h = ((e1 - e2) / (r1 - r2)).real
+        H1 = (((e1 - 1) / r1 - (e2 - 1) / r2) / (r1 - r2)).real
+        H2 = (((e1 - 1) / r1 ** 2 - tau / r1 - (e2 - 1) / r2 ** 2 + tau / r2) / (r1 - r2)).real
+        
+    return np.where(causal, h, 0), np.where(causal, H1, 0), np.where(causal, H2, 0)
+
+
+def solve_batch(a, b, c, d, x0, x_dot0, t, f = 1):
+    """
+    Solve N independent equations a_i x" + b_i x' + c_i x = d_i * f_i(t) in one call of odeint()
+    The states are interleaved (x_0, v_0, x_1, v_1, ...) so that the Jacobian is banded,
+    and one step of the integrator advances all equations, which is much faster than N separate solves
+    for many small equations. The step size is shared, i.e. set by the most demanding equation.
+    
+    Usage:
+    c = np.linspace(0.1, 2.5, 100)
+    x, v = solve_batch(5, c, 50, 4, 0, 0, t, lambda t: np.cos(3 * t))  # x.shape == (100, len(t))
+    
+    :param a: coefficients for x", scalar or array of shape (N,). All coefficients are broadcast together
+    :param b: coefficients for x'
+    :param c: coefficients for x
+    :param d: constant terms
+    :param x0: initial conditions for x at t = t0
+    :param x_dot0: initial conditions of x' at t = t0
+    :param t: time, must be at least 1D array e.g. np.arange(0, 10, 1e-3)
+    :param f: (optional) callable function of time t returning a scalar or an array of shape (N,), or a constant
+    :return: tuple of numpy arrays (position, velocity), each of shape (N, len(t))
+    """
+    # the number of equations N is given by the coefficients or the shape of f(t)
+    shape = np.shape(f(t[0])) if callable(f) else np.shape(f)
+    a, b, c, d, x0, x_dot0, _ = np.broadcast_arrays(*(np.atleast_1d(np.asarray(i, dtype = float))
+                                                      for i in (a, b, c, d, x0, x_dot0, np.zeros(shape))))
+    n = len(a)
+    
+    def ddotX(y, _t):
+        x = y[0::2]
+        v = y[1::2]
+        force = f(_t) if callable(f) else f
+        
+        dy = np.empty_like(y)
+        dy[0::2] = v
+        dy[1::2] = (d * force - b * v - c * x) / a
+        
+        return dy
+    
+    y0 = np.empty(2 * n)
+    y0[0::2] = x0
+    y0[1::2] = x_dot0
+    
+    y = odeint(ddotX, y0, t, ml = 1, mu = 1)
+
+    return y[:, 0::2].T, y[:, 1::2].T
+
+
+class Profiler:
+    
+    # fields of a record summed by summary()
+    TOTALS = ("wall", "cpu", "rhs_time", "f_time", "n_steps", "n_rhs", "n_jac", "n_switches")
+    
+    def __init__(self, callback = None):
+        """
+        Collect statistics of ODE2 solves, e.g. over a sweep of constants
+        Each solve appends a record (dict) with the constants of the ODE and
+        - n_points : number of output time samples
+        - n_steps, n_rhs, n_jac : number of steps, evaluations of ddotX and of the Jacobian by odeint
+        - h_min, h_max, h_mean : step sizes
+        - n_switches, stiff : number of switches between Adams (non-stiff) and BDF (stiff) methods,
+          fraction of the output intervals solved by BDF
+        - wall, cpu : wall and CPU time of the solve (s)
+        - rhs_time, f_time : time spent inside ddotX and the forcing function f(t) (s)
+        - message : message of odeint
+        
+        Usage:
+        profiler = Profiler()
+        for c in dc:
+            ODE2(m, c, k, F0, x0, x_dot0, f, profiler = profiler)(t)
+        print(profiler.report())
+        
+        :param callback: (optional) function called as callback(ode, record) after each solve
+        """
+        self.records = []
+        self.callbacks = [callback] if callback is not None else []
+        
+    def add_callback(self, callback):
+        """
+        Add a function called as callback(ode, record) after each solve
+        
+        :param callback: callable
+        :return: None
+        """
+        self.callbacks.append(callback)
+        
+    def record(self, ode, stats):
+        """
+        Store the statistics of a solve and call the callbacks
+        
+        :param ode: the ODE2 solved
+        :param stats: dict of statistics, see Profiler.stats()
+        :return: the record stored
+        """
+        record = {"a": ode.a, "b": ode.b, "c": ode.c, "d": ode.d}
+        record.update(stats)
+        self.records.append(record)
+        
+        for callback in self.callbacks:
+            callback(ode, record)
+            
+        return record
+    
+    @staticmethod
+    def stats(info, n_points, wall, cpu, rhs_time, f_time):
+        """
+        Helper function to summarise the full_output of odeint()
+        
+        :param info: dict returned by odeint(..., full_output = True)
+        :param n_points: number of output time samples
+        :param wall: wall time of the solve
+        :param cpu: CPU time of the solve
+        :param rhs_time: time spent inside ddotX
+        :param f_time: time spent inside the forcing function
+        :return: dict of statistics
+        """
+        h = info["hu"][info["hu"] > 0]  # step sizes, 0 before the first step
+        method = info["mused"]  # 1 : Adams, 2 : BDF, for each output interval
+        
+        return {
+            "n_points": n_points,
+            "n_steps": int(info["nst"][-1]) if len(info["nst"]) else 0,
+            "n_rhs": int(info["nfe"][-1]) if len(info["nfe"]) else 0,
+            "n_jac": int(info["nje"][-1]) if len(info["nje"]) else 0,
+            "h_min": float(h.min()) if len(h) else np.nan,
+            "h_max": float(h.max()) if len(h) else np.nan,
+            "h_mean": float(h.mean()) if len(h) else np.nan,
+            "n_switches": int(np.count_nonzero(np.diff(method))),
+            "stiff": float(np.mean(method == 2)) if len(method) else 0.0,
+            "wall": wall,
+            "cpu": cpu,
+            "rhs_time": rhs_time,
+            "f_time": f_time,
+            "message": info["message"]
+        }
+    
+    def summary(self):
+        """
+        Totals over all solves recorded
+        
+        :return: dict with the number of solves and the sum of each field in Profiler.TOTALS
+        """
+        totals = {"n_solves": len(self.records)}
+        
+        for key in self.TOTALS:
+            totals[key] = sum(record[key] for record in self.records)
+            
+        return totals
+    
+    def report(self, sort = "wall", top = None):
+        """
+        Text report of the solves recorded, most expensive first, followed by the totals
+        
+        :param sort: field of the records to sort by
+        :param top: (optional) number of solves listed
+        :return: type str
+        """
+        header = f"{'a':>8} {'b':>8} {'c':>8} {'d':>8} {'steps':>8} {'rhs':>8} {'jac':>6} {'h_min':>9} {'h_max':>9} " \
+                 f"{'switch':>6} {'stiff':>6} {'wall(s)':>9} {'cpu(s)':>9} {'rhs(s)':>9} {'f(s)':>9}"
+        lines = [header]
+        records = sorted(self.records, key = lambda record: record[sort], reverse = True)
+        
+        for r in records[:top]:
+            lines.append(f"{r['a']:>8.4g} {r['b']:>8.4g} {r['c']:>8.4g} {r['d']:>8.4g} {r['n_steps']:>8} {r['n_rhs']:>8} "
+                         f"{r['n_jac']:>6} {r['h_min']:>9.3g} {r['h_max']:>9.3g} {r['n_switches']:>6} {r['stiff']:>6.2f} "
+                         f"{r['wall']:>9.4f} {r['cpu']:>9.4f} {r['rhs_time']:>9.4f} {r['f_time']:>9.4f}")
+            
+        s = self.summary()
+        lines.append(f"{s['n_solves']} solves : {s['n_steps']} steps, {s['n_rhs']} rhs and {s['n_jac']} jacobian evaluations, "
+                     f"{s['n_switches']} method switches, wall {s['wall']:.4f} s, cpu {s['cpu']:.4f} s, "
+                     f"ddotX {s['rhs_time']:.4f} s, f(t) {s['f_time']:.4f} s")
+        
+        return "\n".join(lines)
+    
+    def clear(self):
+        """
+        Remove all records
+        
+        :return: None
+        """
+        self.records.clear()
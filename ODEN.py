@@ -0,0 +1,307 @@
+"""
+ODEN.py
+
+A class dedicated for solving a system of coupled second order differential equations.
+M x" + C x' + K x = d * f(t)
+where M, C, K are (sparse) n x n matrices and x is a vector of n degrees of freedom (DOF).
+This is the vector generalization of ODE2 ( ax" + bx' + cx = d * f(t) )
+
+Helper functions are given to build the matrices of a chain and a square lattice of masses
+
+Reference :
+https://en.wikipedia.org/wiki/Newmark-beta_method
+https://en.wikipedia.org/wiki/Modal_analysis
+
+Written by S. P. Lam
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu, eigsh
+from scipy.integrate import solve_ivp
+
+
+class ODEN:
+
+    def __init__(self, M, C, K, d, x0, x_dot0, f = 1):
+        """
+        A class dedicated for solving a system of coupled second order differential equations.
+        M x" + C x' + K x = d * f(t)
+
+        Usage:
+        M, C, K = chain(1000, m = 1, c = 0.1, k = 50)  # chain of 1000 masses
+        d = np.zeros(1000)
+        d[0] = 1  # driving force acts on the first mass
+        ode = ODEN(M, C, K, d, np.zeros(1000), np.zeros(1000), lambda t: np.cos(3 * t))
+        x, v = ode(np.arange(0, 60, 1e-3))  # x[i, j] : displacement of mass j at time t[i]
+
+        :param M: mass matrix, n x n scipy sparse matrix or numpy array
+        :param C: damping matrix, n x n scipy sparse matrix or numpy array
+        :param K: stiffness matrix, n x n scipy sparse matrix or numpy array
+        :param d: load vector of length n, or a scalar applied to all DOF
+        :param x0: initial condition for x at t = t0, vector of length n
+        :param x_dot0: initial condition for x' at t = t0, vector of length n
+        :param f: (optional) a callable function of time t with d as its coefficient.
+                  It may return a scalar or a vector of length n
+        """
+        self.M = sparse.csc_matrix(M, dtype = float)
+        self.C = sparse.csc_matrix(C, dtype = float)
+        self.K = sparse.csc_matrix(K, dtype = float)
+        self.n = self.M.shape[0]
+        self.d = np.broadcast_to(np.asarray(d, dtype = float), (self.n,))
+        self.x0 = np.broadcast_to(np.asarray(x0, dtype = float), (self.n,)).copy()
+        self.x_dot0 = np.broadcast_to(np.asarray(x_dot0, dtype = float), (self.n,)).copy()
+        self.f = f
+
+        for name, matrix in (("C", self.C), ("K", self.K)):
+            if matrix.shape != self.M.shape:
+                raise ValueError(f"Shape of {name} {matrix.shape} does not match shape of M {self.M.shape}")
+
+    def force(self, t):
+        """
+        External force d * f(t) at time t
+
+        :param t: time
+        :return: force vector of length n
+        """
+        if callable(self.f):
+            return self.d * self.f(t)
+
+        return self.d * self.f
+
+    def __call__(self, t, method = "newmark", substeps = 1, **kwargs):
+        """
+        Get the result of the solved system at given time t
+
+        Methods :
+        "newmark" : implicit Newmark-beta (average acceleration) method. Unconditionally stable.
+                    The effective stiffness matrix is factorized once by sparse LU, each step costs O(n) for banded systems.
+                    t should be uniformly spaced, otherwise the matrix is re-factorized whenever the step changes
+        "bdf", "radau" : scipy.integrate.solve_ivp() on the first order system with a sparse Jacobian.
+                         M must be diagonal (lumped mass)
+
+        :param t: time, must be at least 1D array e.g. np.arange(0, 10, 1e-3)
+        :param method: "newmark", "bdf" or "radau"
+        :param substeps: (newmark) number of integration steps between 2 output times
+        :param kwargs: (bdf, radau) other keyword arguments passed to solve_ivp(), e.g. rtol, atol
+        :return: tuple of (position, velocity), each of shape (len(t), n)
+        """
+        t = np.asarray(t, dtype = float)
+
+        if method == "newmark":
+            return self._newmark(t, substeps)
+
+        if method in ("bdf", "radau"):
+            return self._ivp(t, "BDF" if method == "bdf" else "Radau", **kwargs)
+
+        raise ValueError(f"Unknown method \"{method}\". Expected \"newmark\", \"bdf\" or \"radau\"")
+
+    def _newmark(self, t, substeps = 1, beta = 0.25, gamma = 0.5):
+        """
+        Helper function to integrate the system by Newmark-beta method
+
+        :param t: output time, numpy array
+        :param substeps: number of integration steps between 2 output times
+        :param beta: Newmark parameter beta
+        :param gamma: Newmark parameter gamma
+        :return: tuple of (position, velocity), each of shape (len(t), n)
+        """
+        M, C, K = self.M, self.C, self.K
+
+        x_out = np.empty((len(t), self.n))
+        v_out = np.empty((len(t), self.n))
+        x = self.x0.copy()
+        v = self.x_dot0.copy()
+        x_out[0] = x
+        v_out[0] = v
+
+        # initial acceleration from the equation of motion
+        a = splu(M).solve(self.force(t[0]) - C @ v - K @ x)
+
+        lu = None
+        h_lu = None
+
+        for i in range(1, len(t)):
+            h = (t[i] - t[i-1]) / substeps
+
+            if lu is None or not np.isclose(h, h_lu, rtol = 1e-9, atol = 0):
+                # (re-)factorize the effective stiffness matrix
+                lu = splu(sparse.csc_matrix(K + (gamma / (beta * h)) * C + (1 / (beta * h ** 2)) * M))
+                h_lu = h
+
+            for j in range(1, substeps + 1):
+                _t = t[i-1] + j * h
+
+                rhs = (self.force(_t)
+                       + M @ (x / (beta * h ** 2) + v / (beta * h) + (1 / (2 * beta) - 1) * a)
+                       + C @ ((gamma / (beta * h)) * x + (gamma / beta - 1) * v + h * (gamma / (2 * beta) - 1) * a))
+                x_new = lu.solve(rhs)
+                a_new = (x_new - x) / (beta * h ** 2) - v / (beta * h) - (1 / (2 * beta) - 1) * a
+                v = v + h * ((1 - gamma) * a + gamma * a_new)
+                x = x_new
+                a = a_new
+
+            x_out[i] = x
+            v_out[i] = v
+
+        return x_out, v_out
+
+    def _ivp(self, t, method, **kwargs):
+        """
+        Helper function to integrate the first order system y = (x, v) with solve_ivp()
+
+        x' = v
+        v' = M^-1 ( d * f(t) - C v - K x )
+
+        :param t: output time, numpy array
+        :param method: "BDF" or "Radau"
+        :param kwargs: other keyword arguments passed to solve_ivp()
+        :return: tuple of (position, velocity), each of shape (len(t), n)
+        """
+        diag = self.M.diagonal()
+        if (self.M - sparse.diags(diag)).count_nonzero():
+            raise ValueError(f"Method \"{method}\" requires a diagonal (lumped) mass matrix. Use method = \"newmark\"")
+
+        n = self.n
+        M_inv = sparse.diags(1 / diag)
+        M_inv_C = (M_inv @ self.C).tocsr()
+        M_inv_K = (M_inv @ self.K).tocsr()
+
+        # constant sparse Jacobian of the linear system
+        jac = sparse.bmat([
+            [None, sparse.identity(n)],
+            [-M_inv_K, -M_inv_C]
+        ], format = "csc")
+
+        def rhs(_t, y):
+            x = y[:n]
+            v = y[n:]
+            return np.concatenate((v, (self.force(_t) - self.C @ v - self.K @ x) / diag))
+
+        sol = solve_ivp(rhs, (t[0], t[-1]), np.concatenate((self.x0, self.x_dot0)), method = method,
+                        t_eval = t, jac = jac, **kwargs)
+
+        if not sol.success:
+            raise RuntimeError(sol.message)
+
+        return sol.y[:n].T, sol.y[n:].T
+
+    def modes(self, n_modes = 10):
+        """
+        Lowest natural frequencies and mode shapes of the undamped system
+        K phi = omega^2 M phi
+        Solved by sparse shift-invert Lanczos iteration, the mode shapes are M-orthonormal
+
+        :param n_modes: number of modes
+        :return: tuple of (angular frequencies of length n_modes, mode shapes of shape (n, n_modes))
+        """
+        if n_modes >= self.n - 1:
+            # small system, use dense solver
+            from scipy.linalg import eigh
+            omega2, phi = eigh(self.K.toarray(), self.M.toarray())
+            omega2, phi = omega2[:n_modes], phi[:, :n_modes]
+
+        else:
+            omega2, phi = eigsh(self.K, k = n_modes, M = self.M, sigma = 0, which = "LM")
+            order = np.argsort(omega2)
+            omega2, phi = omega2[order], phi[:, order]
+
+        return np.sqrt(np.clip(omega2, 0, None)), phi
+
+    def modal(self, t, n_modes = 10, substeps = 1):
+        """
+        Get the result by modal decomposition of the linear system
+        x(t) = sum of phi_j * q_j(t) over the lowest n_modes modes
+
+        Each modal coordinate satisfies a scalar equation of the form of ODE2
+        q_j" + 2 zeta_j omega_j q_j' + omega_j^2 q_j = phi_j^T (d * f(t))
+        Only the diagonal part of phi^T C phi is kept (classical damping assumption),
+        which is exact for proportional ( Rayleigh ) damping C = alpha M + beta K.
+        The decoupled modal equations are integrated together by Newmark-beta method
+
+        :param t: time, must be at least 1D array e.g. np.arange(0, 10, 1e-3)
+        :param n_modes: number of modes kept
+        :param substeps: number of integration steps between 2 output times
+        :return: tuple of (position, velocity), each of shape (len(t), n)
+        """
+        omega, phi = self.modes(n_modes)
+
+        # project the system onto the modal basis
+        C_modal = np.einsum("ij,ij->j", phi, self.C @ phi)
+        M_phi = self.M @ phi
+        # modal force of the whole force vector, f(t) may be a vector of length n
+        modal = ODEN(
+                sparse.identity(n_modes),
+                sparse.diags(C_modal),
+                sparse.diags(omega ** 2),
+                1,
+                M_phi.T @ self.x0,
+                M_phi.T @ self.x_dot0,
+                lambda _t: phi.T @ self.force(_t)
+        )
+        q, q_dot = modal(t, substeps = substeps)
+
+        return q @ phi.T, q_dot @ phi.T
+
+
+def chain(n, m = 1, c = 0, k = 1, fixed = (True, False)):
+    """
+    Mass, damping and stiffness matrices of a chain of n masses connected by springs and dampers
+    wall -- m -- m -- ... -- m (-- wall)
+
+    :param n: number of masses
+    :param m: mass of each block, scalar or array of length n
+    :param c: damping constant of each connection, scalar or array of length n + 1 (including both ends)
+    :param k: spring constant of each connection, scalar or array of length n + 1 (including both ends)
+    :param fixed: tuple (left, right), True if the end of the chain is attached to a wall
+    :return: tuple of (M, C, K) of type scipy.sparse.csc_matrix
+    """
+    M = sparse.diags(np.broadcast_to(np.asarray(m, dtype = float), (n,)), format = "csc")
+    C = _chain_matrix(n, c, fixed)
+    K = _chain_matrix(n, k, fixed)
+
+    return M, C, K
+
+
+def _chain_matrix(n, k, fixed):
+    """
+    Helper function to build the tridiagonal matrix of a chain of connections
+
+    :param n: number of masses
+    :param k: constant of each connection, scalar or array of length n + 1
+    :param fixed: tuple (left, right), True if the end of the chain is attached to a wall
+    :return: scipy.sparse.csc_matrix
+    """
+    k = np.broadcast_to(np.asarray(k, dtype = float), (n + 1,)).copy()
+    k[0] *= bool(fixed[0])
+    k[-1] *= bool(fixed[1])
+
+    return sparse.diags([-k[1:-1], k[:-1] + k[1:], -k[1:-1]], [-1, 0, 1], shape = (n, n), format = "csc")
+
+
+def lattice(nx, ny, m = 1, c = 0, k = 1, fixed = True):
+    """
+    Mass, damping and stiffness matrices of a square lattice of nx * ny masses
+    Each mass is connected to its 4 nearest neighbours, and to the walls at the boundary if fixed is True.
+    Mass (i, j) is the DOF i * ny + j
+
+    :param nx: number of masses along x
+    :param ny: number of masses along y
+    :param m: mass of each block
+    :param c: damping constant of each connection
+    :param k: spring constant of each connection
+    :param fixed: True if the boundary masses are attached to the walls
+    :return: tuple of (M, C, K) of type scipy.sparse.csc_matrix
+    """
+    ends = (fixed, fixed)
+    I_x = sparse.identity(nx)
+    I_y = sparse.identity(ny)
+
+    def build(value):
+        return sparse.csc_matrix(
+                sparse.kron(_chain_matrix(nx, value, ends), I_y) + sparse.kron(I_x, _chain_matrix(ny, value, ends))
+        )
+
+    M = sparse.diags(np.full(nx * ny, float(m)), format = "csc")
+
+    return M, build(c), build(k)
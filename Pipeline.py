@@ -0,0 +1,373 @@
+"""
+Pipeline.py
+
+Incremental runner of a workflow expressed as a dependency graph of stages,
+e.g. dataset -> validation -> solves -> steady state evaluation -> figures
+
+The fingerprint of a stage is a hash of
+- its parameters ( numbers, strings, lists, dicts, numpy arrays )
+- the source code of its function, and of the functions and constants of its module it refers to, recursively
+- the source code of the modules it depends on
+- the fingerprints of the stages it depends on
+so a stage is stale only if anything upstream of it changed.
+The result (artifact) of each stage is stored in a cache directory under its fingerprint,
+and a rerun executes only the stale stages. Artifacts of fresh stages are loaded only if a stale stage needs them.
+Each file written by a stage is stamped with its fingerprint in a hidden file next to it, e.g. img/a/.a.png.fingerprint,
+so a file left by another configuration of the stage is rewritten.
+
+Reference :
+https://en.wikipedia.org/wiki/Make_(software)
+https://docs.python.org/3/library/hashlib.html
+
+Written by S. P. Lam
+"""
+
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+
+class Stage:
+
+    def __init__(self, name, func, deps = (), params = None, modules = (), outputs = (), objects = ()):
+        """
+        A stage of the pipeline, computing func(*results of deps, **params)
+
+        :param name: unique name of the stage
+        :param func: function computing the artifact of the stage
+        :param deps: names of the stages whose artifacts are passed to func, in order
+        :param params: (optional) dict of keyword arguments of func, part of the fingerprint
+        :param modules: names of the modules the stage depends on, e.g. ("ODE2",), their source is part of the fingerprint
+        :param outputs: paths of files written by the stage. The stage is stale if any of them is missing
+                        or was written by another fingerprint
+        :param objects: other values the stage depends on, e.g. definitions of constants, part of the fingerprint
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.modules = tuple(modules)
+        self.outputs = tuple(outputs)
+        self.objects = tuple(objects)
+
+    def code(self):
+        """
+        Source code of the stage, i.e. its function, the functions and constants of its module it refers to,
+        the modules and the other values it depends on
+        Other definitions of its module, e.g. a dataset the stage does not use, are not part of it
+
+        :return: type str
+        """
+        source = _source(self.func, getattr(self.func, "__module__", None), set())
+
+        for module in self.modules:
+            with open(importlib.util.find_spec(module).origin, encoding = "utf-8") as file:
+                source += file.read()
+
+        for obj in self.objects:
+            source += digest(obj)
+
+        return source
+
+
+class Pipeline:
+
+    def __init__(self, cache_dir = ".cache", verbose = False):
+        """
+        Incremental runner of stages
+
+        Usage:
+        pipe = Pipeline("cache")
+        pipe.add(Stage("solve", solve_case, params = {"case": case, "data": data}, modules = ("ODE2",)))
+        pipe.add(Stage("figure_a", save_figure_a, deps = ["solve"], outputs = ["img/a/a.png"]))
+        pipe.run()  # runs both stages
+        pipe.run()  # runs nothing, {"solve": "cached", "figure_a": "cached"}
+
+        :param cache_dir: directory storing the artifacts
+        :param verbose: print the execution time of each stage run
+        """
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        self.stages = {}
+        self.fingerprints = {}
+        self.results = {}  # artifacts in memory
+        self.log = {}  # {name: "run" or "cached"} of the last run
+
+    def add(self, stage):
+        """
+        Add a stage. Its dependencies should be added before
+
+        :param stage: Stage()
+        :return: stage
+        """
+        if stage.name in self.stages:
+            raise ValueError(f"Stage {stage.name} already exists")
+
+        for dep in stage.deps:
+            if dep not in self.stages:
+                raise ValueError(f"Unknown dependency {dep} of stage {stage.name}")
+
+        self.stages[stage.name] = stage
+
+        return stage
+
+    def fingerprint(self, name):
+        """
+        Fingerprint of a stage, from its parameters, code and dependencies
+
+        :param name: name of the stage
+        :return: type str, hexadecimal digest
+        """
+        if name not in self.fingerprints:
+            stage = self.stages[name]
+            h = hashlib.sha256()
+            h.update(name.encode())
+            h.update(stage.code().encode())
+            h.update(digest(stage.params).encode())
+
+            for dep in stage.deps:
+                h.update(self.fingerprint(dep).encode())
+
+            self.fingerprints[name] = h.hexdigest()
+
+        return self.fingerprints[name]
+
+    def stale(self, name):
+        """
+        Check if a stage has to be executed
+
+        :param name: name of the stage
+        :return: bool
+        """
+        if not os.path.exists(self._path(name)):
+            return True
+
+        fingerprint = self.fingerprint(name)
+
+        for path in self.stages[name].outputs:
+            if not os.path.exists(path) or not os.path.exists(_stamp(path)):
+                return True
+
+            with open(_stamp(path), encoding = "utf-8") as file:
+                if file.read() != fingerprint:
+                    return True
+
+        return False
+
+    def run(self, targets = None):
+        """
+        Bring the given stages up to date, executing only the stale stages
+
+        :param targets: (optional) names of the stages, all by default
+        :return: dict {name: "run" or "cached"} of the stages visited
+        """
+        self.log = {}
+
+        for name in targets or list(self.stages):
+            self._update(name)
+
+        return self.log
+
+    def get(self, name):
+        """
+        Artifact of a stage, executing the stale stages it depends on
+
+        :param name: name of the stage
+        :return: artifact
+        """
+        self._update(name)
+
+        return self._load(name)
+
+    def _update(self, name):
+        """
+        Helper function to execute a stage if stale, after its dependencies
+
+        :param name: name of the stage
+        :return: None
+        """
+        if name in self.log:
+            return
+
+        if not self.stale(name):
+            self.log[name] = "cached"
+            return
+
+        stage = self.stages[name]
+
+        for dep in stage.deps:
+            self._update(dep)
+
+        args = [self._load(dep) for dep in stage.deps]
+        start = time.perf_counter()
+        result = stage.func(*args, **stage.params)
+
+        os.makedirs(self.cache_dir, exist_ok = True)
+        path = self._path(name)
+
+        # write to a temporary file first, so that an interrupted run leaves no corrupted artifact
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(result, file, protocol = pickle.HIGHEST_PROTOCOL)
+
+        os.replace(path + ".tmp", path)
+
+        # stamp the files written by the stage, a missing file is left unstamped and keeps the stage stale
+        for output in stage.outputs:
+            if os.path.exists(output):
+                with open(_stamp(output), "w", encoding = "utf-8") as file:
+                    file.write(self.fingerprint(name))
+
+        self.results[name] = result
+        self.log[name] = "run"
+
+        if self.verbose:
+            print(f"[{name}] {time.perf_counter() - start:.3f} s")
+
+    def _load(self, name):
+        """
+        Helper function to get the artifact of a stage from memory or from the cache directory
+
+        :param name: name of the stage
+        :return: artifact
+        """
+        if name not in self.results:
+            with open(self._path(name), "rb") as file:
+                self.results[name] = pickle.load(file)
+
+        return self.results[name]
+
+    def _path(self, name):
+        """
+        Helper function to get the path of the artifact of a stage
+
+        :param name: name of the stage
+        :return: type str
+        """
+        return os.path.join(self.cache_dir, f"{name}-{self.fingerprint(name)[:16]}.pkl")
+
+
+def _source(obj, module, seen):
+    """
+    Helper function to get the source code of a function, followed by the source code of the functions and classes
+    and the value of the constants of the same module it refers to, recursively
+
+    :param obj: function or class
+    :param module: name of the module of the stage. Objects of other modules are identified by name only,
+                   their module should be listed in Stage(modules = ...)
+    :param seen: set of id() of the objects already visited
+    :return: type str
+    """
+    seen.add(id(obj))
+
+    try:
+        source = inspect.getsource(obj)
+    except (OSError, TypeError):
+        # e.g. built-in function
+        return getattr(obj, "__qualname__", repr(obj))
+
+    code = getattr(obj, "__code__", None)
+    if code is None:
+        return source
+
+    for name in sorted(_names(code)):
+        if name not in obj.__globals__:
+            # built-in, or attribute name
+            continue
+
+        value = obj.__globals__[name]
+
+        if id(value) in seen or inspect.ismodule(value):
+            continue
+
+        if inspect.isfunction(value) or inspect.isclass(value):
+            if value.__module__ == module:
+                source += _source(value, module, seen)
+            else:
+                seen.add(id(value))
+                source += f"{name} = {value.__module__}.{value.__qualname__}\n"
+
+        elif isinstance(value, (type(None), bool, int, float, complex, str, list, tuple, dict, np.ndarray, np.generic)):
+            source += f"{name} = {digest(value)}\n"
+
+        elif type(value).__str__ is not object.__str__:
+            # e.g. Func() by its expression
+            source += f"{name} = {type(value).__qualname__}({value})\n"
+
+        else:
+            source += f"{name} = {type(value).__qualname__}\n"
+
+    return source
+
+
+def _names(code):
+    """
+    Helper function to get the global names a code object and its nested functions refer to
+
+    :param code: code object
+    :return: set of str
+    """
+    names = set(code.co_names)
+
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _names(const)
+
+    return names
+
+
+def _stamp(path):
+    """
+    Helper function to get the path of the file storing the fingerprint of the stage that wrote a file
+
+    :param path: path of the file
+    :return: type str
+    """
+    directory, name = os.path.split(path)
+
+    return os.path.join(directory, f".{name}.fingerprint")
+
+
+def digest(obj):
+    """
+    Stable hash of parameters : numbers, strings, None, lists, tuples, dicts and numpy arrays
+
+    :param obj: parameters
+    :return: type str, hexadecimal digest
+    """
+    h = hashlib.sha256()
+    _feed(h, obj)
+
+    return h.hexdigest()
+
+
+def _feed(h, obj):
+    """
+    Helper function to feed an object to a hash recursively
+
+    :param h: hashlib object
+    :param obj: parameters
+    :return: None
+    """
+    if isinstance(obj, np.ndarray):
+        h.update(f"ndarray{obj.dtype.str}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+
+    elif isinstance(obj, dict):
+        h.update(b"dict")
+        for key in sorted(obj, key = str):
+            _feed(h, str(key))
+            _feed(h, obj[key])
+
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for item in obj:
+            _feed(h, item)
+
+    else:
+        h.update(json.dumps(obj, default = repr).encode())
@@ -4,15 +4,355 @@ Plot.py
 Plot a graph from given data with matplotlib
 Support multi-plot on same graph
 
+Long curves are drawn from a min/max level-of-detail pyramid,
+so that only about 2 points per horizontal pixel are handed to matplotlib.
+The level is re-selected whenever the axes are zoomed or panned.
+Every local minimum and maximum of the data within a pixel is kept, so peaks and envelopes are drawn exactly.
+
+Figures can be saved to file without showing any window ( Figure().save() ),
+and many figures can be rendered concurrently in worker processes ( render() ).
+
+A live mode ( Figure().start_live() ) accepts chunks of data appended while they are being computed.
+The latest points of each curve are kept in a ring buffer and redrawn by blitting at a capped frame rate,
+so the cost of each update does not depend on the length of the whole history.
+
+matplotlib objects are created only when a Figure() is drawn, and released by Figure().close()
+( or at the end of a "with Figure() as fig:" block ).
+Figures saved without a window are drawn on Agg figures taken from a pool of the same layout,
+and the oldest saved figures are released when their estimated memory exceeds the limit of the pool,
+so that generating hundreds of plots runs in flat memory.
+
+Large ensembles of curves ( e.g. thousands of sweep trajectories ) can be drawn as a density image
+with percentile bands ( Figure().add_density() ) instead of one line per curve.
+
 Written by S. P. Lam
 """
 
+import time
+import warnings
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import matplotlib.colors
+import matplotlib.figure
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+class LOD:
+    
+    def __init__(self, x, y):
+        """
+        Min/max level-of-detail pyramid of a curve
+        Level L keeps, for every bucket of 2^L consecutive points, the index of its minimum and maximum.
+        Level 0 is the full resolution data.
+        
+        :param x: curve data for x, monotonic numpy array
+        :param y: curve data for y, numpy array
+        """
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.levels = [None]  # level 0 : full resolution
+        
+        i_min = i_max = np.arange(len(self.y))
+        
+        while len(i_min) > 1:
+            if len(i_min) % 2:
+                # pad the last bucket
+                i_min = np.append(i_min, i_min[-1])
+                i_max = np.append(i_max, i_max[-1])
+                
+            a_min, b_min = i_min[0::2], i_min[1::2]
+            a_max, b_max = i_max[0::2], i_max[1::2]
+            i_min = np.where(self.y[a_min] <= self.y[b_min], a_min, b_min)
+            i_max = np.where(self.y[a_max] >= self.y[b_max], a_max, b_max)
+            self.levels.append((i_min, i_max))
+    
+    def view(self, x0, x1, n_pixels):
+        """
+        Decimated curve data visible within x0 <= x <= x1
+        
+        :param x0: left limit of the x-axis
+        :param x1: right limit of the x-axis
+        :param n_pixels: width of the axes in pixels
+        :return: tuple (x, y) of numpy array
+        """
+        if x0 > x1:
+            x0, x1 = x1, x0
+            
+        increasing = self.x[0] <= self.x[-1]
+        x = self.x if increasing else self.x[::-1]
+        i0 = max(int(np.searchsorted(x, x0, "right")) - 1, 0)
+        i1 = min(int(np.searchsorted(x, x1, "left")) + 1, len(x))
+        if not increasing:
+            i0, i1 = len(x) - i1, len(x) - i0
+            
+        # smallest level with at most one bucket ( 2 points ) per pixel
+        level = 0
+        while (i1 - i0) >> level > max(int(n_pixels), 1) and level + 1 < len(self.levels):
+            level += 1
+            
+        if level == 0:
+            index = np.arange(i0, i1)
+            
+        else:
+            i_min, i_max = self.levels[level]
+            b0, b1 = i0 >> level, ((i1 - 1) >> level) + 1
+            index = np.sort(np.stack((i_min[b0:b1], i_max[b0:b1]), axis = 1), axis = 1).ravel()
+            # keep the exact end points of the visible range
+            index = np.concatenate(([i0], index, [i1 - 1]))
+            
+        return self.x[index], self.y[index]
+
+
+class RingBuffer:
+    
+    def __init__(self, capacity):
+        """
+        Fixed size buffer keeping the latest values appended
+        Each value is written twice ( at i and i + capacity ), so the content is always a contiguous view
+        
+        :param capacity: maximum number of values kept
+        """
+        self.capacity = capacity
+        self.data = np.empty(2 * capacity)
+        self.start = 0  # index of the oldest value
+        self.size = 0  # number of values kept
+        
+    def extend(self, values):
+        """
+        Append values, dropping the oldest values if the buffer is full
+        
+        :param values: numpy array
+        :return: None
+        """
+        values = np.asarray(values, dtype = float).ravel()
+        cap = self.capacity
+        
+        if len(values) >= cap:
+            self.data[:cap] = values[-cap:]
+            self.data[cap:] = values[-cap:]
+            self.start = 0
+            self.size = cap
+            return
+        
+        index = (self.start + self.size + np.arange(len(values))) % cap
+        self.data[index] = values
+        self.data[index + cap] = values
+        self.size += len(values)
+        
+        if self.size > cap:
+            self.start = (self.start + self.size - cap) % cap
+            self.size = cap
+            
+    def view(self):
+        """
+        Values in the buffer from the oldest to the latest, without copy
+        
+        :return: numpy array
+        """
+        return self.data[self.start:self.start + self.size]
+
+
+class CurveStore:
+    
+    def __init__(self):
+        """
+        Columnar storage of the curves of a figure
+        Each curve keeps a reference ( or view ) of its y data, without copy.
+        x data are stored once in a table and shared by all curves using the same array,
+        e.g. the same time t for every curve of a sweep
+        """
+        self.x = []  # table of x data
+        self.monotonic = []  # whether each x in the table is monotonic, computed when needed
+        self.curves = {}  # {index of axes: [(index of x in the table, y, label), ...]}
+        
+    def _x_id(self, x):
+        """
+        Helper function to find x in the table, or add it
+        Arrays with the same memory, shape, strides and type are regarded as the same
+        
+        :param x: numpy array
+        :return: index of x in the table
+        """
+        key = _array_key(x)
+        
+        for i, _x in enumerate(self.x):
+            if _x is x or _array_key(_x) == key:
+                return i
+            
+        self.x.append(x)
+        self.monotonic.append(None)
+        
+        return len(self.x) - 1
+    
+    def add(self, x, y, label = None, index = 1):
+        """
+        Add curves to the axes of given index
+        
+        :param x: curve data for x, 1D array-like
+        :param y: curve data for y, 1D array-like, or 2D array-like with one curve per row sharing the same x
+        :param label: legend label, or list of labels for 2D y
+        :param index: index of the axes. Count from 1.
+        :return: None
+        """
+        x = np.asarray(x)  # no copy for numpy array and memmap
+        y = np.asarray(y)
+        x_id = self._x_id(x)
+        curves = self.curves.setdefault(index, [])
+        
+        if y.ndim == 1:
+            curves.append((x_id, y, label))
+            return
+        
+        for i in range(len(y)):
+            curves.append((x_id, y[i], label[i] if label is not None else None))
+            
+    def get(self, index):
+        """
+        Get the curves of the axes of given index
+        
+        :param index: index of the axes. Count from 1.
+        :return: list of tuple (x, y, label, x is monotonic)
+        """
+        result = []
+        
+        for x_id, y, label in self.curves.get(index, []):
+            if self.monotonic[x_id] is None:
+                self.monotonic[x_id] = _monotonic(self.x[x_id])
+                
+            result.append((self.x[x_id], y, label, self.monotonic[x_id]))
+            
+        return result
+    
+    def clear(self):
+        """
+        Remove all curves
+        
+        :return: None
+        """
+        self.x.clear()
+        self.monotonic.clear()
+        self.curves.clear()
+
+
+class FigurePool:
+    
+    def __init__(self, size = 4, memory_limit = 256 * 2 ** 20):
+        """
+        Pool of matplotlib figure and axes objects for saving figures without a window
+        Figures are reused for the same layout ( rows, columns ) of axes instead of being created again
+        
+        :param size: maximum number of idle figures kept for each layout
+        :param memory_limit: estimated memory ( bytes ) of saved figures above which the oldest ones are released
+        """
+        self.size = size
+        self.memory_limit = memory_limit
+        self.idle = {}  # {(row, col): [(figure, axes_list), ...]}
+        self.rendered = OrderedDict()  # {id: weakref of Figure()} in the order of rendering
+        
+    def acquire(self, row, col, headless = False):
+        """
+        Get a figure with row x col axes
+        
+        :param row: number of rows of axes
+        :param col: number of columns of axes
+        :param headless: True for an Agg figure without window ( pooled ), False for a pyplot figure
+        :return: tuple (figure, list of axes)
+        """
+        if not headless:
+            figure = plt.figure()
+            return figure, [figure.add_subplot(row, col, i) for i in range(1, row * col + 1)]
+        
+        idle = self.idle.get((row, col))
+        
+        if idle:
+            # cleared when released
+            return idle.pop()
+        
+        figure = matplotlib.figure.Figure()
+        FigureCanvasAgg(figure)
+        
+        return figure, [figure.add_subplot(row, col, i) for i in range(1, row * col + 1)]
+    
+    def release(self, figure, axes_list, row, col, headless = False):
+        """
+        Give back a figure obtained by acquire()
+        Pyplot figures are closed, Agg figures are cleared and kept for reuse if the pool is not full,
+        so that an idle figure holds no artists ( curve data ) and a reused figure shows no stale content
+        
+        :param figure: matplotlib figure
+        :param axes_list: list of axes of the figure
+        :param row: number of rows of axes
+        :param col: number of columns of axes
+        :param headless: True if the figure was acquired with headless = True
+        :return: None
+        """
+        if not headless:
+            plt.close(figure)
+            return
+        
+        idle = self.idle.setdefault((row, col), [])
+        
+        if len(idle) < self.size:
+            # reset the figure to its initial state
+            for axes in axes_list:
+                axes.clear()
+                
+            figure.suptitle("")
+            figure.set_dpi(matplotlib.rcParams["figure.dpi"])
+            figure.set_size_inches(matplotlib.rcParams["figure.figsize"])
+            figure.subplots_adjust(**{
+                key: matplotlib.rcParams[f"figure.subplot.{key}"]
+                for key in ("left", "right", "bottom", "top", "wspace", "hspace")
+            })
+            
+            idle.append((figure, axes_list))
+            
+    def track(self, fig):
+        """
+        Record a rendered Figure() and release the oldest rendered ones above the memory limit
+        
+        :param fig: instance of class Figure()
+        :return: None
+        """
+        self.rendered.pop(id(fig), None)
+        self.rendered[id(fig)] = weakref.ref(fig)
+        
+        alive = []
+        for key, ref in list(self.rendered.items()):
+            _fig = ref()
+            if _fig is None or _fig.figure is None:
+                self.rendered.pop(key)
+            else:
+                alive.append(_fig)
+                
+        total = sum(_fig.memory() for _fig in alive)
+        
+        # release the oldest, but never the figure just rendered
+        for _fig in alive[:-1]:
+            if total <= self.memory_limit:
+                break
+                
+            total -= _fig.memory()
+            _fig.close()
+            
+    def clear(self):
+        """
+        Drop all idle figures
+        
+        :return: None
+        """
+        self.idle.clear()
+
+
+pool = FigurePool()  # shared by all Figure() instances
 
 
 class Figure:
     
-    def __init__(self, row = 1, col = 1):
+    def __init__(self, row = 1, col = 1, lod = True):
         """
         Plot graph using given dataset
         Support repeat plotting for the same Figure() class
@@ -29,22 +369,32 @@ class Figure:
         fig.grid()  # turn on grid lines
         fig.plot()  # show the plotted graph
         
+        with Figure(row = 3, col = 2) as fig:  # matplotlib objects are released at the end of the block
+            ...
+            fig.save("fig.png")
+        
         :param row: number of rows of axes in the figure
         :param col: number of columns of axes in the figure
+        :param lod: draw long curves from a min/max level-of-detail pyramid, re-selected on zoom / pan
         """
-        self.figure = plt.figure()
+        self.figure = None  # matplotlib figure, created when the figure is drawn
+        self.headless = False  # True if self.figure is a pooled Agg figure
+        self.callbacks = []  # [(callback registry, connection id), ...]
+        self.lod = lod
+        self.lod_curves = {}  # {axes: [(line, LOD()), ...]}
+        self.live_curves = {}  # {(index, curve): (line, RingBuffer() of x, RingBuffer() of y)}
         self.fig_dim = [row, col]
         self.axes_list = []
-        self.curve_data = {1: []}
-        self.curve_label = {1: []}
+        self.curves = CurveStore()
+        self.densities = {}  # {index of axes: [density image, ...]}
         self.x_label = {1: ""}
         self.y_label = {1: ""}
         self.figure_title = ["", 16]  # [title, font_size]
         self.axes_title = {1: ""}
-        self.x_ticks = {1: []}
-        self.x_ticks_label = {1: [[], 11]}  # [ticks_label, font_size]
-        self.y_ticks = {1: []}
-        self.y_ticks_label = {1: [[], 11]}  # [ticks_label, font_size]
+        self.x_ticks = {1: None}
+        self.x_ticks_label = {1: [None, 11]}  # [ticks_label, font_size]
+        self.y_ticks = {1: None}
+        self.y_ticks_label = {1: [None, 11]}  # [ticks_label, font_size]
         self.grid_on = {1: False}
         self._setup_dataset()
         
@@ -74,60 +424,128 @@ class Figure:
         col = self.fig_dim[1]
         
         for i in range(1, row * col + 1):
-            self.curve_data.update({i: self.curve_data[i] if i in self.curve_data.keys() else []})
-            self.curve_label.update({i: self.curve_label[i] if i in self.curve_label.keys() else []})
             self.x_label.update({i: self.x_label[i] if i in self.x_label.keys() else ""})
             self.y_label.update({i: self.y_label[i] if i in self.y_label.keys() else ""})
             self.axes_title.update({i: self.axes_title[i] if i in self.axes_title.keys() else ""})
-            self.x_ticks.update({i: self.x_ticks[i] if i in self.x_ticks.keys() else []})
-            self.x_ticks_label.update({i: self.x_ticks_label[i] if i in self.x_ticks_label.keys() else [[], 11]})
-            self.y_ticks.update({i: self.y_ticks[i] if i in self.y_ticks.keys() else []})
-            self.y_ticks_label.update({i: self.y_ticks_label[i] if i in self.y_ticks_label.keys() else [[], 11]})
+            self.x_ticks.update({i: self.x_ticks[i] if i in self.x_ticks.keys() else None})
+            self.x_ticks_label.update({i: self.x_ticks_label[i] if i in self.x_ticks_label.keys() else [None, 11]})
+            self.y_ticks.update({i: self.y_ticks[i] if i in self.y_ticks.keys() else None})
+            self.y_ticks_label.update({i: self.y_ticks_label[i] if i in self.y_ticks_label.keys() else [None, 11]})
             self.grid_on.update({i: self.grid_on[i] if i in self.grid_on.keys() else False})
             
-    def _setup_figure(self):
+    def _setup_figure(self, headless = False):
         """
         Helper function to setup figure window and axes
+        The existing figure is cleared and reused if it is still open, otherwise a new one is acquired from the pool
         
+        :param headless: use a pooled Agg figure without window if a new figure is needed
         :return: None
         """
         row = self.fig_dim[0]
         col = self.fig_dim[1]
         
-        for i in range(1, row * col + 1):
+        if self.figure is not None and len(self.axes_list) == row * col and (
+                headless if self.headless else plt.fignum_exists(self.figure.number)):
+            # figure still open ( an Agg figure without window cannot be shown by plot() )
+            # https://stackoverflow.com/questions/7557098/matplotlib-interactive-mode-determine-if-figure-window-is-still-displayed
+            self._disconnect()
+            self.lod_curves.clear()
+            self.live_curves.clear()
+            
+            for axes in self.axes_list:
+                axes.clear()
+                
+            return
+        
+        # window closed by the user or figure never drawn
+        self.close()
+        self.figure, axes_list = pool.acquire(row, col, headless)
+        self.axes_list.extend(axes_list)
+        self.headless = headless
+        
+    def _disconnect(self):
+        """
+        Helper function to disconnect all callbacks connected by this Figure()
+        
+        :return: None
+        """
+        for registry, cid in self.callbacks:
+            registry.disconnect(cid)
+            
+        self.callbacks.clear()
+        
+    def close(self):
+        """
+        Release the matplotlib figure and axes objects
+        Curve data and settings are kept, so the figure can be plotted or saved again
+        
+        :return: None
+        """
+        if self.figure is not None:
+            self._disconnect()
+            pool.release(self.figure, list(self.axes_list), self.fig_dim[0], self.fig_dim[1], self.headless)
             
-            if not plt.fignum_exists(1):
-                # no figure window
-                # create figure object
-                # https://stackoverflow.com/questions/7557098/matplotlib-interactive-mode-determine-if-figure-window-is-still-displayed
-                self.figure = plt.figure()
+        self.figure = None
+        self.headless = False
+        self.axes_list.clear()
+        self.lod_curves.clear()
+        self.live_curves.clear()
+        
+    def memory(self):
+        """
+        Estimate the memory used by the matplotlib objects of the figure
+        i.e. pixel buffer of the canvas, data of the lines drawn and level-of-detail pyramids
+        
+        :return: number of bytes
+        """
+        if self.figure is None:
+            return 0
+        
+        total = 4 * int(self.figure.bbox.width) * int(self.figure.bbox.height)  # RGBA buffer
+        
+        for axes in self.axes_list:
+            for line in axes.lines:
+                total += 16 * len(line.get_xdata(orig = False))
                 
-                # clear all old axes
-                self.axes_list.clear()
+        # level-of-detail pyramids
+        for curves in self.lod_curves.values():
+            for _, lod in curves:
+                total += sum(i_min.nbytes + i_max.nbytes for i_min, i_max in lod.levels[1:])
                 
-            # create and store axes object
-            self.axes_list.append(
-                    self.figure.add_subplot(row, col, i)  # axes
-            )
+        return total
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
         
     def add_graph(self, data = None, x = None, y = None, label = None, index = 1):
         """
         Add graph on the given index of axes
         Legend is automatically turned on if label for each curves is given
         
+        Curve data may be list, numpy array or memmap. Arrays are stored without copy,
+        and the same x array shared by several curves is stored once.
+        
+        Usage:
+        fig.add_graph([[t, x], [t, x_s(t)]], label = ["x(t)", "$x_s(t)$"])  # list of curves
+        fig.add_graph(x = t, y = x, label = "x(t)")  # one curve
+        fig.add_graph(x = t, y = np.array(x_dc), label = [f"c = {c}" for c in dc])  # one curve per row of y
+        
         :param data: 3D list of curve data. [ [[graph1 x], [graph1 y]], [[graph2 x], [graph2 y]], ... ]
+                     or numpy array of shape (number of curves, 2, number of points)
         :param x: curve data for x
-        :param y: curve data for y
-        :param label: legend label for the graph
+        :param y: curve data for y. 2D array for multiple curves sharing the same x
+        :param label: legend label for the graph, list of labels for multiple curves
         :param index: index for the graph. Count from 1.
         :return: None
         """
-        if data:
+        if data is not None:
             
             for i in range(len(data)):
                 # store to class
-                self.curve_data[index].append(data[i])
-                self.curve_label[index].append( label[i] if label else None )
+                self.curves.add(data[i][0], data[i][1], label[i] if label is not None else None, index)
                 
                 # plot to axes in memory
                 # curve = data[i]
@@ -135,16 +553,71 @@ class Figure:
                 # _y = curve[1]
                 # self.axes_list[index - 1].plot(_x, _y, label = label[i] if label else None)
                 
-        if x and y:
+        if x is not None and y is not None:
             # store to class
-            self.curve_data[index].append([x, y])
-            self.curve_label[index].append(label)
+            self.curves.add(x, y, label, index)
             
             # plot to axes in memory
             # self.axes_list[index - 1].plot(x, y, label = label)
         
         # self.axes_list[index - 1].legend()
         
+    def add_density(self, x, y, index = 1, bins = (800, 400), x_range = None, y_range = None,
+                    percentiles = (5, 50, 95), log = True, cmap = "viridis", chunk = None, workers = None):
+        """
+        Add an ensemble of curves sharing the same x as a density image ( 2D histogram of all the curves )
+        The curves are accumulated into the histogram chunk by chunk when added, and only the image is stored,
+        so the cost of drawing depends on the number of pixels, not on the number of curves and points.
+        Percentile bands of the ensemble are estimated from the histogram and drawn on top of the image.
+        
+        Usage:
+        fig.add_density(t, x_sweep, percentiles = (5, 50, 95))  # x_sweep of shape (number of curves, len(t))
+        
+        :param x: curve data for x shared by all curves, 1D array
+        :param y: curve data for y, 2D array-like ( or memmap ) with one curve per row
+        :param index: index of the axes. Count from 1.
+        :param bins: number of bins ( pixels ) of the image along x and y
+        :param x_range: (optional) tuple (min, max) of x. Range of x by default
+        :param y_range: (optional) tuple (min, max) of y. Range of all curves by default
+        :param percentiles: percentiles ( 0 - 100 ) of the ensemble drawn as lines, empty for none
+        :param log: use logarithmic color scale
+        :param cmap: matplotlib colormap of the image
+        :param chunk: number of curves accumulated at a time. By default about 4 million points at a time
+        :param workers: number of threads accumulating chunks concurrently. None or 1 for no thread
+        :return: None
+        """
+        counts, x_edges, y_edges = density(x, y, bins, x_range, y_range, chunk, workers)
+        
+        self.densities.setdefault(index, []).append({
+            "counts": counts,
+            "extent": (x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+            "x": (x_edges[:-1] + x_edges[1:]) / 2,
+            "bands": {p: _histogram_percentile(counts, y_edges, p) for p in percentiles},
+            "log": log,
+            "cmap": cmap
+        })
+        
+    def _plot_density(self, axes, image):
+        """
+        Helper function to draw a density image and its percentile bands on the given axes
+        
+        :param axes: matplotlib axes object
+        :param image: density image stored by add_density()
+        :return: None
+        """
+        counts = np.ma.masked_equal(image["counts"], 0)
+        norm = matplotlib.colors.LogNorm() if image["log"] else None
+        
+        axes.imshow(counts, origin = "lower", extent = image["extent"], aspect = "auto", interpolation = "nearest",
+                    cmap = image["cmap"], norm = norm)
+        
+        for p, band in image["bands"].items():
+            axes.plot(image["x"], band, color = "k" if p == 50 else "0.3", linewidth = 1,
+                      linestyle = "-" if p == 50 else "--", label = f"{p}th percentile")
+            
+        if image["bands"]:
+            axes.legend()
+            
     def set_x_label(self, label, index = None):
         """
         Set x-axis label for given graph's index
@@ -284,7 +757,7 @@ class Figure:
         # for all axes by default
         if not index:
             
-            for i in range(len(self.curve_data)):
+            for i in range(len(self.grid_on)):
                 self.grid_on[i+1] = True
                 
                 # self.axes_list[i].grid()
@@ -309,38 +782,133 @@ class Figure:
         
         :return: None
         """
+        self.close()
         self.fig_dim = [1, 1]
-        self.axes_list.clear()
-        self.curve_data = {1: []}
-        self.curve_label = {1: []}
+        self.curves = CurveStore()
+        self.densities = {}  # {index of axes: [density image, ...]}
         self.x_label = {1: ""}
         self.y_label = {1: ""}
         self.figure_title = ["", 16]  # [title, font_size]
         self.axes_title = {1: ""}
-        self.x_ticks = {1: []}
-        self.x_ticks_label = {1: [[], 11]}  # [ticks_label, font_size]
-        self.y_ticks = {1: []}
-        self.y_ticks_label = {1: [[], 11]}  # [ticks_label, font_size]
+        self.x_ticks = {1: None}
+        self.x_ticks_label = {1: [None, 11]}  # [ticks_label, font_size]
+        self.y_ticks = {1: None}
+        self.y_ticks_label = {1: [None, 11]}  # [ticks_label, font_size]
         self.grid_on = {1: False}
         
-    def plot(self, tight_layout = True, h_space = None, w_space = None):
+    def _plot_curve(self, axes, x, y, label = None, monotonic = True):
+        """
+        Helper function to plot one curve on the given axes
+        Curves longer than a few points per pixel are drawn from a level-of-detail pyramid
+        
+        :param axes: matplotlib axes object
+        :param x: curve data for x, numpy array
+        :param y: curve data for y, numpy array
+        :param label: legend label for the curve
+        :param monotonic: whether x is monotonic, required for the level-of-detail pyramid
+        :return: None
+        """
+        n_pixels = axes.bbox.width
+        
+        if not self.lod or len(x) <= 4 * n_pixels or x.ndim != 1 or not monotonic:
+            axes.plot(x, y, label = label)
+            return
+        
+        lod = LOD(x, y)
+        line, = axes.plot(*lod.view(x[0], x[-1], n_pixels), label = label)
+        
+        # data limits of the full curve, as the decimated curve keeps all extrema
+        axes.update_datalim(np.column_stack(([x.min(), x.max()], [np.nanmin(y), np.nanmax(y)])))
+        self.lod_curves.setdefault(axes, []).append((line, lod))
+        
+    def _update_lod(self, axes):
+        """
+        Helper function to re-select the level of detail of all curves on the axes for the current x-limits
+        
+        :param axes: matplotlib axes object
+        :return: None
+        """
+        x0, x1 = axes.get_xlim()
+        n_pixels = axes.bbox.width
+        
+        for line, lod in self.lod_curves.get(axes, []):
+            line.set_data(*lod.view(x0, x1, n_pixels))
+            
+    def plot(self, tight_layout = True, h_space = None, w_space = None, figsize = None, dpi = None):
         """
         Plot and show the figure
         
         :param tight_layout: let matplotlib automatically adjust graph to avoid overlapping
         :param h_space: explicitly indicate vertical spacing between subplots
         :param w_space: explicitly indicate horizontal spacing between subplots
+        :param figsize: (optional) tuple (width, height) of the figure in inches. The default of matplotlib is used if not given
+        :param dpi: (optional) resolution in dots per inch
+        :return: None
+        """
+        self._draw(tight_layout, h_space, w_space, dpi = dpi, figsize = figsize)
+        plt.show()
+        
+        if not plt.fignum_exists(self.figure.number):
+            # window closed by the user
+            self.close()
+        
+    def save(self, path, format = None, dpi = None, figsize = None, tight_layout = True, h_space = None, w_space = None):
+        """
+        Plot the figure and save it to a file, without showing any window
+        
+        Usage:
+        fig.save("img/a/a.png", dpi = 150)
+        fig.save("img/a/a_dc.png", figsize = (19.2, 10.07), dpi = 100)  # 1920 x 1007 pixels
+        
+        :param path: path of the output file
+        :param format: file format e.g. "png", "pdf", "svg". Deduced from the file extension by default
+        :param dpi: resolution in dots per inch. The default of matplotlib is used if not given
+        :param figsize: (optional) tuple (width, height) of the figure in inches. The default of matplotlib is used if not given
+        :param tight_layout: let matplotlib automatically adjust graph to avoid overlapping
+        :param h_space: explicitly indicate vertical spacing between subplots
+        :param w_space: explicitly indicate horizontal spacing between subplots
+        :return: path of the output file
+        """
+        self._draw(tight_layout, h_space, w_space, headless = True, dpi = dpi, figsize = figsize)
+        self.figure.savefig(path, format = format, dpi = dpi)
+        
+        if self.headless:
+            # release the oldest saved figures above the memory limit
+            pool.track(self)
+            
+        return path
+    
+    def _draw(self, tight_layout = True, h_space = None, w_space = None, headless = False, dpi = None, figsize = None):
+        """
+        Helper function to create the axes and plot everything on the figure
+        
+        :param tight_layout: let matplotlib automatically adjust graph to avoid overlapping
+        :param h_space: explicitly indicate vertical spacing between subplots
+        :param w_space: explicitly indicate horizontal spacing between subplots
+        :param headless: use a pooled Agg figure without window if a new figure is needed
+        :param dpi: resolution in dots per inch, so that the level of detail matches the pixel size of the output
+        :param figsize: tuple (width, height) of the figure in inches, before the layout is adjusted
         :return: None
         """
         # create figure and axes object
-        self._setup_figure()
+        self._setup_figure(headless)
+        
+        if dpi:
+            self.figure.set_dpi(dpi)
+            
+        if figsize:
+            self.figure.set_size_inches(figsize)
         
         # plot curves
         for i in range(len(self.axes_list)):
             
+            # plot density images of curve ensembles
+            for image in self.densities.get(i + 1, []):
+                self._plot_density(self.axes_list[i], image)
+                
             # plot curves
-            for curve, curve_label in zip(self.curve_data[i+1], self.curve_label[i+1]):
-                self.axes_list[i].plot(curve[0], curve[1], label = curve_label)
+            for x, y, curve_label, monotonic in self.curves.get(i + 1):
+                self._plot_curve(self.axes_list[i], x, y, curve_label, monotonic)
                 
                 if curve_label:
                     self.axes_list[i].legend()
@@ -357,13 +925,14 @@ class Figure:
             y_ticks = self.y_ticks[i+1]
             x_ticks_label = self.x_ticks_label[i+1]
             y_ticks_label = self.y_ticks_label[i+1]
-            if x_ticks:
+            # None if not set, an empty list removes the ticks
+            if x_ticks is not None:
                 self.axes_list[i].set_xticks(x_ticks)
-            if y_ticks:
+            if y_ticks is not None:
                 self.axes_list[i].set_yticks(y_ticks)
-            if x_ticks_label[0]:
+            if x_ticks_label[0] is not None:
                 self.axes_list[i].set_xticklabels(x_ticks_label[0], fontsize = x_ticks_label[1])
-            if y_ticks_label[0]:
+            if y_ticks_label[0] is not None:
                 self.axes_list[i].set_yticklabels(y_ticks_label[0], fontsize = y_ticks_label[1])
             
             # turn on major grid lines
@@ -375,7 +944,7 @@ class Figure:
         
         # set tight layout
         if tight_layout:
-            plt.tight_layout()
+            self.figure.tight_layout()
             
         # set subplots' spacing
         if h_space:
@@ -384,8 +953,331 @@ class Figure:
         if w_space:
             self.figure.subplots_adjust(wspace = w_space)
             
-        plt.show()
+        # select the level of detail for the final axes size, and again on zoom / pan / resize
+        if self.lod_curves:
+            for axes in self.lod_curves:
+                self._update_lod(axes)
+                self.callbacks.append((axes.callbacks, axes.callbacks.connect("xlim_changed", self._update_lod)))
+                
+            canvas = self.figure.canvas
+            self.callbacks.append((canvas.callbacks, canvas.mpl_connect("resize_event", lambda event: [
+                self._update_lod(axes) for axes in self.lod_curves
+            ])))
+            
+    def __getstate__(self):
+        """
+        Allow pickling of the figure settings and curve data, e.g. to render in worker processes
+        matplotlib objects are not pickled, and are created again when unpickled
+        
+        :return: type dict
+        """
+        state = self.__dict__.copy()
+        
+        for key in ("figure", "axes_list", "lod_curves", "live_curves", "callbacks"):
+            state.pop(key)
+            
+        # images of the canvas captured in live mode
+        state.pop("live_background", None)
+        
+        state["headless"] = False
+        
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.figure = None
+        self.callbacks = []
+        self.axes_list = []
+        self.lod_curves = {}
+        self.live_curves = {}
+        
+    def start_live(self, capacity = 10000, fps = 30, tight_layout = True, h_space = None, w_space = None):
+        """
+        Show the figure and start the live mode
+        Curves added by add_graph() are drawn once as static background,
+        data appended by append() are redrawn by blitting at most fps times per second
+        
+        Usage:
+        fig = Figure()
+        fig.add_graph([[t, x_s(t)]], label = ["$x_s(t)$"])  # static curve
+        fig.start_live(capacity = 20000)
+        for _t, _x, _v in ode.stream(t, chunk = 500):
+            fig.append(_t, _x, label = "$x(t)$")  # live curve
+        fig.stop_live(show = True)
         
+        :param capacity: number of latest points of each live curve kept and drawn
+        :param fps: maximum number of redraws per second
+        :param tight_layout: let matplotlib automatically adjust graph to avoid overlapping
+        :param h_space: explicitly indicate vertical spacing between subplots
+        :param w_space: explicitly indicate horizontal spacing between subplots
+        :return: None
+        """
+        self.live_capacity = capacity
+        self.live_interval = 1 / fps
+        self.live_last_frame = 0.
+        self.live_stale = True  # axes limits should be updated and the background recaptured
+        self.live_background = {}
+        self.live_curves = {}
+        
+        self._draw(tight_layout, h_space, w_space)
+        
+        with warnings.catch_warnings():
+            # non-interactive backends e.g. Agg warn that the figure cannot be shown
+            warnings.simplefilter("ignore")
+            plt.show(block = False)
+            
+    def append(self, x, y, curve = 0, index = 1, label = None):
+        """
+        Append a chunk of data to a live curve
+        A new live curve is created on the first append of each ( index, curve ) pair
+        
+        :param x: chunk of curve data for x
+        :param y: chunk of curve data for y
+        :param curve: id of the live curve on the axes, any hashable
+        :param index: index of the axes. Count from 1.
+        :param label: legend label of the curve, used when the curve is created
+        :return: None
+        """
+        x = np.asarray(x, dtype = float).ravel()
+        y = np.asarray(y, dtype = float).ravel()
+        axes = self.axes_list[index - 1]
+        
+        if (index, curve) not in self.live_curves:
+            line, = axes.plot([], [], label = label, animated = True)
+            self.live_curves[(index, curve)] = (line, RingBuffer(self.live_capacity), RingBuffer(self.live_capacity))
+            self.live_stale = True
+            
+            if label:
+                axes.legend()
+                
+        line, x_buffer, y_buffer = self.live_curves[(index, curve)]
+        x_buffer.extend(x)
+        y_buffer.extend(y)
+        
+        if len(x):
+            # new data outside the axes limits
+            x0, x1 = sorted(axes.get_xlim())
+            y0, y1 = sorted(axes.get_ylim())
+            if x.min() < x0 or x.max() > x1 or np.nanmin(y) < y0 or np.nanmax(y) > y1:
+                self.live_stale = True
+                
+        if time.perf_counter() - self.live_last_frame >= self.live_interval:
+            self._live_frame()
+            
+    def stop_live(self, show = False):
+        """
+        Stop the live mode and draw the final frame
+        Live curves become normal curves of the figure : the points kept in their buffers are added to the curves,
+        so that later plot() and save() draw them too
+        
+        :param show: block and show the figure as plot() does
+        :return: None
+        """
+        self.live_stale = True
+        self._live_frame()
+        
+        for (index, _), (line, x_buffer, y_buffer) in self.live_curves.items():
+            line.set_animated(False)
+            
+            # matplotlib gives "_child..." to lines without label
+            label = line.get_label()
+            self.curves.add(np.array(x_buffer.view()), np.array(y_buffer.view()),
+                            None if label.startswith("_") else label, index)
+            
+        self.live_curves.clear()
+        self.live_background.clear()
+        self.figure.canvas.draw_idle()
+        
+        if show:
+            plt.show()
+            
+    def _live_frame(self):
+        """
+        Helper function to redraw the live curves
+        Redraw everything and capture the background only if the axes limits need to change,
+        otherwise restore the background and blit the live curves only
+        
+        :return: None
+        """
+        canvas = self.figure.canvas
+        live_axes = {}
+        
+        for (index, _), (line, x_buffer, y_buffer) in self.live_curves.items():
+            line.set_data(x_buffer.view(), y_buffer.view())
+            live_axes.setdefault(self.axes_list[index - 1], []).append(line)
+            
+        if self.live_stale or not canvas.supports_blit:
+            for axes, lines in live_axes.items():
+                axes.relim()
+                axes.autoscale_view()
+                
+                # head room ahead of the latest data, so that the limits change once in a while only
+                x0, x1 = axes.get_xlim()
+                axes.set_xlim(x0, x1 + 0.25 * (x1 - x0))
+                y0, y1 = axes.get_ylim()
+                axes.set_ylim(y0 - 0.1 * (y1 - y0), y1 + 0.1 * (y1 - y0))
+                
+            canvas.draw()
+            self.live_background = {axes: canvas.copy_from_bbox(axes.bbox) for axes in live_axes}
+            self.live_stale = False
+            
+        for axes, lines in live_axes.items():
+            canvas.restore_region(self.live_background[axes])
+            
+            for line in lines:
+                axes.draw_artist(line)
+                
+            canvas.blit(axes.bbox)
+            
+        canvas.flush_events()
+        self.live_last_frame = time.perf_counter()
+        
+
+
+def _init_worker():
+    """
+    Helper function to use the non-interactive Agg backend in a worker process
+    
+    :return: None
+    """
+    plt.switch_backend("Agg")
+
+
+def _render_job(job):
+    """
+    Helper function to render one figure to file in a worker process
+    
+    :param job: tuple (Figure(), path) or (Figure(), path, dict of keyword arguments for Figure.save())
+    :return: path of the output file
+    """
+    figure, path = job[0], job[1]
+    kwargs = job[2] if len(job) > 2 else {}
+    
+    with figure:
+        return figure.save(path, **kwargs)
+
+
+def render(jobs, workers = None):
+    """
+    Render many figures to files concurrently in a pool of worker processes using the Agg backend
+    Each Figure() is pickled ( settings and curve data only ) and drawn from scratch in a worker
+    
+    Usage:
+    render([
+        (fig_a, "img/a/a.png"),
+        (fig_b, "img/b/b.png", {"dpi": 150, "tight_layout": False}),
+        (fig_c, "img/c/c.png", {"figsize": (19.2, 10.07), "dpi": 100}),
+    ])
+    
+    :param jobs: iterable of tuple (Figure(), path) or (Figure(), path, dict of keyword arguments for Figure.save())
+    :param workers: number of worker processes. None uses all CPU cores, 1 renders in the calling process
+    :return: list of paths of the output files
+    """
+    jobs = list(jobs)
+    
+    if workers == 1:
+        return [_render_job(job) for job in jobs]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers = workers, initializer = _init_worker) as pool:
+        return list(pool.map(_render_job, jobs))
+
+
+def density(x, y, bins = (800, 400), x_range = None, y_range = None, chunk = None, workers = None):
+    """
+    2D histogram of an ensemble of curves sharing the same x, vectorized and chunked over the curves
+    
+    :param x: curve data for x shared by all curves, 1D array
+    :param y: curve data for y, 2D array-like ( or memmap ) with one curve per row
+    :param bins: number of bins along x and y
+    :param x_range: (optional) tuple (min, max) of x. Range of x by default
+    :param y_range: (optional) tuple (min, max) of y. Range of all curves by default
+    :param chunk: number of curves accumulated at a time. By default about 4 million points at a time
+    :param workers: number of threads accumulating chunks concurrently. None or 1 for no thread
+    :return: tuple (counts of shape (bins y, bins x), edges of x bins, edges of y bins)
+    """
+    x = np.asarray(x, dtype = float)
+    n_curves = len(y)
+    n_x, n_y = bins
+    chunk = chunk or max(1, 4 * 2 ** 20 // max(len(x), 1))
+    chunks = [(i, min(i + chunk, n_curves)) for i in range(0, n_curves, chunk)]
+    
+    if x_range is None:
+        x_range = (np.nanmin(x), np.nanmax(x))
+        
+    if y_range is None:
+        y_min, y_max = np.inf, -np.inf
+        for a, b in chunks:
+            _y = np.asarray(y[a:b], dtype = float)
+            y_min, y_max = min(y_min, np.nanmin(_y)), max(y_max, np.nanmax(_y))
+        y_range = (y_min, y_max) if y_max > y_min else (y_min - 0.5, y_max + 0.5)
+        
+    x_edges = np.linspace(x_range[0], x_range[1], n_x + 1)
+    y_edges = np.linspace(y_range[0], y_range[1], n_y + 1)
+    
+    # x bin of each sample is shared by all curves
+    ix = np.minimum(np.floor((x - x_range[0]) * (n_x / (x_range[1] - x_range[0]))), n_x - 1)
+    ix[(x < x_range[0]) | (x > x_range[1]) | np.isnan(x)] = -1
+    ix = ix.astype(np.int64)
+    
+    def accumulate(a_b):
+        _y = np.asarray(y[a_b[0]:a_b[1]], dtype = float)
+        iy = np.floor((_y - y_range[0]) * (n_y / (y_range[1] - y_range[0])))
+        valid = (_y >= y_range[0]) & (_y <= y_range[1]) & (ix >= 0)
+        flat = np.minimum(iy[valid], n_y - 1).astype(np.int64) * n_x + np.broadcast_to(ix, _y.shape)[valid]
+        return np.bincount(flat, minlength = n_x * n_y)
+    
+    if workers and workers > 1 and len(chunks) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            counts = sum(pool.map(accumulate, chunks))
+    else:
+        counts = sum(accumulate(a_b) for a_b in chunks)
+        
+    if not chunks:
+        counts = np.zeros(n_x * n_y, dtype = np.int64)
+        
+    return counts.reshape(n_y, n_x), x_edges, y_edges
+
+
+def _histogram_percentile(counts, y_edges, p):
+    """
+    Helper function to estimate the percentile of y in each column of a 2D histogram
+    
+    :param counts: 2D histogram of shape (bins y, bins x)
+    :param y_edges: edges of y bins
+    :param p: percentile ( 0 - 100 )
+    :return: numpy array of the percentile of each column, nan for empty column
+    """
+    cdf = np.cumsum(counts, axis = 0)
+    total = cdf[-1]
+    row = np.argmax(cdf >= (p / 100) * total, axis = 0)
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    
+    return np.where(total > 0, y_centers[row], np.nan)
+
+
+def _array_key(x):
+    """
+    Helper function to identify the memory of a numpy array
+
+    :param x: numpy array
+    :return: tuple (address, shape, strides, dtype)
+    """
+    return x.__array_interface__["data"][0], x.shape, x.strides, x.dtype.str
+
+
+def _monotonic(x):
+    """
+    Helper function to check whether the data is monotonic
+
+    :param x: numpy array
+    :return: bool
+    """
+    dx = np.diff(x)
+    return bool(np.all(dx >= 0) or np.all(dx <= 0))
 
 
 # fig = Figure(row = 1, col= 2)
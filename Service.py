@@ -0,0 +1,368 @@
+"""
+Service.py
+
+Local HTTP/JSON service solving mx" + cx' + kx = F0*cos(OMEGA_0 * t) and evaluating
+the steady state x_s(t), v_s(t) of main.py, for other tools without importing main.py in-process
+
+Concurrent requests arriving within a short window are grouped into one vectorized batch
+( ODE2.solve_batch() for solves, one numpy evaluation for the steady state ),
+so that many small concurrent queries cost about as much as one larger solve.
+Each response carries its own latency metrics.
+
+Endpoints :
+POST /solve     {"m": 5, "c": 1.75, "k": 50, "F0": 4, "OMEGA_0": 3, "x0": 0, "x_dot0": 0, "t_end": 60, "dt": 1e-3, "every": 1}
+POST /evaluate  {"m": 5, "c": 1.75, "k": 50, "F0": 4, "OMEGA_0": 3, "t": [0, 0.1, 0.2]}
+GET  /metrics   latency and batch size statistics of all requests served
+
+Usage :
+python Service.py --port 8765 --window 0.005
+call("/solve", {"m": 5, "c": 1.75, "k": 50, "F0": 4, "OMEGA_0": 3}, port = 8765)  # from another process
+
+Reference :
+https://docs.python.org/3/library/asyncio-stream.html
+
+Written by S. P. Lam
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+
+import numpy as np
+
+from Func import Expression
+
+CONSTANTS = ("m", "c", "k", "F0", "OMEGA_0")
+
+
+def solve(requests):
+    """
+    Solve a batch of requests sharing the same time interval in one vectorized call
+
+    :param requests: list of dict, see /solve
+    :return: list of dict {"t", "x", "v"}, one for each request
+    """
+    from ODE2 import solve_batch
+
+    first = requests[0]
+    _t = np.arange(0, first.get("t_end", 60), first.get("dt", 1e-3))
+    every = int(first.get("every", 1))
+
+    const = {key: np.array([r[key] for r in requests], dtype = float) for key in CONSTANTS}
+    x0 = np.array([r.get("x0", 0) for r in requests], dtype = float)
+    x_dot0 = np.array([r.get("x_dot0", 0) for r in requests], dtype = float)
+    OMEGA_0 = const["OMEGA_0"]
+
+    x, v = solve_batch(const["m"], const["c"], const["k"], const["F0"], x0, x_dot0, _t, lambda t: np.cos(OMEGA_0 * t))
+
+    return [{"t": _t[::every].tolist(), "x": x[i, ::every].tolist(), "v": v[i, ::every].tolist()}
+            for i in range(len(requests))]
+
+
+def evaluate(requests):
+    """
+    Evaluate the steady state x_s(t) and v_s(t) of main.py for a batch of requests sharing the same time
+
+    The expressions and dependent constants ( OMEGA, phi ) of main.env are evaluated by numpy
+    with the constants of all requests at once, as columns of shape (N, 1)
+
+    :param requests: list of dict, see /evaluate
+    :return: list of dict {"x_s", "v_s"}, one for each request
+    """
+    t = np.asarray(requests[0]["t"], dtype = float)[None, :]
+    variables = {key: np.array([[r[key]] for r in requests], dtype = float) for key in CONSTANTS}
+    variables["t"] = t
+
+    # dependent constants in order of definition, e.g. OMEGA = "sqrt(k/m)" then phi
+    for name, expression in _EXPRESSIONS["constants"]:
+        variables[name] = eval(expression, _NAMESPACE, variables)
+
+    x_s = np.broadcast_to(eval(_EXPRESSIONS["x_s"], _NAMESPACE, variables), (len(requests), t.shape[1]))
+    v_s = np.broadcast_to(eval(_EXPRESSIONS["v_s"], _NAMESPACE, variables), (len(requests), t.shape[1]))
+
+    return [{"x_s": x_s[i].tolist(), "v_s": v_s[i].tolist()} for i in range(len(requests))]
+
+
+def _expressions():
+    """
+    Helper function to get the expressions of x_s, v_s and the dependent constants from main.py
+
+    :return: dict
+    """
+    import main
+
+    return {
+        "x_s": main.x_s.func,
+        "v_s": main.v_s.func,
+        "constants": [(key, value) for key, value in main.env.getConstants().items() if isinstance(value, str)]
+    }
+
+
+_EXPRESSIONS = _expressions()
+_NAMESPACE = Expression.NAMESPACE  # functions available in the expressions, as in Func()
+
+# {endpoint: (function solving a batch, function giving the key of requests which can be batched together)}
+HANDLERS = {
+    "/solve": (solve, lambda r: (r.get("t_end", 60), r.get("dt", 1e-3), r.get("every", 1))),
+    "/evaluate": (evaluate, lambda r: tuple(r["t"]))
+}
+
+
+class Batcher:
+
+    def __init__(self, window = 0.005, max_batch = 256):
+        """
+        Group concurrent requests into batches
+        A batch is run when the first request in it has waited for window seconds, or when it is full
+
+        :param window: waiting time (s) to collect requests into a batch
+        :param max_batch: maximum number of requests in a batch
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}  # {(endpoint, key): list of (request, future, arrival time)}
+        # latency of the last 10000 requests of each endpoint
+        self.metrics = {endpoint: {"requests": 0, "batches": 0, "latency": deque(maxlen = 10000)} for endpoint in HANDLERS}
+
+    async def submit(self, endpoint, request):
+        """
+        Submit a request and wait for its result
+
+        :param endpoint: e.g. "/solve"
+        :param request: dict
+        :return: dict of the result, with "metrics" of the request
+        """
+        # check the request here, so that an invalid request does not fail the whole batch
+        for name in CONSTANTS:
+            float(request[name])
+
+        if endpoint == "/solve":
+            _check_solve(request)
+
+        key = HANDLERS[endpoint][1]
+        group = (endpoint, key(request))
+        future = asyncio.get_running_loop().create_future()
+
+        if group not in self.pending:
+            self.pending[group] = []
+            asyncio.get_running_loop().call_later(self.window, self._flush, group)
+
+        self.pending[group].append((request, future, time.perf_counter()))
+
+        if len(self.pending[group]) >= self.max_batch:
+            self._flush(group)
+
+        return await future
+
+    def _flush(self, group):
+        """
+        Helper function to run the batch of a group of requests in a worker thread
+
+        :param group: (endpoint, key)
+        :return: None
+        """
+        batch = self.pending.pop(group, None)
+
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(group[0], batch))
+
+    async def _run(self, endpoint, batch):
+        """
+        Helper function to run a batch and set the result of each request
+
+        :param endpoint: e.g. "/solve"
+        :param batch: list of (request, future, arrival time)
+        :return: None
+        """
+        func = HANDLERS[endpoint][0]
+        start = time.perf_counter()
+
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, func, [r for r, _, _ in batch])
+        except Exception as error:
+            for _, future, _ in batch:
+                future.set_exception(error)
+            return
+
+        end = time.perf_counter()
+        metrics = self.metrics[endpoint]
+        metrics["requests"] += len(batch)
+        metrics["batches"] += 1
+
+        for result, (_, future, arrival) in zip(results, batch):
+            result["metrics"] = {
+                "queue_ms": (start - arrival) * 1e3,
+                "solve_ms": (end - start) * 1e3,
+                "total_ms": (end - arrival) * 1e3,
+                "batch_size": len(batch)
+            }
+            metrics["latency"].append(end - arrival)
+            future.set_result(result)
+
+    def summary(self):
+        """
+        Statistics of all requests served
+
+        :return: dict {endpoint: {"requests", "batches", "mean_batch", "p50_ms", "p95_ms", "max_ms"}}
+        """
+        summary = {}
+
+        for endpoint, metrics in self.metrics.items():
+            latency = np.array(metrics["latency"]) * 1e3
+            summary[endpoint] = {
+                "requests": metrics["requests"],
+                "batches": metrics["batches"],
+                "mean_batch": metrics["requests"] / metrics["batches"] if metrics["batches"] else 0,
+                "p50_ms": float(np.percentile(latency, 50)) if len(latency) else None,
+                "p95_ms": float(np.percentile(latency, 95)) if len(latency) else None,
+                "max_ms": float(latency.max()) if len(latency) else None
+            }
+
+        return summary
+
+
+def _check_solve(request):
+    """
+    Helper function to check the time interval and the initial condition of a /solve request,
+    and store them as numbers so that equal intervals are batched together
+
+    :param request: dict, see /solve
+    :return: None
+    """
+    for name in ("x0", "x_dot0"):
+        float(request.get(name, 0))
+
+    t_end = float(request.get("t_end", 60))
+    dt = float(request.get("dt", 1e-3))
+    every = float(request.get("every", 1))
+
+    if not 0 < t_end < np.inf:
+        raise ValueError(f"t_end should be a finite number > 0, got {t_end}")
+
+    if not 0 < dt < np.inf:
+        raise ValueError(f"dt should be a finite number > 0, got {dt}")
+
+    if not (every >= 1 and every == int(every)):
+        raise ValueError(f"every should be an integer >= 1, got {every}")
+
+    request.update(t_end = t_end, dt = dt, every = int(every))
+
+
+async def _handle(reader, writer, batcher):
+    """
+    Helper function to serve the HTTP requests of a connection, keep-alive by default
+
+    :param reader: asyncio.StreamReader
+    :param writer: asyncio.StreamWriter
+    :param batcher: Batcher()
+    :return: None
+    """
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            method, path, _ = line.decode().split(" ", 2)
+            headers = {}
+
+            while True:
+                header = await reader.readline()
+                if header in (b"\r\n", b"\n", b""):
+                    break
+                name, value = header.decode().split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            try:
+                if method == "GET" and path == "/metrics":
+                    status, result = 200, batcher.summary()
+                elif method == "POST" and path in HANDLERS:
+                    status, result = 200, await batcher.submit(path, json.loads(body))
+                else:
+                    status, result = 404, {"error": f"Unknown endpoint {method} {path}"}
+            except (KeyError, TypeError, ValueError) as error:
+                status, result = 400, {"error": f"{type(error).__name__}: {error}"}
+            except Exception as error:
+                # e.g. failure of the batch, the connection stays usable
+                status, result = 500, {"error": f"{type(error).__name__}: {error}"}
+
+            data = json.dumps(result).encode()
+            writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+
+            if headers.get("connection", "").lower() == "close":
+                break
+
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+
+    finally:
+        writer.close()
+
+
+async def serve(host = "127.0.0.1", port = 8765, window = 0.005, max_batch = 256):
+    """
+    Run the service until cancelled
+
+    :param host: host to listen on, local only by default
+    :param port: port to listen on
+    :param window: waiting time (s) to collect concurrent requests into a batch
+    :param max_batch: maximum number of requests in a batch
+    :return: None
+    """
+    batcher = Batcher(window, max_batch)
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, batcher), host, port)
+
+    async with server:
+        print(f"Serving on http://{host}:{port}")
+        await server.serve_forever()
+
+
+def call(path, payload = None, host = "127.0.0.1", port = 8765):
+    """
+    Send a request to the service, e.g. from another tool
+
+    :param path: endpoint, e.g. "/solve"
+    :param payload: (optional) dict sent as JSON by POST, GET if not given
+    :param host: host of the service
+    :param port: port of the service
+    :return: dict of the response
+    """
+    import http.client
+
+    connection = http.client.HTTPConnection(host, port)
+    try:
+        if payload is None:
+            connection.request("GET", path)
+        else:
+            connection.request("POST", path, json.dumps(payload), {"Content-Type": "application/json"})
+
+        response = connection.getresponse()
+        result = json.loads(response.read())
+
+        if response.status != 200:
+            raise ValueError(result.get("error", f"HTTP {response.status}"))
+
+        return result
+
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Local solve service")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--window", type = float, default = 0.005, help = "batching window (s)")
+    parser.add_argument("--max-batch", type = int, default = 256, help = "maximum number of requests in a batch")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.window, args.max_batch))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,183 @@
+"""
+Spectral.py
+
+Spectral (FFT based) analysis of periodic data
+- resample data onto an exact integer number of periods, so that it is periodic for the FFT
+- differentiate a periodic segment of data by FFT
+- extract the amplitude and phase at the driving frequency (and its harmonics) from x(t)
+- compare them with the analytic steady state x_s(t) = A*cos(OMEGA_0*t - phi)
+
+All methods cost O(n log n) and assume uniformly spaced time t
+
+Reference :
+https://en.wikipedia.org/wiki/Spectral_method
+https://en.wikipedia.org/wiki/Discrete_Fourier_transform
+
+Written by S. P. Lam
+"""
+
+import numpy as np
+
+
+def periodic_resample(y, t, omega, t_min = None, axis = -1):
+    """
+    Resample the data (after t_min) onto exactly an integer number of periods 2*pi/omega,
+    with about the same number of samples, by cubic interpolation ( error O(dt^4) )
+    The segment ends at the last sample, where the transient part of the motion has decayed the most
+
+    Usage:
+    x_p, t_p = periodic_resample(x, t, OMEGA_0, t_min = 30)
+    v = spectral_derivative(x_p, t_p)
+
+    :param y: data, numpy array of any dimension
+    :param t: time, uniformly spaced 1D numpy array along the given axis of y
+    :param omega: angular frequency of the periodic motion
+    :param t_min: (optional) earliest time of the segment, e.g. after the transient part
+    :param axis: axis of y along which the time runs
+    :return: tuple (resampled data with the time along axis, uniformly spaced time of the samples),
+             the time step is n_periods * 2*pi/omega / number of samples
+    """
+    y = np.moveaxis(np.asarray(y, dtype = float), axis, -1)
+    t = np.asarray(t, dtype = float)
+    dt = t[1] - t[0]
+    first = 0 if t_min is None else int(np.searchsorted(t, t_min))
+    period = 2 * np.pi / omega
+
+    n_periods = int((t[-1] - t[first]) / period)
+    if n_periods < 1 or len(t) - first < 4:
+        raise ValueError(f"Data after t = {t[first]} is shorter than one period {period}")
+
+    length = int(round(n_periods * period / dt))
+    step = n_periods * period / length
+    _t = t[-1] - step * np.arange(length - 1, -1, -1)  # the last period ends one step after t[-1]
+
+    # 4 point Lagrange interpolation between samples i and i + 1
+    position = (_t - t[0]) / dt
+    i = np.clip(np.floor(position).astype(int), first + 1, len(t) - 3)
+    u = position - i
+    weights = (-u * (u - 1) * (u - 2) / 6, (u + 1) * (u - 1) * (u - 2) / 2,
+               -(u + 1) * u * (u - 2) / 2, (u + 1) * u * (u - 1) / 6)
+    _y = sum(w * y[..., i + j - 1] for j, w in enumerate(weights))
+
+    return np.moveaxis(_y, -1, axis), _t
+
+
+def spectral_derivative(y, t, order = 1, axis = -1):
+    """
+    Derivative of periodic data by FFT
+    The data should cover exactly an integer number of periods, see periodic_resample()
+
+    Usage:
+    x_p, t_p = periodic_resample(x, t, OMEGA_0, t_min = 30)
+    v = spectral_derivative(x_p, t_p)
+
+    :param y: periodic data, numpy array of any dimension
+    :param t: time, uniformly spaced 1D numpy array along the given axis of y
+    :param order: order of the derivative
+    :param axis: axis of y along which to differentiate
+    :return: type of numpy array
+    """
+    y = np.asarray(y, dtype = float)
+    n = y.shape[axis]
+    dt = t[1] - t[0]
+
+    k = 2 * np.pi * np.fft.rfftfreq(n, dt)
+    factor = (1j * k) ** order
+    if order % 2 and n % 2 == 0:
+        # Nyquist component of real data has no defined odd derivative
+        factor[-1] = 0
+
+    shape = [1] * y.ndim
+    shape[axis] = len(k)
+
+    return np.fft.irfft(np.fft.rfft(y, axis = axis) * factor.reshape(shape), n, axis = axis)
+
+
+def harmonics(x, t, omega, n_harmonics = 1, t_min = None, axis = -1):
+    """
+    Amplitude and phase of x(t) at the driving frequency omega and its harmonics
+    x(t) ~ sum over h of A_h * cos(h*omega*t - phi_h)
+
+    Usage:
+    A, phi = harmonics(x, t, OMEGA_0, t_min = 30)
+    A[..., 0], phi[..., 0]  # at the driving frequency
+
+    :param x: data, numpy array of any dimension
+    :param t: time, uniformly spaced 1D numpy array along the given axis of x
+    :param omega: driving (fundamental) angular frequency
+    :param n_harmonics: number of harmonics, 1 for the driving frequency only
+    :param t_min: (optional) ignore data before t_min, i.e. the transient part of the motion
+    :param axis: axis of x along which the time runs
+    :return: tuple of numpy array (amplitude, phase), each of shape x.shape without axis + (n_harmonics,)
+    """
+    x, _t = periodic_resample(x, t, omega, t_min, axis = axis)
+    n_periods = int(round((_t[-1] - _t[0] + _t[1] - _t[0]) * omega / (2 * np.pi)))
+    t0 = _t[0]
+    n = x.shape[axis]
+
+    # frequency along the last axis
+    spectrum = np.moveaxis(np.fft.rfft(x, axis = axis), axis, -1)
+    h = np.arange(1, n_harmonics + 1)
+    bins = n_periods * h
+
+    if bins[-1] >= spectrum.shape[-1]:
+        raise ValueError(f"Harmonic {n_harmonics} is above the Nyquist frequency of the data")
+
+    X = spectrum[..., bins]
+    amplitude = 2 * np.abs(X) / n
+    # X = (n/2) * A * exp(i*(h*omega*t0 - phi)) for x = A*cos(h*omega*t - phi)
+    phase = np.angle(np.exp(1j * (h * omega * t0 - np.angle(X))))
+
+    return amplitude, phase
+
+
+def steady_state(m, c, k, F0, OMEGA_0):
+    """
+    Analytic amplitude and phase of the steady state displacement
+    x_s(t) = A*cos(OMEGA_0*t - phi) of mx" + cx' + kx = F0*cos(OMEGA_0 * t)
+    phi equals arctan(c*OMEGA_0 / (m*(OMEGA^2 - OMEGA_0^2))) used in main.py for OMEGA_0 < OMEGA,
+    and stays correct above the natural frequency OMEGA
+
+    :param m: mass
+    :param c: damping constant
+    :param k: spring constant
+    :param F0: amplitude of external driving force
+    :param OMEGA_0: driving frequency
+    :return: tuple (A, phi)
+    """
+    a = k - m * OMEGA_0 ** 2
+    b = c * OMEGA_0
+
+    return F0 / np.sqrt(a ** 2 + b ** 2), np.arctan2(b, a)
+
+
+def compare_steady_state(x, t, m, c, k, F0, OMEGA_0, t_min = None):
+    """
+    Compare the amplitude and phase of x(t) at the driving frequency with the analytic steady state x_s(t)
+
+    Usage:
+    x, v = solve_ode2(m, c, k, F0, OMEGA_0, t)
+    print(compare_steady_state(x, t, m, c, k, F0, OMEGA_0, t_min = 30))
+
+    :param x: displacement data, numpy array. Stacks of trajectories are compared along the last axis
+    :param t: time, uniformly spaced numpy array
+    :param m: mass
+    :param c: damping constant
+    :param k: spring constant
+    :param F0: amplitude of external driving force
+    :param OMEGA_0: driving frequency
+    :param t_min: (optional) ignore data before t_min, i.e. the transient part of the motion
+    :return: dict with the measured and analytic amplitude and phase, relative amplitude error and phase error
+    """
+    amplitude, phase = harmonics(x, t, OMEGA_0, t_min = t_min)
+    amplitude, phase = amplitude[..., 0], phase[..., 0]
+    A, phi = steady_state(m, c, k, F0, OMEGA_0)
+
+    return {
+        "amplitude": amplitude,
+        "phi": phase,
+        "amplitude_s": A,
+        "phi_s": phi,
+        "amplitude_error": (amplitude - A) / A,
+        "phi_error": np.angle(np.exp(1j * (phase - phi)))
+    }
@@ -0,0 +1,195 @@
+"""
+Store.py
+
+Chunked, compressed columnar store of solved trajectories, e.g. the sweeps of main.py
+
+A store is a directory of runs. Each run is one compressed .npz file holding
+- meta : metadata of the run ( JSON ), e.g. case, command, time of creation
+- params : table of constants, one row per trajectory and one column per constant
+- t : time
+- <column>/<i> : the i-th chunk along time of each data column, e.g. x/0, x/1, ..., v/0, ...
+
+Members of an .npz file are read on access only, so a query reads the small params table of each run
+and then only the chunks of the columns overlapping the time range requested.
+Each run is written to a temporary file and renamed, so concurrent writers (threads or processes)
+can append to the same store without locking, and readers never see a partial run.
+
+Reference :
+https://numpy.org/doc/stable/reference/generated/numpy.savez_compressed.html
+
+Written by S. P. Lam
+"""
+
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+
+
+class ResultStore:
+
+    def __init__(self, path, chunk = 10000):
+        """
+        A store of solved trajectories in a directory
+
+        Usage:
+        store = ResultStore("results")
+        store.append(t, {"x": x_dc, "v": v_dc}, params = {"m": 5, "c": dc, "k": 50}, meta = {"case": "Under-damping"})
+        params, _t, x = store.query("x", where = {"c": (1, 2)}, t = (10, 20))
+
+        :param path: directory of the store, created if it does not exist
+        :param chunk: number of time samples in each chunk
+        """
+        self.path = path
+        self.chunk = int(chunk)
+        os.makedirs(path, exist_ok = True)
+
+    def append(self, t, columns, params, meta = None):
+        """
+        Append a run of trajectories sharing the same time
+
+        :param t: time, 1D array
+        :param columns: dict {name: 2D array (or list of 1D arrays) of shape (number of trajectories, len(t))}
+        :param params: dict {name of constant: scalar (same for all trajectories) or 1D array (one per trajectory)}
+        :param meta: (optional) dict of metadata of the run, JSON serializable
+        :return: id of the run
+        """
+        t = np.asarray(t, dtype = float)
+        columns = {name: np.atleast_2d(np.asarray(data, dtype = float)) for name, data in columns.items()}
+        n = len(next(iter(columns.values())))
+
+        for name, data in columns.items():
+            if data.shape != (n, len(t)):
+                raise ValueError(f"Column {name} should have shape {(n, len(t))}, got {data.shape}")
+
+        names = sorted(params)
+        table = np.column_stack([np.broadcast_to(np.asarray(params[name], dtype = float), (n,)) for name in names])
+
+        run = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        meta = dict(meta or {}, id = run, created = time.time(), params = names, columns = sorted(columns),
+                    n = n, chunk = self.chunk, t_range = [float(t[0]), float(t[-1])] if len(t) else None)
+
+        arrays = {"meta": np.array(json.dumps(meta)), "params": table, "t": t}
+        for name, data in columns.items():
+            for i, start in enumerate(range(0, len(t), self.chunk)):
+                arrays[f"{name}/{i}"] = data[:, start:start + self.chunk]
+
+        # write to a temporary file first, rename is atomic so that readers never see a partial run
+        path = os.path.join(self.path, run + ".npz")
+        with open(path + ".tmp", "wb") as file:
+            np.savez_compressed(file, **arrays)
+
+        os.replace(path + ".tmp", path)
+
+        return run
+
+    def runs(self):
+        """
+        Metadata of all runs in the store, oldest first
+
+        :return: list of dict
+        """
+        runs = []
+        for name in sorted(os.listdir(self.path)):
+            if name.endswith(".npz"):
+                with np.load(os.path.join(self.path, name)) as file:
+                    runs.append(json.loads(file["meta"][()]))
+
+        return runs
+
+    def query(self, column, where = None, t = None, runs = None):
+        """
+        Lazily read a column of the trajectories matching the conditions, over a time range
+        Only the chunks overlapping the time range are read
+
+        Usage:
+        params, _t, x = store.query("x", where = {"c": [1, 2], "k": 50}, t = (10, 20))
+        params["c"]  # value of c of each row of x
+
+        :param column: name of the data column, e.g. "x"
+        :param where: (optional) dict {name of constant: condition}, condition is
+                      a scalar (equal), a tuple (low, high) (inclusive range) or a list (any of the values)
+        :param t: (optional) tuple (t_min, t_max) of the time range, inclusive
+        :param runs: (optional) ids of the runs to read, all by default
+        :return: tuple (dict {name of constant: 1D array}, time 1D array, data 2D array of shape (rows, len(time)))
+        """
+        tables = []  # dict of constants of the rows matched in each run
+        blocks = []
+        _t = None
+
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".npz") or (runs is not None and name[:-4] not in runs):
+                continue
+
+            with np.load(os.path.join(self.path, name)) as file:
+                meta = json.loads(file["meta"][()])
+
+                if column not in meta["columns"]:
+                    continue
+
+                table = file["params"]
+                rows = _match(table, meta["params"], where)
+
+                if not rows.any():
+                    continue
+
+                run_t = file["t"]
+                lo, hi = 0, len(run_t)
+                if t is not None:
+                    lo = int(np.searchsorted(run_t, t[0], side = "left"))
+                    hi = int(np.searchsorted(run_t, t[1], side = "right"))
+
+                if _t is None:
+                    _t = run_t[lo:hi]
+                elif len(_t) != hi - lo or not np.allclose(_t, run_t[lo:hi]):
+                    raise ValueError(f"Run {meta['id']} has a different time grid, query it with runs = [...] separately")
+
+                # read only the chunks overlapping [lo, hi)
+                chunk = meta["chunk"]
+                parts = [file[f"{column}/{i}"][rows] for i in range(lo // chunk, (hi - 1) // chunk + 1)] if hi > lo else []
+                data = np.concatenate(parts, axis = 1) if parts else np.empty((rows.sum(), 0))
+                offset = (lo // chunk) * chunk
+                blocks.append(data[:, lo - offset:hi - offset])
+
+                tables.append({key: table[rows, i] for i, key in enumerate(meta["params"])})
+
+        if not blocks:
+            return {}, np.empty(0), np.empty((0, 0))
+
+        # constants missing in a run are nan
+        keys = sorted(set().union(*tables))
+        params = {key: np.concatenate([table.get(key, np.full(len(block), np.nan)) for table, block in zip(tables, blocks)])
+                  for key in keys}
+
+        return params, _t, np.concatenate(blocks)
+
+
+def _match(table, names, where):
+    """
+    Helper function to find the rows of a params table matching the conditions
+
+    :param table: 2D array, one column per constant
+    :param names: names of the columns of table
+    :param where: dict {name of constant: condition}, see ResultStore.query()
+    :return: boolean numpy array, one per row
+    """
+    rows = np.ones(len(table), dtype = bool)
+
+    for key, condition in (where or {}).items():
+        if key not in names:
+            return np.zeros(len(table), dtype = bool)
+
+        value = table[:, names.index(key)]
+
+        if isinstance(condition, tuple):
+            rows &= (value >= condition[0]) & (value <= condition[1])
+
+        elif isinstance(condition, (list, np.ndarray)):
+            rows &= np.isclose(value[:, None], np.asarray(condition, dtype = float)[None, :]).any(axis = 1)
+
+        else:
+            rows &= np.isclose(value, condition)
+
+    return rows
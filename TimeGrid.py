@@ -0,0 +1,146 @@
+"""
+TimeGrid.py
+
+A lazy uniform time grid t_i = start + i * step, i = 0, 1, ..., n - 1
+
+Unlike np.arange(0, 60, 1e-3), no array of timestamps is stored : values are computed by index arithmetic
+only on demand, e.g. one chunk at a time, so that a long horizon never needs a giant t array.
+Func, Expression, Diff and ODE2 detect a TimeGrid and use its constant step directly
+( no np.diff() or uniformity check, constant finite difference stencils, chunked evaluation ).
+np.asarray(grid) materializes the whole grid when an array is really needed, e.g. for plotting.
+
+Written by S. P. Lam
+"""
+
+import numpy as np
+
+
+class TimeGrid:
+
+    ndim = 1
+
+    def __init__(self, start, step, n):
+        """
+        A lazy uniform time grid
+
+        Usage:
+        t = TimeGrid(0, 1e-3, 60000)  # same values as np.arange(0, 60, 1e-3)
+        t = TimeGrid.arange(0, 600, 1e-3)
+        t[10], t[-1], t[1000:2000]  # float, float, TimeGrid
+        for start, _t in t.chunks(10000): ...  # numpy array of each chunk
+        x_s(t)  # Func evaluated chunk by chunk
+
+        :param start: first time
+        :param step: time step, non zero
+        :param n: number of samples
+        """
+        if step == 0:
+            raise ValueError("Time step should be non zero")
+
+        if n < 0:
+            raise ValueError(f"Number of samples should be >= 0, got {n}")
+
+        self.start = float(start)
+        self.step = float(step)
+        self.n = int(n)
+
+    @classmethod
+    def arange(cls, start, stop, step):
+        """
+        Lazy equivalent of np.arange(start, stop, step)
+
+        :param start: first time
+        :param stop: end of the interval, excluded
+        :param step: time step
+        :return: TimeGrid()
+        """
+        return cls(start, step, max(int(np.ceil((stop - start) / step)), 0))
+
+    @property
+    def shape(self):
+        return (self.n,)
+
+    @property
+    def end(self):
+        """
+        Last time of the grid
+        """
+        return self.start + self.step * (self.n - 1)
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return f"TimeGrid(start = {self.start}, step = {self.step}, n = {self.n})"
+
+    def __array__(self, dtype = None, copy = None):
+        return self.values().astype(dtype or float, copy = False)
+
+    def __getitem__(self, index):
+        """
+        Time at an index ( float ), a sub-grid for a slice ( TimeGrid ), or times at an array of indices ( numpy array )
+
+        :param index: int, slice or array of int
+        :return: float, TimeGrid or numpy array
+        """
+        if isinstance(index, slice):
+            lo, hi, stride = index.indices(self.n)
+            return TimeGrid(self.start + self.step * lo, self.step * stride, len(range(lo, hi, stride)))
+
+        if isinstance(index, (int, np.integer)):
+            if not -self.n <= index < self.n:
+                raise IndexError(f"Index {index} out of range of {self.n} samples")
+
+            return self.start + self.step * (index % self.n)
+
+        index = np.asarray(index)
+        if np.any((index < -self.n) | (index >= self.n)):
+            raise IndexError(f"Index out of range of {self.n} samples")
+
+        return self.start + self.step * (index % self.n)
+
+    def values(self, lo = 0, hi = None):
+        """
+        Materialize the times of the samples lo to hi - 1
+
+        :param lo: first index
+        :param hi: (optional) end index, excluded. n by default
+        :return: numpy array
+        """
+        hi = self.n if hi is None else min(hi, self.n)
+
+        return self.start + self.step * np.arange(lo, hi)
+
+    def chunks(self, size = 65536):
+        """
+        Materialize the grid one chunk at a time
+
+        :param size: number of samples in each chunk
+        :return: generator of tuple (index of the first sample, numpy array of times)
+        """
+        for lo in range(0, self.n, size):
+            yield lo, self.values(lo, lo + size)
+
+    def map(self, func, chunk = 65536):
+        """
+        Evaluate a vectorized function of time over the grid chunk by chunk, into one output array
+        The temporaries of func are of the size of a chunk only
+
+        :param func: function of a numpy array of times, returning an array (or a scalar) broadcast along the last axis
+        :param chunk: number of samples in each chunk
+        :return: numpy array of shape (..., n)
+        """
+        if self.n == 0:
+            return np.asarray(func(self.values()))
+
+        out = None
+
+        for lo, _t in self.chunks(chunk):
+            value = np.asarray(func(_t))
+
+            if out is None:
+                out = np.empty(value.shape[:-1] + (self.n,), dtype = np.result_type(value, float))
+
+            out[..., lo:lo + len(_t)] = value
+
+        return out
@@ -4,15 +4,35 @@ main.py
 PHYS2160 Introductory Computational Physics 2024-25 Project
 Q2 Driven Oscillation in a Resistive Medium
 
+Usage :
+python main.py                                            # solve and show all figures of the report
+python main.py plot --save-dir img --workers 4            # save all figures of the report, without window
+python main.py solve --case "Under-damping" --out x.npz   # solve the ODE only, no plotting library is loaded
+python main.py sweep --case "Under-damping" --param c --out x_dc.npz
+python main.py sweep --param k --store results            # append to a result store, see Store.py
+python main.py sweep --param c --values 1.7 1.8 --linear  # one solve with sensitivities instead of one per value
+python main.py resonance --case "Under-damping" --out resonance.npz
+python main.py solve --forcing record.npy --method green  # driven by a measured record f(t) instead of cos(OMEGA_0 * t)
+python main.py plot --input x_dc.npz                      # plot a result saved by solve / sweep / resonance
+python main.py plot --cache .cache --save-dir img         # rerun only the stages changed since the last run
+python main.py --config datasets.json solve --case "My case"
+python main.py --profile sweep --param k                  # statistics of the solves, most expensive first
+
+A config file is a JSON object in the same format as dataset below, i.e. {case: {"m": ..., "c": ..., ...}, ...}
+Heavy modules ( scipy via ODE2, matplotlib via Plot ) are imported only by the commands using them,
+so that compute-only invocations start quickly.
+
 Written by S. P. Lam
 """
 
+import argparse
+import json
+import sys
+
 import numpy as np
 
-from ODE2 import ODE2
-from Plot import Figure
 from Func import Environment
-from Diff import dydx
+from Damping import classify, mask, UNDER, CRITICAL, OVER
 
 ##### CONSTANTS #####
 """
@@ -26,7 +46,7 @@ Angular frequency : OMEGA = np.sqrt(k/m)
 Resonance frequency : OMEGA_R = np.sqrt(OMEGA**2 - (c**2)/2/m**2)
 Phase constant : PHI = np.arctan(c*OMEGA_0/(m*((OMEGA**2) - (OMEGA_0**2))))
 """
-dataset = {
+DATASET = {
     "Under-damping": {
         "m"       : 5,
         "c"       : 1.75,
@@ -55,7 +75,25 @@ dataset = {
     }
 }
 
-t = np.arange(0, 60, 1e-3)  # time interval
+dataset = DATASET  # datasets in use, replaced by the config file if given
+
+T_END = 60  # end of time interval
+DT = 1e-3  # time step
+t = np.arange(0, T_END, DT)  # time interval
+
+# parameters varied in PART (B) : {parameter: (key of values in dataset, layout of figure, name in title, axes title)}
+SWEEPS = {
+    "m"      : ("dm", (2, 2), "Mass $m$", "m = {}"),
+    "c"      : ("dc", (3, 2), "Damping Constant $c$", "c = {}"),
+    "k"      : ("dk", (3, 2), "Spring Constant $k$", "k = {}"),
+    "F0"     : ("dF0", (2, 2), "Amplitude of Driving Force $F_0$", "F0 = {}"),
+    "OMEGA_0": ("dOMEGA_0", (3, 1), "Driving Frequency $\\omega_0$", "$\\omega_0$ = {}")
+}
+
+# size (inches) and resolution of the figures of the report, as in img/ : 640 x 480 and 1920 x 1007 ( full screen ) pixels
+FIGURE_DPI = 100
+FIGURE_SIZE = (6.4, 4.8)
+FIGURE_SIZE_LARGE = (19.2, 10.07)
 #####################
 
 #### ENVIRONMENT ####
@@ -82,47 +120,50 @@ v_s = env.newF(
 #####################
 
 
-def validate_data(case, c, m, k, OMEGA_0):
+def validate_data(case, c, m, k, OMEGA_0, rtol = 1e-6):
     """
     Validate data for different damping condition
+    See Damping.classify() to validate arrays of constants at once without exception
     
     :param case: type of damping : "Under-damping", "Critical Damping", "Over-damping"
     :param c: damping constant
     :param m: mass
     :param k: spring constant
     :param OMEGA_0: driving frequency
+    :param rtol: relative tolerance of critical damping on the damping ratio
     :return: bool
     """
-    OMEGA = np.sqrt(k/m)
-    OMEGA_R = np.sqrt(abs( OMEGA ** 2 - (c ** 2) / 2 / m ** 2 ))
-    EPS = np.finfo(float).eps  # https://stackoverflow.com/questions/19141432/python-numpy-machine-epsilon
+    result = classify(m, c, k, OMEGA_0, rtol)
+    OMEGA = result["OMEGA"]
+    OMEGA_R = result["OMEGA_R"]
     
-    if case == "Under-damping" and not (c / 2 / m) ** 2 < OMEGA ** 2:
+    if case == "Under-damping" and not np.all(result["regime"] == UNDER):
         raise ValueError("Not Under-damping\n"
                          "Condition : (c/2m)^2 < OMEGA^2\n"
                          f"(c/2m)^2 = {(c / 2 / m) ** 2}\n"
                          f"OMEGA^2 = k/m = {OMEGA ** 2}")
     
-    elif case == "Critical Damping" and not abs((c / 2 / m) ** 2 - OMEGA ** 2) < EPS:
+    elif case == "Critical Damping" and not np.all(result["regime"] == CRITICAL):
         raise ValueError("Not Critical Damping\n"
-                         "Condition : (c/2m)^2 = OMEGA^2\n"
+                         f"Condition : (c/2m)^2 = OMEGA^2 within relative tolerance {rtol} on c/(2*sqrt(km))\n"
                          f"(c/2m)^2 = {(c / 2 / m) ** 2}\n"
                          f"OMEGA^2 = k/m = {OMEGA ** 2}")
     
-    elif case == "Over-damping" and not (c / 2 / m) ** 2 > OMEGA ** 2:
+    elif case == "Over-damping" and not np.all(result["regime"] == OVER):
         raise ValueError("Not Over-damping\n"
                          "Condition : (c/2m)^2 > OMEGA^2\n"
                          f"(c/2m)^2 = {(c / 2 / m) ** 2}\n"
                          f"OMEGA^2 = k/m = {OMEGA ** 2}")
     
-    if not OMEGA_0 < OMEGA_R:
+    if not np.all(result["below_resonance"]):
         # driving frequency should < resonance frequency
         raise ValueError(f"Driving frequency OMEGA_0 ({OMEGA_0}) should < resonance frequency OMEGA_R ({OMEGA_R})")
     
     return True
 
 
-def solve_ode2(m, c, k, F0, OMEGA_0, time = np.arange(0, 60, 1e-3)):
+def solve_ode2(m, c, k, F0, OMEGA_0, time = np.arange(0, 60, 1e-3), PHI = None, OMEGA = None, profiler = None,
+               method = "odeint", forcing = None):
     """
     Solving 2nd-order Ordinary Differential Equation
     mx" + cx' + kx = F0*cos(OMEGA_0 * t)
@@ -132,15 +173,48 @@ def solve_ode2(m, c, k, F0, OMEGA_0, time = np.arange(0, 60, 1e-3)):
     :param k: spring constant  (N/m)
     :param F0: amplitude of external driving force  (N)
     :param OMEGA_0: driving frequency
-    # :param OMEGA: angular frequency
-    # :param PHI: phase constant
     :param time: time interval of type numpy.array()
+    :param PHI: (optional) phase constant used in the initial condition. Computed from the given constants by default
+    :param OMEGA: (optional) angular frequency used in the initial condition. Computed from the given constants by default
+    :param profiler: (optional) ODE2.Profiler() collecting the statistics of the solve ( odeint only )
+    :param method: (optional) "odeint", or "green" for the convolution with the Green's function, see ODE2.green()
+    :param forcing: (optional) driving function f(t) replacing cos(OMEGA_0 * t), e.g. a measured record Forcing.Tabulated()
     :return: tuple : (displacement x, velocity x')
     """
+    from ODE2 import ODE2  # scipy is loaded only when solving
+    
+    x0, x_dot0 = initial_condition(m, c, k, F0, OMEGA_0, PHI, OMEGA)
+    ode = ODE2(m, c, k, F0, x0, x_dot0, forcing or (lambda t: np.cos(OMEGA_0 * t)), profiler = profiler)
+    
+    # numerical result for 2nd order ODE
+    x, v = ode(time, method = method)
+    
+    return x, v
+
+
+def initial_condition(m, c, k, F0, OMEGA_0, PHI = None, OMEGA = None):
+    """
+    Initial condition of solve_ode2()
+    
+    :param m: mass  (kg)
+    :param c: damping constant > 0  (kg/s)
+    :param k: spring constant  (N/m)
+    :param F0: amplitude of external driving force  (N)
+    :param OMEGA_0: driving frequency
+    :param PHI: (optional) phase constant. Computed from the given constants by default
+    :param OMEGA: (optional) angular frequency. Computed from the given constants by default
+    :return: tuple : (x(0), x'(0))
+    """
+    if OMEGA is None:
+        OMEGA = np.sqrt(k / m)
+        
+    if PHI is None:
+        PHI = np.arctan(c * OMEGA_0 / (m * ((OMEGA ** 2) - (OMEGA_0 ** 2))))
+    
     # get Environment() class constants
     # assumed env = Environment() class exists
     # this function is dedicatedly written for this project
-    _const = env.getConstants()
+    _const = dict(env.getConstants())
     
     # set constants
     env.setConstants(
@@ -153,303 +227,764 @@ def solve_ode2(m, c, k, F0, OMEGA_0, time = np.arange(0, 60, 1e-3)):
             # phi = PHI
     )
     
-    # compute ODE
     x0 = F0 * np.cos(PHI) + x_s()[0]  # initial condition : x(0)
     x_dot0 = -F0 * (c / (2 * m)) * np.cos(PHI) - F0 * np.sqrt(OMEGA ** 2 - (c / 2 / m) ** 2) * np.sin(-PHI) + v_s()[0]  # -F0*OMEGA_0*np.sin(-PHI) / np.sqrt( (m**2)*((OMEGA**2)-(OMEGA_0**2))**2 + (c**2)*(OMEGA_0**2) )  # initial condition : x'(0)
-    ode = ODE2(m, c, k, F0, x0, x_dot0, lambda t: np.cos(OMEGA_0 * t))
-    
-    # numerical result for 2nd order ODE
-    x, v = ode(time)
     
     # replace env constant value to its original
     env.setConstants(_const)
     
-    return x, v
+    return x0, x_dot0
+
 
+def load_dataset(path = None):
+    """
+    Load datasets from a JSON config file
+    
+    :param path: path of the config file. The built-in DATASET is returned if not given
+    :return: dict {case: {"m": ..., "c": ..., ...}, ...}
+    """
+    if not path:
+        return DATASET
+    
+    with open(path) as file:
+        return json.load(file)
 
-##### main #####
-for case in ["Under-damping"]:  # dataset.keys():
-    data = dataset[case]
-    m = data["m"]
-    c = data["c"]
-    k = data["k"]
-    F0 = data["F0"]
-    OMEGA_0 = data["OMEGA_0"]
+
+def derived_constants(data):
+    """
+    Angular frequency, resonance frequency and phase constant of a dataset
+    
+    :param data: dict of constants of one case
+    :return: tuple (OMEGA, OMEGA_R, PHI)
+    """
+    m, c, k, OMEGA_0 = data["m"], data["c"], data["k"], data["OMEGA_0"]
     OMEGA = np.sqrt(k / m)  # angular frequency
     OMEGA_R = np.sqrt(OMEGA ** 2 - (c ** 2) / 2 / m ** 2)  # resonance frequency
     PHI = np.arctan(c * OMEGA_0 / (m * ((OMEGA ** 2) - (OMEGA_0 ** 2))))  # phase constant
     
-    # validate data
-    validate_data(case, c, m, k, OMEGA_0)
+    return OMEGA, OMEGA_R, PHI
+
+
+def set_case(data):
+    """
+    Define and update constants of a case in environment
     
-    # define and update constant in environment
+    :param data: dict of constants of one case
+    :return: None
+    """
     env.setConstants(
-            m = m,
-            c = c,
-            k = k,
-            F0 = F0,
-            OMEGA_0 = OMEGA_0,
+            m = data["m"],
+            c = data["c"],
+            k = data["k"],
+            F0 = data["F0"],
+            OMEGA_0 = data["OMEGA_0"],
             # OMEGA = "sqrt(k/m)",
             # phi = "arctan(c * OMEGA_0 / (m * ((OMEGA**2) - (OMEGA_0**2)) ))"
     )
+
+
+def solve_case(case, data, time = t, profiler = None, method = "odeint", forcing = None):
+    """
+    Validate and solve one case at its own constants
     
-    # Solving 2nd-order Ordinary Differential Equation
-    # mx" + cx' + kx = F0*cos(OMEGA_0 * t)
-    x, v = solve_ode2(m, c, k, F0, OMEGA_0, t)
+    :param case: type of damping, key of dataset
+    :param data: dict of constants of the case
+    :param time: time interval of type numpy.array()
+    :param profiler: (optional) ODE2.Profiler() collecting the statistics of the solve
+    :param method: (optional) "odeint" or "green", see solve_ode2()
+    :param forcing: (optional) driving function f(t) replacing cos(OMEGA_0 * t), see solve_ode2()
+    :return: tuple : (displacement x, velocity x')
+    """
+    m, c, k, F0, OMEGA_0 = data["m"], data["c"], data["k"], data["F0"], data["OMEGA_0"]
     
-    ##### graph plotting for PART (A) #####
-    f1 = [t, x]
-    f2 = [t, x_s(t)]
+    # validate data
+    validate_data(case, c, m, k, OMEGA_0)
     
-    fig_a = Figure(row = 1, col = 1)
-    fig_a.add_graph([f1, f2], label = ["$x(t)$", "$x_s(t)$"])
-    fig_a.set_axes_title("Displacement of the Block $x(t)$ and at its Steady State $x_s(t)$")
-    fig_a.set_x_label("$t$")
-    fig_a.set_y_label("$x(t)$")
-    fig_a.plot(tight_layout = False)
-    #######################################
+    # Solving 2nd-order Ordinary Differential Equation
+    # mx" + cx' + kx = F0*cos(OMEGA_0 * t)
+    return solve_ode2(m, c, k, F0, OMEGA_0, time, profiler = profiler, method = method, forcing = forcing)
+
+
+def sweep(case, data, param, values = None, time = t, profiler = None, linear = False):
+    """
+    Solve one case at different values of one constant, the other constants are kept
+    Note that the initial condition uses the phase constant and angular frequency of the original constants
     
-    ##### graph plotting for PART (B) #####
-    g1 = [t, dydx(x, t)]
-    g2 = [t, v_s(t)]
+    With linear = True, the ODE is solved once at the original constants with its sensitivities ( ODE2.sensitivity() ),
+    and the trajectories at each value are first order predictions, accurate for values near the original one
     
-    fig_b = Figure(row = 1, col = 1)
-    fig_b.add_graph([g1, g2], label = ["$v(t)$", "$v_s(t)$"])
-    fig_b.set_axes_title("Velocity of the Block $v(t)$ and at its Stead State $v_s(t)$")
-    fig_b.set_x_label("$t$")
-    fig_b.set_y_label("$v(t)$")
-    fig_b.plot(tight_layout = False)
-    #######################################
-    
-    # prepare data for plotting with different values of constants
-    dm = data["dm"]
-    dc = data["dc"]
-    dk = data["dk"]
-    dF0 = data["dF0"]
-    dOMEGA_0 = data["dOMEGA_0"]
-    x_dm = []  # solution for x at different values of m
-    x_dc = []  # solution for x at different values of c
-    x_dk = []  # solution for x at different values of k
-    x_dF0 = []  # solution for x at different values of F0
-    x_dOMEGA_0 = []  # solution for x at different values of OMEGA_0
-    v_dm = []  # solution for v at different values of m
-    v_dc = []  # solution for v at different values of c
-    v_dk = []  # solution for v at different values of k
-    v_dF0 = []  # solution for v at different values of F0
-    v_dOMEGA_0 = []  # solution for v at different values of OMEGA_0
-    
-    for _m in dm:
-        # validate data
-        validate_data(case, c, _m, k, OMEGA_0)
-        
-        # solve ODE
-        _x, _v = solve_ode2(_m, c, k, F0, OMEGA_0, t)
-        
-        # append to data list
-        x_dm.append(_x)
-        v_dm.append(_v)
-        
-    for _c in dc:
-        # validate data
-        validate_data(case, _c, m, k, OMEGA_0)
-        
-        # solve ODE
-        _x, _v = solve_ode2(m, _c, k, F0, OMEGA_0, t)
-        
-        # append to data list
-        x_dc.append(_x)
-        v_dc.append(_v)
-        
-    for _k in dk:
-        # validate data
-        validate_data(case, c, m, _k, OMEGA_0)
+    :param case: type of damping, key of dataset
+    :param data: dict of constants of the case
+    :param param: name of the constant varied, key of SWEEPS
+    :param values: values of the constant. data["d" + param] by default
+    :param time: time interval of type numpy.array()
+    :param profiler: (optional) ODE2.Profiler() collecting the statistics of the solves
+    :param linear: predict the trajectories from one solve with sensitivities instead of solving at each value
+    :return: tuple : (values, list of displacement x, list of velocity x')
+    """
+    if values is None:
+        values = data[SWEEPS[param][0]]
         
-        # solve ODE
-        _x, _v = solve_ode2(m, c, _k, F0, OMEGA_0, t)
+    OMEGA, OMEGA_R, PHI = derived_constants(data)
+    x_list = []  # solution for x at different values
+    v_list = []  # solution for v at different values
+    
+    if param != "F0":
+        # validate all values at once, the first invalid value raises the error of validate_data()
+        const = {key: data[key] for key in ("m", "c", "k", "OMEGA_0")}
+        const[param] = np.asarray(values, dtype = float)
+        invalid = np.flatnonzero(~mask(classify(**const), case))
         
-        # append to data list
-        x_dk.append(_x)
-        v_dk.append(_v)
+        if len(invalid):
+            const[param] = values[invalid[0]]
+            validate_data(case, const["c"], const["m"], const["k"], const["OMEGA_0"])
+            
+    if linear:
+        return values, *_linear_sweep(data, param, values, time, PHI, OMEGA, profiler)
+    
+    for value in values:
+        const = {key: data[key] for key in ("m", "c", "k", "F0", "OMEGA_0")}
+        const[param] = value
         
-    for _F0 in dF0:
         # solve ODE
-        _x, _v = solve_ode2(m, c, k, _F0, OMEGA_0, t)
+        _x, _v = solve_ode2(time = time, PHI = PHI, OMEGA = OMEGA, profiler = profiler, **const)
         
         # append to data list
-        x_dF0.append(_x)
-        v_dF0.append(_v)
+        x_list.append(_x)
+        v_list.append(_v)
         
-    for _OMEGA_0 in dOMEGA_0:
-        # validate data
-        validate_data(case, c, m, k, _OMEGA_0)
+    return values, x_list, v_list
+
+
+def _linear_sweep(data, param, values, time, PHI, OMEGA, profiler = None):
+    """
+    Helper function of sweep() predicting the trajectories at each value from one solve with sensitivities
+    The initial condition also depends on the constant, its exact change is propagated by dx/dx0 and dx/dx_dot0
+    
+    :param data: dict of constants of the case
+    :param param: name of the constant varied, key of SWEEPS
+    :param values: values of the constant
+    :param time: time interval of type numpy.array()
+    :param PHI: phase constant used in the initial condition
+    :param OMEGA: angular frequency used in the initial condition
+    :param profiler: (optional) ODE2.Profiler() collecting the statistics of the solve
+    :return: tuple : (list of displacement x, list of velocity x')
+    """
+    from ODE2 import ODE2
+    
+    const = {key: data[key] for key in ("m", "c", "k", "F0", "OMEGA_0")}
+    OMEGA_0 = const["OMEGA_0"]
+    x0, x_dot0 = initial_condition(PHI = PHI, OMEGA = OMEGA, **const)
+    ode = ODE2(const["m"], const["c"], const["k"], const["F0"], x0, x_dot0, lambda _t: np.cos(OMEGA_0 * _t), profiler = profiler)
+    
+    # constants of mx" + cx' + kx = F0*cos(OMEGA_0 * t) as parameters of ODE2 ax" + bx' + cx = d*f(t)
+    name = {"m": "a", "c": "b", "k": "c", "F0": "d"}.get(param, param)
+    forcing = {"OMEGA_0": lambda _t: -_t * np.sin(OMEGA_0 * _t)} if param == "OMEGA_0" else None
+    sens = ode.sensitivity(time, (name, "x0", "x_dot0"), forcing)
+    
+    x_list = []
+    v_list = []
+    
+    for value in values:
+        _const = dict(const, **{param: value})
+        _x0, _x_dot0 = initial_condition(PHI = PHI, OMEGA = OMEGA, **_const)
+        _x, _v = sens.predict(**{name: value - const[param], "x0": _x0 - x0, "x_dot0": _x_dot0 - x_dot0})
         
-        # solve ODE
-        _x, _v = solve_ode2(m, c, k, F0, _OMEGA_0, t)
+        x_list.append(_x)
+        v_list.append(_v)
         
-        # append to data list
-        x_dOMEGA_0.append(_x)
-        v_dOMEGA_0.append(_v)
+    return x_list, v_list
+
+
+def resonance(data, c_values = None):
+    """
+    Amplitude of steady state displacement x_s as a function of OMEGA_0 at different values of c ( PART (C) )
+    Consider at constant time t = 2(PI)/OMEGA
+    
+    :param data: dict of constants of the case
+    :param c_values: values of damping constant. 0.5, 1.0, ..., 7.5 by default
+    :return: tuple : (OMEGA_0 values, c values, list of x_s at each c)
+    """
+    if c_values is None:
+        c_values = [i / 10 for i in range(5, 75 + 1, 5)]
         
+    OMEGA, OMEGA_R, PHI = derived_constants(data)
     
-    # repeat plotting with different values of constants
-    # varying mass m
-    fig_a_dm = Figure(2, 2)
-    fig_b_dm = Figure(2, 2)
+    # express x_s as a function of OMEGA_0
+    # OMEGA_0 passed as variable overrides the constant in x_s, while the dependent constants (e.g. phi)
+    # are evaluated at the constants of the case, restore the environment afterwards
+    _const = dict(env.getConstants())
+    set_case(data)
+    env.setConstants(t = 2 * np.pi / OMEGA)  # add t as constant
     
-    for i in range(len(dm)):
-        # update constant in environment
-        env.setConstants(m = dm[i])
-        # plot curve
-        fig_a_dm.add_graph([[t, x_dm[i]], [t, x_s(t)]], label = ["x(t)", "$x_s(t)$"], index = i + 1)
-        fig_a_dm.set_axes_title(f"m = {dm[i]}", index = i + 1)
-        fig_b_dm.add_graph([[t, v_dm[i]], [t, v_s(t)]], label = ["v(t)", "$v_s(t)$"], index = i + 1)
-        fig_b_dm.set_axes_title(f"m = {dm[i]}", index = i + 1)
-        
-    fig_a_dm.set_fig_title("Displacement of the Block $x(t)$ at Different Mass $m$")
-    fig_a_dm.set_x_label("$t$")
-    fig_a_dm.set_y_label("$x(t)$")
-    fig_a_dm.plot(h_space = 0.5)
+    X = np.arange(0, 2 * OMEGA_R, 1e-3)  # x-axis value ( OMEGA_0 )
+    curves = [x_s(OMEGA_0 = X, c = c) for c in c_values]
     
-    fig_b_dm.set_fig_title("Velocity of the Block $v(t)$ at Different Mass $m$")
-    fig_b_dm.set_x_label("$t$")
-    fig_b_dm.set_y_label("$v(t)$")
-    fig_b_dm.plot(h_space = 0.5)
+    env.clearConstants()
+    env.setConstants(_const)
     
-    env.setConstants(m = m)
+    return X, c_values, curves
+
+
+def steady_curves(data, time = t, param = None, values = None):
+    """
+    Steady state displacement x_s(t) and velocity v_s(t) of a case, or of each value of a constant varied
     
-    # varying damping constant c
-    fig_a_dc = Figure(3, 2)
-    fig_b_dc = Figure(3, 2)
+    :param data: dict of constants of the case
+    :param time: time interval of type numpy.array()
+    :param param: (optional) name of the constant varied, key of SWEEPS
+    :param values: (optional) values of the constant
+    :return: tuple (x_s, v_s), or list of tuple (x_s, v_s) for each value if param is given
+    """
+    _const = dict(env.getConstants())
+    set_case(data)
     
-    for i in range(len(dc)):
-        # update constant in environment
-        env.setConstants(c = dc[i])
-        # plot curve
-        fig_a_dc.add_graph([[t, x_dc[i]], [t, x_s(t)]], label = ["x(t)", "$x_s(t)$"], index = i + 1)
-        fig_a_dc.set_axes_title(f"c = {dc[i]}", index = i + 1)
-        fig_b_dc.add_graph([[t, v_dc[i]], [t, v_s(t)]], label = ["v(t)", "$v_s(t)$"], index = i + 1)
-        fig_b_dc.set_axes_title(f"c = {dc[i]}", index = i + 1)
+    if param is None:
+        curves = (x_s(time), v_s(time))
         
-    fig_a_dc.set_fig_title("Displacement of the Block $x(t)$ at Different Damping Constant $c$")
-    fig_a_dc.set_x_label("$t$")
-    fig_a_dc.set_y_label("$x(t)$")
-    fig_a_dc.plot(h_space = 0.5)
+    else:
+        curves = []
+        for value in values:
+            # update constant in environment
+            env.setConstants(**{param: value})
+            curves.append((x_s(time), v_s(time)))
+            
+    env.setConstants(_const)
     
-    fig_b_dc.set_fig_title("Velocity of the Block $v(t)$ at Different Damping Constant $c$")
-    fig_b_dc.set_x_label("$t$")
-    fig_b_dc.set_y_label("$v(t)$")
-    fig_b_dc.plot(h_space = 0.5)
+    return curves
+
+
+def figure_a(time, x, steady):
+    """
+    Figure of PART (A) : displacement x(t) and at steady state x_s(t)
     
-    env.setConstants(c = c)
+    :param time: time interval
+    :param x: displacement x(t)
+    :param steady: tuple (x_s, v_s) returned by steady_curves()
+    :return: tuple (Figure(), file name, dict of keyword arguments for Figure.plot() / Figure.save())
+    """
+    from Plot import Figure
     
-    # varying spring constant k
-    fig_a_dk = Figure(3, 2)
-    fig_b_dk = Figure(3, 2)
+    fig_a = Figure(row = 1, col = 1)
+    fig_a.add_graph([[time, x], [time, steady[0]]], label = ["$x(t)$", "$x_s(t)$"])
+    fig_a.set_axes_title("Displacement of the Block $x(t)$ and at its Steady State $x_s(t)$")
+    fig_a.set_x_label("$t$")
+    fig_a.set_y_label("$x(t)$")
     
-    for i in range(len(dk)):
-        # update constant in environment
-        env.setConstants(k = dk[i])
+    return fig_a, "a/a.png", {"tight_layout": False, "figsize": FIGURE_SIZE, "dpi": FIGURE_DPI}
+
+
+def figure_b(time, x, steady):
+    """
+    Figure of PART (B) : velocity v(t) by differentiating x(t) and at steady state v_s(t)
+    
+    :param time: time interval
+    :param x: displacement x(t)
+    :param steady: tuple (x_s, v_s) returned by steady_curves()
+    :return: tuple (Figure(), file name, dict of keyword arguments for Figure.plot() / Figure.save())
+    """
+    from Plot import Figure
+    from Diff import dydx
+    
+    fig_b = Figure(row = 1, col = 1)
+    fig_b.add_graph([[time, dydx(x, time)], [time, steady[1]]], label = ["$v(t)$", "$v_s(t)$"])
+    fig_b.set_axes_title("Velocity of the Block $v(t)$ and at its Stead State $v_s(t)$")
+    fig_b.set_x_label("$t$")
+    fig_b.set_y_label("$v(t)$")
+    
+    return fig_b, "b/b.png", {"tight_layout": False, "figsize": FIGURE_SIZE, "dpi": FIGURE_DPI}
+
+
+def figure_sweep(time, param, values, x_list, v_list, steady):
+    """
+    Figures of x(t) and v(t) at different values of a constant
+    
+    :param time: time interval
+    :param param: name of the constant varied, key of SWEEPS
+    :param values: values of the constant
+    :param x_list: list of displacement x(t) at each value, returned by sweep()
+    :param v_list: list of velocity v(t) at each value, returned by sweep()
+    :param steady: list of tuple (x_s, v_s) at each value, returned by steady_curves()
+    :return: list of 2 tuple (Figure(), file name, dict of keyword arguments)
+    """
+    from Plot import Figure
+    
+    key, (row, col), name, axes_title = SWEEPS[param]
+    fig_a_d = Figure(row, col)
+    fig_b_d = Figure(row, col)
+    
+    for i in range(len(values)):
         # plot curve
-        fig_a_dk.add_graph([[t, x_dk[i]], [t, x_s(t)]], label = ["x(t)", "$x_s(t)$"], index = i + 1)
-        fig_a_dk.set_axes_title(f"k = {dk[i]}", index = i + 1)
-        fig_b_dk.add_graph([[t, v_dk[i]], [t, v_s(t)]], label = ["v(t)", "$v_s(t)$"], index = i + 1)
-        fig_b_dk.set_axes_title(f"k = {dk[i]}", index = i + 1)
+        fig_a_d.add_graph([[time, x_list[i]], [time, steady[i][0]]], label = ["x(t)", "$x_s(t)$"], index = i + 1)
+        fig_a_d.set_axes_title(axes_title.format(values[i]), index = i + 1)
+        fig_b_d.add_graph([[time, v_list[i]], [time, steady[i][1]]], label = ["v(t)", "$v_s(t)$"], index = i + 1)
+        fig_b_d.set_axes_title(axes_title.format(values[i]), index = i + 1)
         
-    fig_a_dk.set_fig_title("Displacement of the Block $x(t)$ at Different Spring Constant $k$")
-    fig_a_dk.set_x_label("$t$")
-    fig_a_dk.set_y_label("$x(t)$")
-    fig_a_dk.plot(h_space = 0.5)
+    fig_a_d.set_fig_title(f"Displacement of the Block $x(t)$ at Different {name}")
+    fig_a_d.set_x_label("$t$")
+    fig_a_d.set_y_label("$x(t)$")
+    
+    fig_b_d.set_fig_title(f"Velocity of the Block $v(t)$ at Different {name}")
+    fig_b_d.set_x_label("$t$")
+    fig_b_d.set_y_label("$v(t)$")
+    
+    kwargs = {"h_space": 0.5, "figsize": FIGURE_SIZE_LARGE, "dpi": FIGURE_DPI}
     
-    fig_b_dk.set_fig_title("Velocity of the Block $v(t)$ at Different Spring Constant $k$")
-    fig_b_dk.set_x_label("$t$")
-    fig_b_dk.set_y_label("$v(t)$")
-    fig_b_dk.plot(h_space = 0.5)
+    return [(fig_a_d, f"a/a_{key}.png", kwargs), (fig_b_d, f"b/b_{key}.png", dict(kwargs))]
+
+
+def figure_c(X, c_values, curves, OMEGA):
+    """
+    Figure of PART (C) : amplitude of steady state displacement against driving frequency
     
-    env.setConstants(k = k)
+    :param X: values of OMEGA_0, returned by resonance()
+    :param c_values: values of damping constant, returned by resonance()
+    :param curves: list of x_s at each value of c, returned by resonance()
+    :param OMEGA: angular frequency, for the ticks of the x-axis
+    :return: tuple (Figure(), file name, dict of keyword arguments for Figure.plot() / Figure.save())
+    """
+    from Plot import Figure
     
-    # varying driving force F0
-    fig_a_dF0 = Figure(2, 2)
-    fig_b_dF0 = Figure(2, 2)
+    fig_c = Figure(row = 1, col = 1)
+    fig_c.add_graph(x = X, y = np.array(curves), label = [f"$x_s(\\omega_0)$ at $c$ = {c}" for c in c_values])
+    fig_c.set_axes_title("Amplitude of Stead-state Displacement $x_s(\\omega_0)$ with varying Driving Frequency $\\omega_0$ and Damping Constant $c$")
+    fig_c.set_x_label("$\\omega_0$")
+    fig_c.set_y_label("$x_s(\\omega_0)$")
+    fig_c.set_x_ticks([i * OMEGA for i in range(3)], label = ["0", "$\\omega_R$", "2$\\omega_R$"])
+    fig_c.grid()
     
-    for i in range(len(dF0)):
-        # update constant in environment
-        env.setConstants(F0 = dF0[i])
-        # plot curve
-        fig_a_dF0.add_graph([[t, x_dF0[i]], [t, x_s(t)]], label = ["x(t)", "$x_s(t)$"], index = i + 1)
-        fig_a_dF0.set_axes_title(f"F0 = {dF0[i]}", index = i + 1)
-        fig_b_dF0.add_graph([[t, v_dF0[i]], [t, v_s(t)]], label = ["v(t)", "$v_s(t)$"], index = i + 1)
-        fig_b_dF0.set_axes_title(f"F0 = {dF0[i]}", index = i + 1)
+    return fig_c, "c/c.png", {"tight_layout": False, "figsize": FIGURE_SIZE_LARGE, "dpi": FIGURE_DPI}
+
+
+def check_steady_state(case, data, x, time = t):
+    """
+    Print the amplitude and phase error of x(t) against x_s(t) over the second half of the time interval
+    
+    :param case: type of damping, key of dataset
+    :param data: dict of constants of the case
+    :param x: displacement x(t)
+    :param time: time interval
+    :return: dict returned by Spectral.compare_steady_state()
+    """
+    from Spectral import compare_steady_state
+    
+    check = compare_steady_state(x, time, data["m"], data["c"], data["k"], data["F0"], data["OMEGA_0"], t_min = time[-1] / 2)
+    print(f"[{case}] Steady state amplitude error = {check['amplitude_error']:.2e}, "
+          f"phase error = {check['phi_error']:.2e} rad")
+    
+    return check
+
+
+def report(case, data, time = t, profiler = None):
+    """
+    Solve one case and build all the figures of the report
+    
+    :param case: type of damping, key of dataset
+    :param data: dict of constants of the case
+    :param time: time interval of type numpy.array()
+    :param profiler: (optional) ODE2.Profiler() collecting the statistics of the solves
+    :return: list of tuple (Figure(), file name, dict of keyword arguments for Figure.plot() / Figure.save())
+    """
+    # Solving 2nd-order Ordinary Differential Equation
+    # mx" + cx' + kx = F0*cos(OMEGA_0 * t)
+    x, v = solve_case(case, data, time, profiler)
+    check_steady_state(case, data, x, time)
+    
+    ##### graph plotting for PART (A) and (B) #####
+    steady = steady_curves(data, time)
+    figures = [figure_a(time, x, steady), figure_b(time, x, steady)]
+    
+    # repeat plotting with different values of constants
+    for param in SWEEPS:
+        values, x_list, v_list = sweep(case, data, param, time = time, profiler = profiler)
+        figures.extend(figure_sweep(time, param, values, x_list, v_list, steady_curves(data, time, param, values)))
         
-    fig_a_dF0.set_fig_title("Displacement of the Block $x(t)$ at Different Amplitude of Driving Force $F_0$")
-    fig_a_dF0.set_x_label("$t$")
-    fig_a_dF0.set_y_label("$x(t)$")
-    fig_a_dF0.plot(h_space = 0.5)
+    ##### graph plotting for PART (C) #####
+    X, c_values, curves = resonance(data)
+    figures.append(figure_c(X, c_values, curves, derived_constants(data)[0]))
     
-    fig_b_dF0.set_fig_title("Velocity of the Block $v(t)$ at Different Amplitude of Driving Force $F_0$")
-    fig_b_dF0.set_x_label("$t$")
-    fig_b_dF0.set_y_label("$v(t)$")
-    fig_b_dF0.plot(h_space = 0.5)
+    return figures
+
+
+def _save(figures, save_dir):
+    """
+    Helper function to save figures without window and release them
     
-    env.setConstants(F0 = F0)
+    :param figures: list of tuple (Figure(), file name, dict of keyword arguments)
+    :param save_dir: directory of the output files
+    :return: list of paths of the output files
+    """
+    import os
     
-    # varying driving frequency OMEGA_0
-    fig_a_dOMEGA_0 = Figure(3, 1)
-    fig_b_dOMEGA_0 = Figure(3, 1)
+    paths = []
+    for figure, name, kwargs in figures:
+        path = os.path.join(save_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        
+        with figure:
+            paths.append(figure.save(path, **kwargs))
+            
+    return paths
+
+
+def _stage_constants(constants):
+    """
+    Stage of build_pipeline() : constants of a case, excluding the values of the sweeps
+    """
+    return constants
+
+
+def _stage_validate(constants, case):
+    """
+    Stage of build_pipeline() : validate the constants of a case
+    """
+    validate_data(case, constants["c"], constants["m"], constants["k"], constants["OMEGA_0"])
+    return classify(constants["m"], constants["c"], constants["k"], constants["OMEGA_0"])
+
+
+def _stage_solve(constants, valid, case, time):
+    """
+    Stage of build_pipeline() : solve the ODE of a case
+    """
+    x, v = solve_ode2(constants["m"], constants["c"], constants["k"], constants["F0"], constants["OMEGA_0"], time)
+    check_steady_state(case, constants, x, time)
+    return x, v
+
+
+def _stage_steady(constants, time, param = None, values = None):
+    """
+    Stage of build_pipeline() : steady state x_s(t) and v_s(t), see steady_curves()
+    """
+    return steady_curves(constants, time, param, values)
+
+
+def _stage_sweep(constants, valid, case, param, values, time):
+    """
+    Stage of build_pipeline() : solve the ODE at different values of a constant, see sweep()
+    """
+    return sweep(case, constants, param, values, time)
+
+
+def _stage_resonance(constants):
+    """
+    Stage of build_pipeline() : data of PART (C), see resonance()
+    """
+    return resonance(constants)
+
+
+def _stage_figure(*results, part, time, save_dir, param = None):
+    """
+    Stage of build_pipeline() : save the figures of a part of the report from the results of the stages it depends on
+    """
+    if part == "a":
+        (x, v), steady = results
+        return _save([figure_a(time, x, steady)], save_dir)
     
-    for i in range(len(dOMEGA_0)):
-        # update constant in environment
-        env.setConstants(OMEGA_0 = dOMEGA_0[i])
-        # plot curve
-        fig_a_dOMEGA_0.add_graph([[t, x_dOMEGA_0[i]], [t, x_s(t)]], label = ["x(t)", "$x_s(t)$"], index = i + 1)
-        fig_a_dOMEGA_0.set_axes_title(f"$\omega_0$ = {dOMEGA_0[i]}", index = i + 1)
-        fig_b_dOMEGA_0.add_graph([[t, v_dOMEGA_0[i]], [t, v_s(t)]], label = ["v(t)", "$v_s(t)$"], index = i + 1)
-        fig_b_dOMEGA_0.set_axes_title(f"$\omega_0$ = {dOMEGA_0[i]}", index = i + 1)
+    if part == "b":
+        (x, v), steady = results
+        return _save([figure_b(time, x, steady)], save_dir)
+    
+    if part == "c":
+        constants, (X, c_values, curves) = results
+        return _save([figure_c(X, c_values, curves, derived_constants(constants)[0])], save_dir)
+    
+    (values, x_list, v_list), steady = results
+    return _save(figure_sweep(time, param, values, x_list, v_list, steady), save_dir)
+
+
+def build_pipeline(case, data, time = t, save_dir = "img", cache_dir = ".cache", verbose = False):
+    """
+    Express the report of one case as a pipeline of stages
+    constants -> validation -> solves / sweeps -> steady state evaluation -> figures
+    Each stage depends only on the constants it uses, e.g. changing the values of dc in the dataset
+    reruns the sweep of c and its figures only, and editing main.py reruns only the stages using the code edited
+    
+    Usage:
+    build_pipeline("Under-damping", dataset["Under-damping"]).run()
+    
+    :param case: type of damping, key of dataset
+    :param data: dict of constants of the case
+    :param time: time interval of type numpy.array()
+    :param save_dir: directory of the figures
+    :param cache_dir: directory of the artifacts of the stages
+    :param verbose: print the execution time of each stage run
+    :return: Pipeline.Pipeline()
+    """
+    import os
+    from Pipeline import Pipeline, Stage
+    
+    # the functions and constants of main.py each stage uses are part of its fingerprint, see Pipeline.Stage.code()
+    solver = ("ODE2", "Func", "Damping")
+    plot = ("Plot", "Diff")
+    # constants of env defined by expressions, used by x_s and v_s
+    definitions = {key: value for key, value in env.getConstants().items() if isinstance(value, str)}
+    pipe = Pipeline(os.path.join(cache_dir, case), verbose)
+    constants = {key: data[key] for key in ("m", "c", "k", "F0", "OMEGA_0")}
+    
+    pipe.add(Stage("constants", _stage_constants, params = {"constants": constants}))
+    pipe.add(Stage("validate", _stage_validate, ["constants"], {"case": case}, ("Damping",)))
+    pipe.add(Stage("solve", _stage_solve, ["constants", "validate"], {"case": case, "time": time}, solver + ("Spectral",),
+                   objects = [definitions]))
+    pipe.add(Stage("steady", _stage_steady, ["constants"], {"time": time}, solver, objects = [definitions]))
+    
+    for part in ("a", "b"):
+        pipe.add(Stage(f"figure_{part}", _stage_figure, ["solve", "steady"],
+                       {"part": part, "time": time, "save_dir": save_dir}, plot,
+                       [os.path.join(save_dir, part, f"{part}.png")]))
+        
+    for param, (key, *_) in SWEEPS.items():
+        values = data[key]
+        pipe.add(Stage(f"sweep_{key}", _stage_sweep, ["constants", "validate"],
+                       {"case": case, "param": param, "values": values, "time": time}, solver, objects = [definitions]))
+        pipe.add(Stage(f"steady_{key}", _stage_steady, ["constants"],
+                       {"time": time, "param": param, "values": values}, solver, objects = [definitions]))
+        pipe.add(Stage(f"figure_{key}", _stage_figure, [f"sweep_{key}", f"steady_{key}"],
+                       {"part": "sweep", "time": time, "save_dir": save_dir, "param": param}, plot,
+                       [os.path.join(save_dir, part, f"{part}_{key}.png") for part in ("a", "b")]))
+        
+    pipe.add(Stage("resonance", _stage_resonance, ["constants"], modules = solver, objects = [definitions]))
+    pipe.add(Stage("figure_c", _stage_figure, ["constants", "resonance"],
+                   {"part": "c", "time": time, "save_dir": save_dir}, plot, [os.path.join(save_dir, "c", "c.png")]))
+    
+    return pipe
+
+
+def show_or_save(figures, save_dir = None, workers = None):
+    """
+    Show figures one by one, or save them all to files concurrently without window
+    
+    :param figures: list of tuple (Figure(), file name, dict of keyword arguments)
+    :param save_dir: directory of the output files. Figures are shown if not given
+    :param workers: number of worker processes for saving. None uses all CPU cores
+    :return: None
+    """
+    if not save_dir:
+        for figure, _, kwargs in figures:
+            figure.plot(**kwargs)
+            
+        return
+    
+    import os
+    from Plot import render
+    
+    jobs = []
+    for figure, name, kwargs in figures:
+        path = os.path.join(save_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        jobs.append((figure, path, kwargs))
+        
+    for path in render(jobs, workers = workers):
+        print(path)
+
+
+def store_result(path, case, data, time, x_list, v_list, param = None, values = None, **meta):
+    """
+    Append solved trajectories to a result store, with the constants of each trajectory
+    
+    Usage:
+    values, x_list, v_list = sweep(case, data, "c")
+    store_result("results", case, data, t, x_list, v_list, "c", values)
+    params, _t, x = ResultStore("results").query("x", where = {"c": [1, 2]}, t = (10, 20))
+    
+    :param path: directory of the store
+    :param case: type of damping, key of dataset
+    :param data: dict of constants of the case
+    :param time: time interval
+    :param x_list: list of displacement x(t)
+    :param v_list: list of velocity v(t)
+    :param param: (optional) name of the constant varied
+    :param values: (optional) values of the constant varied, one for each trajectory
+    :param meta: other metadata of the run
+    :return: id of the run
+    """
+    from Store import ResultStore
+    
+    params = {key: data[key] for key in ("m", "c", "k", "F0", "OMEGA_0")}
+    if param is not None:
+        params[param] = values
         
-    fig_a_dOMEGA_0.set_fig_title("Displacement of the Block $x(t)$ at Different Driving Frequency $\omega_0$")
-    fig_a_dOMEGA_0.set_x_label("$t$")
-    fig_a_dOMEGA_0.set_y_label("$x(t)$")
-    fig_a_dOMEGA_0.plot(h_space = 0.5)
+    return ResultStore(path).append(time, {"x": x_list, "v": v_list}, params, dict(meta, case = case, param = param))
+
+
+def plot_result(path):
+    """
+    Build a figure of a result saved by the solve / sweep / resonance commands
     
-    fig_b_dOMEGA_0.set_fig_title("Velocity of the Block $v(t)$ at Different Driving Frequency $\omega_0$")
-    fig_b_dOMEGA_0.set_x_label("$t$")
-    fig_b_dOMEGA_0.set_y_label("$v(t)$")
-    fig_b_dOMEGA_0.plot(h_space = 0.5)
+    :param path: path of the .npz file
+    :return: list of tuple (Figure(), file name, dict of keyword arguments)
+    """
+    from Plot import Figure
+    import os
+    
+    result = np.load(path)
+    name = os.path.splitext(os.path.basename(path))[0] + ".png"
+    
+    if "OMEGA_0" in result.files and "x_s" in result.files:
+        # resonance curves
+        fig = Figure()
+        fig.add_graph(x = result["OMEGA_0"], y = result["x_s"], label = [f"$c$ = {c}" for c in result["c"]])
+        fig.set_x_label("$\\omega_0$")
+        fig.set_y_label("$x_s(\\omega_0)$")
+        fig.grid()
+        return [(fig, name, {})]
+    
+    x = result["x"]
+    v = result["v"]
+    time = result["t"]
+    
+    if x.ndim == 1:
+        fig = Figure(2, 1)
+        fig.add_graph(x = time, y = x, label = "$x(t)$", index = 1)
+        fig.add_graph(x = time, y = v, label = "$v(t)$", index = 2)
+        fig.set_y_label(["$x(t)$", "$v(t)$"])
+    
+    else:
+        # sweep : one curve per value
+        label = [f"{result['param']} = {value}" for value in result["values"]]
+        fig = Figure(2, 1)
+        fig.add_graph(x = time, y = x, label = label, index = 1)
+        fig.add_graph(x = time, y = v, label = label, index = 2)
+        fig.set_y_label(["$x(t)$", "$v(t)$"])
+        
+    fig.set_x_label("$t$")
+    fig.set_fig_title(os.path.basename(path))
     
-    env.setConstants(OMEGA_0 = OMEGA_0)
+    return [(fig, name, {})]
+
+
+def parse_args(argv = None):
+    """
+    Parse command line arguments
     
+    :param argv: list of arguments. sys.argv[1:] by default
+    :return: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description = "Q2 Driven Oscillation in a Resistive Medium")
+    parser.add_argument("--config", help = "JSON file of datasets, in the same format as DATASET in main.py")
+    parser.add_argument("--t-end", type = float, default = T_END, help = "end of time interval")
+    parser.add_argument("--dt", type = float, default = DT, help = "time step")
+    parser.add_argument("--profile", action = "store_true", help = "print the statistics of the ODE solves")
+    commands = parser.add_subparsers(dest = "command")
+    
+    solve = commands.add_parser("solve", help = "solve the ODE of one case")
+    solve.add_argument("--case", default = "Under-damping")
+    solve.add_argument("--out", help = "save t, x, v to this .npz file")
+    solve.add_argument("--store", help = "append t, x, v to the result store in this directory, see Store.py")
+    solve.add_argument("--method", default = "odeint", choices = ["odeint", "green"],
+                       help = "green : convolution with the Green's function by FFT, see ODE2.green()")
+    solve.add_argument("--forcing", help = ".npy record of the driving function f(t) replacing cos(OMEGA_0 * t), memory-mapped")
+    solve.add_argument("--forcing-dt", type = float, help = "time step of the record. Same as --dt by default")
+    solve.add_argument("--forcing-kind", default = "linear", choices = ["linear", "cubic"], help = "interpolation of the record")
+    
+    _sweep = commands.add_parser("sweep", help = "solve one case at different values of one constant")
+    _sweep.add_argument("--case", default = "Under-damping")
+    _sweep.add_argument("--param", required = True, choices = list(SWEEPS))
+    _sweep.add_argument("--values", type = float, nargs = "+", help = "values of the constant. From the dataset by default")
+    _sweep.add_argument("--out", help = "save t, values, x, v to this .npz file")
+    _sweep.add_argument("--store", help = "append t, x, v to the result store in this directory, see Store.py")
+    _sweep.add_argument("--linear", action = "store_true",
+                        help = "predict the trajectories from one solve with sensitivities, for values near the dataset")
+    
+    _resonance = commands.add_parser("resonance", help = "steady state amplitude against driving frequency")
+    _resonance.add_argument("--case", default = "Under-damping")
+    _resonance.add_argument("--c", type = float, nargs = "+", help = "values of damping constant")
+    _resonance.add_argument("--out", help = "save OMEGA_0, c, x_s to this .npz file")
+    
+    plot = commands.add_parser("plot", help = "plot the figures of the report, or a saved result")
+    plot.add_argument("--case", nargs = "+", default = ["Under-damping"])
+    plot.add_argument("--input", help = ".npz file saved by solve / sweep / resonance")
+    plot.add_argument("--save-dir", help = "save the figures in this directory instead of showing them")
+    plot.add_argument("--workers", type = int, help = "number of worker processes for saving")
+    plot.add_argument("--cache", help = "rerun only the stages whose inputs changed, storing the results in this directory. "
+                                        "Figures are saved in --save-dir, img by default")
+    
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    """
+    Command line entry point
     
-    # prepare data for plotting in PART (C)
-    # express x_s as a function of OMEGA_0
-    # at different value of c
-    # let's consider at constant time t = 2(PI)/OMEGA
-    env.setConstants(t = 2 * np.pi / OMEGA)  # add t as constant
-    env.popConstants("OMEGA_0")  # remove OMEGA_0 from constants list, take it as variable
-    # we can reuse x_s to evaluate amplitude of steady state displacement x_s as a function of OMEGA_0
-    # new environment class should be created to avoid confusion and corruption of environment
+    :param argv: list of arguments. sys.argv[1:] by default
+    :return: exit code
+    """
+    global dataset
     
-    data = []  # list of graphs' data [[graph1_x, graph1_y], [graph2_x, graph2_y], ...]
-    curve_label = []
-    X = np.arange(0, 2 * OMEGA_R, 1e-3)  # x-axis value ( OMEGA_0 )
+    args = parse_args(argv)
+    dataset = load_dataset(args.config)
+    time = np.arange(0, args.t_end, args.dt)
+    command = args.command or "plot"
+    profiler = None
     
-    for i in range(5, 75 + 1, 5):
-        data.append([
-            X,
-            x_s(
-                    OMEGA_0 = X,
-                    c = i / 10
-            )
-        ])
-        curve_label.append(f"$x_s(\omega_0)$ at $c$ = {i / 10}")
-    
-    ##### graph plotting for PART (c) #####
-    fig_c = Figure(row = 1, col = 1)
-    fig_c.add_graph(data, label = curve_label)
-    fig_c.set_axes_title("Amplitude of Stead-state Displacement $x_s(\omega_0)$ with varying Driving Frequency $\omega_0$ and Damping Constant $c$")
-    fig_c.set_x_label("$\omega_0$")
-    fig_c.set_y_label("$x_s(\omega_0)$")
-    fig_c.set_x_ticks([i * OMEGA for i in range(3)], label = ["0", "$\omega_R$", "2$\omega_R$"])
-    fig_c.grid()
-    fig_c.plot(tight_layout = False)
-    #######################################
+    if args.profile:
+        from ODE2 import Profiler
+        profiler = Profiler()
     
+    if command == "solve":
+        data = dataset[args.case]
+        forcing = None
+        
+        if args.forcing:
+            from Forcing import Tabulated
+            
+            forcing = Tabulated.load(args.forcing, dt = args.forcing_dt or args.dt, kind = args.forcing_kind)
+            
+        x, v = solve_case(args.case, data, time, profiler, args.method, forcing)
+        
+        if args.store:
+            store_result(args.store, args.case, data, time, [x], [v], command = "solve")
+            
+        if args.out:
+            np.savez(args.out, t = time, x = x, v = v)
+        else:
+            print(f"[{args.case}] max |x| = {np.abs(x).max():.6g}, max |v| = {np.abs(v).max():.6g}")
+            
+    elif command == "sweep":
+        data = dataset[args.case]
+        values, x_list, v_list = sweep(args.case, data, args.param, args.values, time, profiler, args.linear)
+        
+        if args.store:
+            store_result(args.store, args.case, data, time, x_list, v_list, args.param, values, command = "sweep", linear = args.linear)
+            
+        if args.out:
+            np.savez(args.out, t = time, param = args.param, values = values, x = np.array(x_list), v = np.array(v_list))
+        else:
+            for value, _x in zip(values, x_list):
+                print(f"[{args.case}] {args.param} = {value} : max |x| = {np.abs(_x).max():.6g}")
+                
+    elif command == "resonance":
+        X, c_values, curves = resonance(dataset[args.case], args.c)
+        
+        if args.out:
+            np.savez(args.out, OMEGA_0 = X, c = c_values, x_s = np.array(curves))
+        else:
+            for c, curve in zip(c_values, curves):
+                print(f"c = {c} : max x_s = {curve.max():.6g} at OMEGA_0 = {X[np.argmax(curve)]:.4g}")
+                
+    else:
+        # plot
+        if getattr(args, "cache", None):
+            for case in args.case:
+                log = build_pipeline(case, dataset[case], time, args.save_dir or "img", args.cache, verbose = True).run()
+                print(f"[{case}] {list(log.values()).count('run')} of {len(log)} stages run")
+                
+        else:
+            if getattr(args, "input", None):
+                figures = plot_result(args.input)
+            else:
+                figures = []
+                for case in getattr(args, "case", ["Under-damping"]):  # dataset.keys():
+                    figures.extend(report(case, dataset[case], time, profiler))
+                    
+            show_or_save(figures, getattr(args, "save_dir", None), getattr(args, "workers", None))
+            
+    if profiler is not None:
+        print(profiler.report())
+        
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
 # end of the program (main.py)